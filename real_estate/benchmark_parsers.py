@@ -0,0 +1,382 @@
+import argparse
+import datetime
+import gc
+import hashlib
+import json
+import math
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+from pathlib import Path
+from lxml import etree
+import parse_zillow_page as zillow_page
+import zillow_file_manager as file_manager
+import zillow_image_manager as image_manager
+from zillow_html import make_tree, text_of
+from zillow_selectors import select_all, select_one
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+# The corpus: element.html plus the anonymized captures in benchmark_corpus/.
+# Add real pages with `benchmark_parsers.py anonymize <file.zlw>`.
+CORPUS_FOLDER = SCRIPT_DIR / 'benchmark_corpus'
+DEFAULT_CORPUS = (SCRIPT_DIR / 'element.html', CORPUS_FOLDER)
+
+# Each benchmark calls its function this many times per corpus page, after
+# one warm-up call.
+DEFAULT_REPEATS = 50
+
+# compare flags a benchmark whose median latency grew by more than this.
+REGRESSION_THRESHOLD = 0.10
+
+# Placeholders written by anonymize
+PLACEHOLDER_STREET = 'Sample Rd'
+PLACEHOLDER_CITY = 'Testville'
+PLACEHOLDER_STATE_ZIP = 'NM 87000'
+PLACEHOLDER_ZPID = '123456789'
+PLACEHOLDER_PHONE = '555-000-0000'
+PLACEHOLDER_EMAIL = 'agent@example.com'
+PLACEHOLDER_AGENT = 'Jane Agent'
+PLACEHOLDER_BROKER = 'Sample Realty'
+
+PHONE_REGEX = re.compile(r'\(?\b\d{3}\)?[-. ]\d{3}[-. ]\d{4}\b')
+EMAIL_REGEX = re.compile(r'[\w.+-]+@[\w-]+\.[\w.-]+')
+ZPID_REGEX = re.compile(r'\d+(?=_zpid)|(?<=zpid=)\d+|(?<="zpid":)\d+')
+PHOTO_REGEX = re.compile(r'(?<=zillowstatic\.com/fp/)[0-9a-f]+')
+
+# A corpus page: its path, the property name from its file name, and its HTML.
+Page = namedtuple('Page', ['path', 'name', 'html'])
+
+
+def _all_extractors(document, page):
+    return (document.stats(), document.details(), document.description(), document.facts(),
+            document.mls_data(), document.image_src(), document.listing_url(page.name))
+
+
+# (name, function taking a Page). The module-level extractors are called
+# the way their callers use them: on the raw HTML, parsing it themselves.
+BENCHMARKS = (
+    ('zillow_html.make_tree', lambda page: make_tree(page.html)),
+    ('parse_zillow_page.parse_zillow_stats', lambda page: zillow_page.parse_zillow_stats(page.html)),
+    ('parse_zillow_page.parse_zillow_details', lambda page: zillow_page.parse_zillow_details(page.html)),
+    ('parse_zillow_page.parse_zillow_description', lambda page: zillow_page.parse_zillow_description(page.html)),
+    ('parse_zillow_page.parse_zillow_facts', lambda page: zillow_page.parse_zillow_facts(page.html)),
+    ('parse_zillow_page.extract_mls_data', lambda page: zillow_page.extract_mls_data(page.html)),
+    ('parse_zillow_page.extract_listing_url', lambda page: zillow_page.extract_listing_url(page.html, page.name)),
+    ('parse_zillow_page.ListingDocument', lambda page: _all_extractors(zillow_page.ListingDocument(page.html), page)),
+    ('parse_zillow_page.ListingDocument.from_file',
+     lambda page: _all_extractors(zillow_page.ListingDocument.from_file(page.path), page)),
+    ('zillow_image_manager.extract_image_src', lambda page: image_manager.extract_image_src(page.html)),
+    ('zillow_image_manager.extract_address_from_html',
+     lambda page: image_manager.extract_address_from_html(page.html)),
+    ('zillow_image_manager.extract_images_from_gallery',
+     lambda page: image_manager.extract_images_from_gallery(page.html)),
+    ('zillow_file_manager.extract_address', lambda page: file_manager.extract_address(page.html)),
+)
+
+
+def load_corpus(paths=DEFAULT_CORPUS):
+    """
+    Reads the corpus pages.
+
+    Args:
+        paths (iterable): Files, or folders whose .zlw and .html files are read.
+
+    Returns:
+        list: Page tuples, in path order.
+    """
+    pages = []
+    for path in map(Path, paths):
+        files = sorted([*path.glob('*.zlw'), *path.glob('*.html')]) if path.is_dir() else [path]
+        for file_path in files:
+            html = file_path.read_text(encoding='utf-8')
+            pages.append(Page(str(file_path), file_manager.property_address_from_filename(file_path.name), html))
+    return pages
+
+
+def _percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def time_benchmark(function, pages, repeats=DEFAULT_REPEATS):
+    """
+    Times a benchmark function over every corpus page.
+
+    Returns:
+        dict: calls, mean/p50/p90/p99/max latency in milliseconds, and pages_per_sec.
+    """
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    # Like timeit: keep collections from landing in random samples
+    gc.collect()
+    gc.disable()
+    try:
+        for page in pages:
+            function(page)
+            for _ in range(repeats):
+                start = time.perf_counter_ns()
+                function(page)
+                samples.append(time.perf_counter_ns() - start)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    samples.sort()
+    total = sum(samples)
+    return {
+        'calls': len(samples),
+        'mean_ms': total / len(samples) / 1e6,
+        'p50_ms': _percentile(samples, 0.50) / 1e6,
+        'p90_ms': _percentile(samples, 0.90) / 1e6,
+        'p99_ms': _percentile(samples, 0.99) / 1e6,
+        'max_ms': samples[-1] / 1e6,
+        'pages_per_sec': len(samples) / (total / 1e9) if total else 0.0,
+    }
+
+
+def trace_allocations(function, pages):
+    """
+    Measures the Python allocations of one call per corpus page with
+    tracemalloc. Memory libxml2 allocates for the tree itself is not traced.
+
+    Returns:
+        dict: peak_kib, the largest peak above the starting point, and
+        retained_kib, the mean memory still held after a call.
+    """
+    peaks, retained = [], []
+    tracemalloc.start()
+    try:
+        for page in pages:
+            gc.collect()
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            result = function(page)
+            current, peak = tracemalloc.get_traced_memory()
+            del result
+            peaks.append(peak - before)
+            retained.append(current - before)
+    finally:
+        tracemalloc.stop()
+    return {
+        'peak_kib': max(peaks) / 1024,
+        'retained_kib': sum(retained) / len(retained) / 1024,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(pages, repeats=DEFAULT_REPEATS, only=None):
+    """
+    Runs every benchmark (or those whose name contains `only`) over the corpus.
+
+    Returns:
+        dict: The results, ready to be saved as JSON: run metadata, the
+        corpus files with their sizes and hashes, and one entry per benchmark.
+    """
+    results = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'lxml': '.'.join(map(str, etree.LXML_VERSION)),
+        'libxml2': '.'.join(map(str, etree.LIBXML_VERSION)),
+        'platform': platform.platform(),
+        'repeats': repeats,
+        'corpus': [{'file': os.path.basename(page.path),
+                    'bytes': len(page.html.encode('utf-8')),
+                    'sha256': hashlib.sha256(page.html.encode('utf-8')).hexdigest()} for page in pages],
+        'benchmarks': {},
+    }
+    for name, function in BENCHMARKS:
+        if only and only not in name:
+            continue
+        timing = time_benchmark(function, pages, repeats)
+        allocations = trace_allocations(function, pages)
+        results['benchmarks'][name] = {**timing, **allocations}
+    return results
+
+
+def print_results(results):
+    print(f"{len(results['corpus'])} pages, {results['repeats']} calls each "
+          f"(Python {results['python']}, lxml {results['lxml']}, commit {results['git_commit'] or 'unknown'})")
+    print(f"{'benchmark':<48} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'pages/s':>9} {'peak KiB':>9}")
+    for name, result in results['benchmarks'].items():
+        print(f"{name:<48} {result['p50_ms']:8.3f} {result['p90_ms']:8.3f} {result['p99_ms']:8.3f} "
+              f"{result['pages_per_sec']:9.1f} {result['peak_kib']:9.1f}")
+
+
+def compare_results(baseline, results, threshold=REGRESSION_THRESHOLD):
+    """
+    Prints the change in median latency per benchmark against an earlier run.
+
+    Returns:
+        list: Names of the benchmarks whose median grew by more than `threshold`.
+    """
+    regressions = []
+    if [page['sha256'] for page in baseline['corpus']] != [page['sha256'] for page in results['corpus']]:
+        print("Note: the corpus differs from the baseline run; the comparison is approximate.")
+    print(f"\nAgainst {baseline['created']} (commit {baseline.get('git_commit') or 'unknown'}):")
+    print(f"{'benchmark':<48} {'was ms':>8} {'now ms':>8} {'change':>8}")
+    for name, result in results['benchmarks'].items():
+        old = baseline['benchmarks'].get(name)
+        if old is None or not old['p50_ms']:
+            print(f"{name:<48} {'-':>8} {result['p50_ms']:8.3f}      new")
+            continue
+        change = result['p50_ms'] / old['p50_ms'] - 1
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:<48} {old['p50_ms']:8.3f} {result['p50_ms']:8.3f} {change:+8.1%}{flag}")
+    return regressions
+
+
+def anonymize_page(html, address, number=100):
+    """
+    Replaces the personal and identifying details of a saved page with
+    placeholders so it can be checked in: the address (from the file name
+    and from the page), agent and broker names, phone numbers, emails, ZPIDs
+    and photo IDs. The markup is left alone, so the selectors see the same
+    structure. This is best effort; review the output before committing it.
+
+    Args:
+        html (str): The page HTML.
+        address (str): The property address, e.g. from the file name.
+        number (int): House number for the placeholder address.
+
+    Returns:
+        str: The anonymized HTML.
+    """
+    tree = make_tree(html)
+    street = f'{number} {PLACEHOLDER_STREET}'
+    replacements = {}
+
+    def add_address(text):
+        parts = [part.strip() for part in (text or '').replace('\xa0', ' ').split(',')]
+        # Only text that starts like a street address: '12 Main St, Santa Fe, NM 87501'
+        if not re.match(r'\d+\s+\S', parts[0]):
+            return
+        replacements[parts[0]] = street
+        # URLs spell it with hyphens: '12-Main-St'
+        replacements[re.sub(r'[^A-Za-z0-9]+', '-', parts[0]).strip('-')] = street.replace(' ', '-')
+        if len(parts) > 1 and len(parts[1]) > 2:
+            replacements[parts[1]] = PLACEHOLDER_CITY
+
+    add_address(file_manager.extract_address(tree))
+    for field in ('gallery_address', 'details'):
+        element = select_one(tree, field)
+        if element is not None:
+            heading = element.find('.//h1')
+            add_address(text_of(heading if heading is not None else element, ' '))
+    if address and re.match(r'\d+\s+\S', address):
+        replacements[address] = f'{street} {PLACEHOLDER_CITY} {PLACEHOLDER_STATE_ZIP}'
+        replacements[re.sub(r'[^A-Za-z0-9]+', '-', address).strip('-')] = \
+            f'{street} {PLACEHOLDER_CITY} {PLACEHOLDER_STATE_ZIP}'.replace(' ', '-')
+    for field, placeholder in (('mls.agent', PLACEHOLDER_AGENT), ('mls.broker', PLACEHOLDER_BROKER)):
+        for element in select_all(tree, field):
+            name = element.find('.//span')
+            if name is not None and text_of(name):
+                replacements[text_of(name)] = placeholder
+
+    # Longest first, so a full address is replaced before its street part;
+    # whole words only, so a name never rewrites part of a class name
+    for original in sorted(replacements, key=len, reverse=True):
+        pattern = r'(?<![\w-])' + re.escape(original) + r'(?![\w-])'
+        html = re.sub(pattern, lambda match, text=replacements[original]: text, html)
+    html = PHONE_REGEX.sub(PLACEHOLDER_PHONE, html)
+    html = EMAIL_REGEX.sub(PLACEHOLDER_EMAIL, html)
+    html = ZPID_REGEX.sub(PLACEHOLDER_ZPID, html)
+    return PHOTO_REGEX.sub(lambda match: hashlib.sha256(match.group(0).encode()).hexdigest()[:len(match.group(0))],
+                           html)
+
+
+def anonymize_files(file_paths, output_folder=CORPUS_FOLDER):
+    """
+    Anonymizes saved pages into the corpus folder, numbering the placeholder
+    addresses after the pages already there.
+
+    Returns:
+        list: The files written.
+    """
+    output_folder = Path(output_folder)
+    output_folder.mkdir(parents=True, exist_ok=True)
+    number = 100 + len(list(output_folder.glob('*.zlw')))
+    written = []
+    for file_path in map(Path, file_paths):
+        html = file_path.read_text(encoding='utf-8')
+        anonymized = anonymize_page(html, file_manager.property_address_from_filename(file_path.name), number)
+        name = f'{number} {PLACEHOLDER_STREET} {PLACEHOLDER_CITY} {PLACEHOLDER_STATE_ZIP}'.replace(' ', '_')
+        output_path = output_folder / f'{name}.zlw'
+        output_path.write_text(anonymized, encoding='utf-8')
+        written.append(output_path)
+        number += 1
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Zillow page extractors against a corpus of saved pages.')
+    subparsers = parser.add_subparsers(dest='command')
+
+    run_parser = subparsers.add_parser('run', help='Run the benchmarks (the default).')
+    run_parser.add_argument('corpus',
+                            nargs='*',
+                            default=[str(path) for path in DEFAULT_CORPUS],
+                            help='Pages, or folders of .zlw/.html pages. Defaults to element.html and benchmark_corpus/.')
+    run_parser.add_argument('--repeats',
+                            type=int,
+                            default=DEFAULT_REPEATS,
+                            help=f'Calls per page for each benchmark. Defaults to {DEFAULT_REPEATS}.')
+    run_parser.add_argument('--only',
+                            help='Only run benchmarks whose name contains this text.')
+    run_parser.add_argument('-o', '--output',
+                            help='Save the results as JSON to this file.')
+    run_parser.add_argument('--compare',
+                            help='Compare against results saved by an earlier run.')
+    run_parser.add_argument('--fail-on-regression',
+                            action='store_true',
+                            help=f'Exit with status 1 if a median latency grew by more than {REGRESSION_THRESHOLD:.0%}.')
+
+    anonymize_parser = subparsers.add_parser('anonymize', help='Add anonymized copies of saved pages to the corpus.')
+    anonymize_parser.add_argument('files', nargs='+', help='.zlw files to anonymize.')
+    anonymize_parser.add_argument('-o', '--output_folder',
+                                  default=str(CORPUS_FOLDER),
+                                  help=f'Where to write them. Defaults to "{CORPUS_FOLDER}".')
+
+    args = parser.parse_args(sys.argv[1:] if len(sys.argv) > 1 and sys.argv[1] in ('run', 'anonymize', '-h', '--help')
+                             else ['run', *sys.argv[1:]])
+
+    if args.command == 'anonymize':
+        for output_path in anonymize_files(args.files, args.output_folder):
+            print(f"Wrote {output_path}; check it for anything identifying before committing.")
+        return
+
+    pages = load_corpus(args.corpus)
+    if not pages:
+        print("No pages found in the corpus.")
+        sys.exit(1)
+    results = run_benchmarks(pages, args.repeats, args.only)
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {args.output}")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare_results(json.load(f), results)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,163 @@
-import requests
 import json
 import os
+import re
+import sqlite3
+import threading
+import time
+import zillow_trace as trace
+import zillow_logging
+
+log = zillow_logging.get_logger(__name__)
 
 GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')
 
-def get_city_from_address(address):
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+
+# Geocode responses are cached on disk, keyed on the normalized address.
+# Addresses don't move, so entries live for a long time; set
+# GEOCODE_CACHE_PATH to keep the cache somewhere else.
+GEOCODE_CACHE_PATH = os.getenv('GEOCODE_CACHE_PATH',
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), 'geocode_cache.db'))
+GEOCODE_CACHE_TTL = 180 * 24 * 60 * 60  # seconds
+
+# Only definitive answers are cached; errors and quota responses are retried next time.
+CACHEABLE_STATUSES = ('OK', 'ZERO_RESULTS')
+
+_session = None
+_session_lock = threading.Lock()
+_cache_local = threading.local()
+
+
+def get_session():
     """
-    Uses the Google Maps Geocoding API to find the city from an address.
+    Returns the shared requests.Session used for all Geocoding API calls.
+    Reusing it keeps the HTTPS connection to Google open between requests
+    and retries transient server errors with backoff.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            # requests is only imported once there is something to fetch
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+            retries = Retry(total=3, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504))
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=8, max_retries=retries)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+
+def normalize_address(address):
+    """
+    Normalizes an address for use as a cache key, so that
+    "194 State Road 573, Espanola, NM" and "194 state road 573 Espanola NM"
+    share one entry.
+    """
+    return re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', ' ', address.lower())).strip()
+
+
+def _cache_connection(cache_path):
+    # One connection per thread and per process; sqlite connections must not
+    # be shared across a fork.
+    key = (os.getpid(), cache_path)
+    connections = getattr(_cache_local, 'connections', None)
+    if connections is None:
+        connections = _cache_local.connections = {}
+    conn = connections.get(key)
+    if conn is None:
+        conn = sqlite3.connect(cache_path, timeout=30)
+        conn.execute("PRAGMA journal_mode = WAL;")
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS geocode_cache (
+            address_key TEXT PRIMARY KEY,
+            address TEXT NOT NULL,
+            response TEXT NOT NULL,
+            fetched_at REAL NOT NULL
+        );
+        """)
+        conn.commit()
+        connections[key] = conn
+    return conn
+
+
+def _read_cache(address_key, cache_path, ttl):
+    try:
+        row = _cache_connection(cache_path).execute(
+            "SELECT response, fetched_at FROM geocode_cache WHERE address_key = ?;", (address_key,)
+        ).fetchone()
+    except sqlite3.Error as e:
+        log.warning("Geocode cache read failed: %s", e)
+        return None
+    if row is None or time.time() - row[1] > ttl:
+        return None
+    return json.loads(row[0])
+
+
+def _write_cache(address_key, address, data, cache_path):
+    try:
+        conn = _cache_connection(cache_path)
+        conn.execute(
+            "INSERT OR REPLACE INTO geocode_cache (address_key, address, response, fetched_at) VALUES (?, ?, ?, ?);",
+            (address_key, address, json.dumps(data), time.time()))
+        conn.commit()
+    except sqlite3.Error as e:
+        log.warning("Geocode cache write failed: %s", e)
+
+
+def geocode(address, cache_path=GEOCODE_CACHE_PATH, ttl=GEOCODE_CACHE_TTL):
+    """
+    Returns the full Geocoding API response for an address, from the cache
+    when a fresh entry exists and from the API otherwise.
+
+    Args:
+        address (str): The address to look up.
+        cache_path (str, optional): The cache database; None disables caching.
+        ttl (float): Maximum age of a cached response, in seconds.
+
+    Returns:
+        dict: The decoded JSON response, or None if the request failed.
     """
-    base_url = "https://maps.googleapis.com/maps/api/geocode/json"
+    address_key = normalize_address(address)
+    if cache_path:
+        data = _read_cache(address_key, cache_path, ttl)
+        if data is not None:
+            trace.count('geocode.cache_hits')
+            return data
+        trace.count('geocode.cache_misses')
+
+    import requests
     params = {
         "address": address,
         "key": GOOGLE_MAPS_API_KEY
     }
-    
     try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()  # Raise an HTTPError for bad responses
-        data = response.json()
-        
+        with trace.span('geocode.request'):
+            response = get_session().get(GEOCODE_URL, params=params, timeout=10)
+            response.raise_for_status()  # Raise an HTTPError for bad responses
+            data = response.json()
+    except requests.exceptions.RequestException as e:
+        log.error("API request failed: %s", e)
+        return None
+    except ValueError as e:
+        log.error("API returned invalid JSON: %s", e)
+        return None
+
+    if cache_path and data.get('status') in CACHEABLE_STATUSES:
+        _write_cache(address_key, address, data, cache_path)
+    return data
+
+
+def get_city_from_address(address):
+    """
+    Uses the Google Maps Geocoding API to find the city from an address.
+    """
+    data = geocode(address)
+    if not data:
+        return None
+
+    try:
         # Check if the API returned a valid result
         if data['status'] == 'OK':
             # Extract the city from the address components
@@ -27,13 +166,11 @@ def get_city_from_address(address):
                 # 'locality' is the type for the city
                 if 'locality' in component['types']:
                     return component['long_name']
-                    
-    except requests.exceptions.RequestException as e:
-        print(f"API request failed: {e}")
+
     except (KeyError, IndexError):
         # Handle cases where the expected data structure is not found
-        print("Could not parse city from API response.")
-    
+        log.warning("Could not parse city from API response.")
+
     return None
 
 
@@ -41,27 +178,19 @@ def get_formatted_address(address):
     """
     Uses the Google Maps Geocoding API to get the formatted address.
     """
-    base_url = "https://maps.googleapis.com/maps/api/geocode/json"
-    params = {
-        "address": address,
-        "key": GOOGLE_MAPS_API_KEY
-    }
-    
+    data = geocode(address)
+    if not data:
+        return None
+
     try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()  # Raise an HTTPError for bad responses
-        data = response.json()
-        
         # Check if the API returned a valid result
         if data['status'] == 'OK':
             return data['results'][0]['formatted_address']
-                    
-    except requests.exceptions.RequestException as e:
-        print(f"API request failed: {e}")
+
     except (KeyError, IndexError):
         # Handle cases where the expected data structure is not found
-        print("Could not parse formatted address from API response.")
-    
+        log.warning("Could not parse formatted address from API response.")
+
     return None
 
 if __name__ == "__main__":
@@ -74,4 +203,4 @@ if __name__ == "__main__":
     if city:
         print(f"The city is: {city}")
     else:
-        print("City not found or API request failed.")
\ No newline at end of file
+        print("City not found or API request failed.")
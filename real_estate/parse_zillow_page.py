@@ -1,15 +1,27 @@
 #!/usr/bin/env python3
 
 from pathlib import Path
-from bs4 import BeautifulSoup
 import re
 import os
 import argparse
+import contextlib
+import hashlib
+import json
 import sys
+from collections import namedtuple
 import zillow_property_manager as property_manager
 from zillow_image_manager import extract_image_src
 from zillow_file_manager import property_address_from_filename, save_file_lines
+from zillow_html import make_tree, text_of, read_subtrees, LISTING_SUBTREES
+from zillow_selectors import select_all, select_one
 from google_api import get_formatted_address
+import zillow_db
+import zillow_export
+import zillow_trace as trace
+import zillow_logging
+import real_estate_config
+
+log = zillow_logging.get_logger(__name__)
 
 
 # Get the directory of the current script
@@ -19,28 +31,41 @@ default_scrapes = 'page_scrapes'
 # Construct the full default file path
 default_scrapes_path = os.path.join(script_dir, default_scrapes)
 
+# Bump whenever the extractors or the Markdown layout change, so the next
+# format_scrape run regenerates every report instead of skipping unchanged inputs.
+PARSER_VERSION = 1
+# Kept in the output folder: fingerprints of the inputs behind each report
+FORMAT_MANIFEST_FILE = '.format_manifest.json'
+
+NON_DIGIT_REGEX = re.compile(r'[^\d]')
+
+# What a worker process hands back for one .zlw file: the Markdown report
+# lines, the stats to save and the structured export record, or an error
+# message if the file failed.
+ParsedScrape = namedtuple('ParsedScrape',
+                          ['file_name', 'name', 'lines', 'stats', 'listing_url', 'mtime', 'record', 'error'])
+
 
 def parse_zillow_stats(html_content):
     """
-    Parses Zillow stats from an HTML string using BeautifulSoup and regex.
+    Parses Zillow stats from an HTML string using the compiled selectors and regex.
 
     Args:
-        html_content (str): The HTML snippet containing the stats.
+        html_content (str or lxml element): The HTML snippet containing the stats.
 
     Returns:
         dict: A dictionary with the parsed stats, or None if the element is not found.
     """
-    soup = BeautifulSoup(html_content, 'lxml')
+    tree = make_tree(html_content)
     
-    # Use a regex to find the main <dl> element with 'StyledOverviewStats' in its class name.
-    stats_dl_regex = re.compile(r'StyledOverviewStats')
-    stats_dl = soup.find('dl', class_=stats_dl_regex)
+    # Find the main <dl> element with 'StyledOverviewStats' in its class name.
+    stats_dl = select_one(tree, 'stats')
 
-    if not stats_dl:
+    if stats_dl is None:
         return None
     
     # Find all <strong> tags within the <dl> element.
-    strong_tags = stats_dl.find_all('strong')
+    strong_tags = select_all(stats_dl, 'stats.values')
     
     if len(strong_tags) < 3:
         return None
@@ -48,9 +73,9 @@ def parse_zillow_stats(html_content):
     # Extract the data based on the order of the <strong> tags.
     # The regex `[^\d]` removes any non-digit character, including commas.
     
-    days_on_zillow_str = re.sub(r'[^\d]', '', strong_tags[0].get_text(strip=True))
-    views_str = re.sub(r'[^\d]', '', strong_tags[1].get_text(strip=True))
-    saves_str = re.sub(r'[^\d]', '', strong_tags[2].get_text(strip=True))
+    days_on_zillow_str = NON_DIGIT_REGEX.sub('', text_of(strong_tags[0]))
+    views_str = NON_DIGIT_REGEX.sub('', text_of(strong_tags[1]))
+    saves_str = NON_DIGIT_REGEX.sub('', text_of(strong_tags[2]))
     
     stats = {
         'days_on_zillow': int(days_on_zillow_str),
@@ -66,34 +91,34 @@ def parse_zillow_details(html_content):
     Extracts home details from the provided HTML content.
 
     Args:
-        html_content: A string containing the HTML.
+        html_content: A string containing the HTML, or an already parsed tree.
 
     Returns:
         A dictionary containing the price, address, beds, baths, and sqft,
         or None if the main container is not found.
     """
-    soup = BeautifulSoup(html_content, 'lxml')
-    details_container = soup.find('div', attrs={'data-testid': 'home-details-chip-container'})
+    tree = make_tree(html_content)
+    details_container = select_one(tree, 'details')
 
-    if not details_container:
+    if details_container is None:
         return None
 
-    price_span = details_container.find('span', attrs={'data-testid': 'price'})
-    price = price_span.get_text(strip=True) if price_span else None
+    price_span = select_one(details_container, 'details.price')
+    price = text_of(price_span) if price_span is not None else None
 
-    address_h1 = details_container.find('h1')
-    address = address_h1.get_text(strip=True) if address_h1 else None
+    address_h1 = select_one(details_container, 'details.address')
+    address = text_of(address_h1) if address_h1 is not None else None
 
-    facts_container = details_container.find('div', attrs={'data-testid': 'bed-bath-sqft-facts'})
+    facts_container = select_one(details_container, 'details.facts')
     beds = None
     baths = None
     sqft = None
 
-    if facts_container:
+    if facts_container is not None:
         # This is a more robust way to get all the facts, regardless of order
-        for fact in facts_container.find_all(attrs={'data-testid': 'bed-bath-sqft-fact-container'}):
-            value = fact.find('span', class_=[ '--medium']).get_text(strip=True)
-            description = fact.find('span', class_=[ 'koMNUa']).get_text(strip=True) # This class seems to be for the description text
+        for fact in select_all(facts_container, 'details.fact'):
+            value = text_of(select_one(fact, 'details.fact_value'))
+            description = text_of(select_one(fact, 'details.fact_label')) # This class seems to be for the description text
             if 'bed' in description:
                 beds = value
             elif 'bath' in description:
@@ -128,42 +153,42 @@ def parse_zillow_description(html_content):
     Extracts the description text from the provided HTML content.
 
     Args:
-        html_content: A string containing the HTML.
+        html_content: A string containing the HTML, or an already parsed tree.
 
     Returns:
         The description text as a string, or None if not found.
     """
-    soup = BeautifulSoup(html_content, 'lxml')
-    description_div = soup.find('div', attrs={'data-testid': 'description'})
-    if description_div:
+    tree = make_tree(html_content)
+    description_div = select_one(tree, 'description')
+    if description_div is not None:
         # Find the specific div with the text, excluding the button text
-        text_div = description_div.find('div', class_='Text-c11n-8-111-1__sc-aiai24-0')
-        if text_div:
-            return text_div.get_text(strip=True)
+        text_div = select_one(description_div, 'description.text')
+        if text_div is not None:
+            return text_of(text_div)
     return None
 
 
 
 def parse_zillow_facts(html_content):
     """
-    Parses Zillow facts from an HTML string using BeautifulSoup.
+    Parses Zillow facts from an HTML string using the compiled selectors.
 
     Args:
-        html_content (str): The HTML snippet containing the facts.
+        html_content (str or lxml element): The HTML snippet containing the facts.
 
     Returns:
         dict: A nested dictionary with the parsed facts.
     """
-    soup = BeautifulSoup(html_content, 'lxml')
+    tree = make_tree(html_content)
 
     data = {}
-    for category_group in soup.find_all('div', {'data-testid': 'facts-and-features-module'}):
-        group_title = category_group.find('h3', class_=lambda x: x and 'StyledCategoryGroupHeading' in x).get_text(strip=True)
+    for category_group in select_all(tree, 'facts'):
+        group_title = text_of(select_one(category_group, 'facts.group_title'))
         data[group_title] = {}
-        for fact_category in category_group.find_all('div', {'data-testid': 'fact-category'}):
-            category_title_tag = fact_category.find('h6', class_=lambda x: x and 'StyledHeading' in x)
-            category_title = category_title_tag.get_text(strip=True) if category_title_tag else 'Miscellaneous'
-            data[group_title][category_title] = [li.get_text(strip=True) for li in fact_category.find_all('li')]
+        for fact_category in select_all(category_group, 'facts.category'):
+            category_title_tag = select_one(fact_category, 'facts.category_title')
+            category_title = text_of(category_title_tag) if category_title_tag is not None else 'Miscellaneous'
+            data[group_title][category_title] = [text_of(li) for li in select_all(fact_category, 'facts.item')]
 
     # print(data)
     return data
@@ -226,15 +251,15 @@ def extract_source_info(mls_info_div):
     """
     source_data = {}
     # Find the div that contains the source information.
-    # We use a lambda function to find any class that contains 'Spacer',
+    # The selector matches any class that contains 'Spacer',
     # as this is more likely to be stable than the full class name.
     # The search is restricted to the mls_info_div passed to this function.
-    source_info_div = mls_info_div.find('div', class_=lambda x: x and 'Spacer' in x)
-    if source_info_div:
+    source_info_div = select_one(mls_info_div, 'mls.source_info')
+    if source_info_div is not None:
         # Get all span tags within the identified div
-        spans = source_info_div.find_all('span')
+        spans = select_all(source_info_div, 'mls.source_item')
         for span in spans:
-            text = span.get_text(strip=True)
+            text = text_of(span)
             if "Source:" in text:
                 # Remove prefix, then the trailing comma, and finally strip whitespace
                 clean_text = text.replace('Source:', '').replace(',', '').strip()
@@ -254,38 +279,38 @@ def extract_mls_data(html_content):
     Extracts MLS information from a given HTML string.
 
     Args:
-        html_content (str): The HTML content of the webpage.
+        html_content (str or lxml element): The HTML content of the webpage.
 
     Returns:
         dict: A dictionary containing the extracted MLS data.
     """
-    soup = BeautifulSoup(html_content, 'lxml')
+    tree = make_tree(html_content)
 
     data = {}
 
     # Find the main MLS information div
-    mls_info_div = soup.find('div', {'aria-label': 'MLS information'})
-    if not mls_info_div:
-        print("Could not find the main MLS information div.")
+    mls_info_div = select_one(tree, 'mls')
+    if mls_info_div is None:
+        log.debug("Could not find the main MLS information div.")
         return data
 
     # Extract the 'Listing updated' date
-    listing_updated_tag = mls_info_div.find('p', {'data-testid': 'current-list-attribution-last-updated'})
-    if listing_updated_tag:
-        # The text is split across a <span> and a text node, so we use .get_text()
-        data['Listing updated'] = listing_updated_tag.get_text(strip=True).replace('Listing updated:', '').strip()
+    listing_updated_tag = select_one(mls_info_div, 'mls.updated')
+    if listing_updated_tag is not None:
+        # The text is split across a <span> and a text node, so we join all of it
+        data['Listing updated'] = text_of(listing_updated_tag).replace('Listing updated:', '').strip()
 
     # Extract the agent and broker information
-    listed_by_div = mls_info_div.find('div', {'data-testid': 'seller-attribution'})
-    if listed_by_div:
-        agent_tag = listed_by_div.find('p', {'data-testid': 'attribution-LISTING_AGENT'})
-        if agent_tag:
-            # .get_text(separator=' ', strip=True) joins the text nodes with a space
-            data['Listed by agent'] = agent_tag.get_text(separator=' ', strip=True)
+    listed_by_div = select_one(mls_info_div, 'mls.listed_by')
+    if listed_by_div is not None:
+        agent_tag = select_one(listed_by_div, 'mls.agent')
+        if agent_tag is not None:
+            # text_of(..., ' ') joins the text nodes with a space
+            data['Listed by agent'] = text_of(agent_tag, ' ')
 
-        broker_tag = listed_by_div.find('p', {'data-testid': 'attribution-BROKER'})
-        if broker_tag:
-            data['Listed by broker'] = broker_tag.get_text(separator=' ', strip=True)
+        broker_tag = select_one(listed_by_div, 'mls.broker')
+        if broker_tag is not None:
+            data['Listed by broker'] = text_of(broker_tag, ' ')
 
     # Extract source, MLS number, and originating MLS using the new helper function
     source_info = extract_source_info(mls_info_div)
@@ -294,17 +319,208 @@ def extract_mls_data(html_content):
     return data
 
 
+def extract_listing_url(html_content, address=None):
+    """
+    Finds the Zillow URL of the listing a page describes.
+
+    Full page dumps carry it in the canonical link or og:url meta tag. Saved
+    page fragments don't, so as a fallback we look for a '_zpid' link whose
+    path contains the listing's own address; links to other homes on the page
+    never match.
+
+    Args:
+        html_content (str or lxml element): The HTML content of the webpage.
+        address (str, optional): The property address, e.g. from the file name.
+
+    Returns:
+        str: The listing URL, or None if it cannot be determined.
+    """
+    tree = make_tree(html_content)
+
+    canonical = select_one(tree, 'canonical_link')
+    if canonical is not None and property_manager.get_property_id_from_url(canonical.get('href', '')):
+        return canonical.get('href')
+
+    og_url = select_one(tree, 'og_url')
+    if og_url is not None and property_manager.get_property_id_from_url(og_url.get('content', '')):
+        return og_url.get('content')
+
+    if address:
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', address).strip('-').lower()
+        for link in select_all(tree, 'zpid_link'):
+            href = link.get('href')
+            if slug and slug in href.lower():
+                return href
+
+    return None
+
+
+class ListingDocument:
+    """
+    A Zillow listing page parsed once and shared by every extractor.
+
+    The module-level parse functions each accept either a string or a parsed
+    tree; this class builds the tree a single time and hands it to all of them,
+    so a listing costs one parse instead of one per extractor.
+
+    Args:
+        html_content (str or lxml element): The HTML of the listing page.
+    """
+
+    def __init__(self, html_content):
+        self.tree = make_tree(html_content)
+
+    @classmethod
+    def from_file(cls, file_path):
+        """
+        Streams a saved page, keeping only the subtrees the extractors read,
+        instead of loading and parsing the whole file.
+        """
+        return cls(read_subtrees(file_path, LISTING_SUBTREES))
+
+    def stats(self):
+        return parse_zillow_stats(self.tree)
 
+    def details(self):
+        return parse_zillow_details(self.tree)
+
+    def description(self):
+        return parse_zillow_description(self.tree)
+
+    def facts(self):
+        return parse_zillow_facts(self.tree)
+
+    def mls_data(self):
+        return extract_mls_data(self.tree)
+
+    def image_src(self):
+        return extract_image_src(self.tree)
+
+    def listing_url(self, address=None):
+        return extract_listing_url(self.tree, address)
+
+
+
+
+def save_listing_snapshot(writer, parsed):
+    """
+    Queues a parsed listing's stats on the database writer.
+
+    Args:
+        writer (ScrapeResultWriter): The batched database writer.
+        parsed (ParsedScrape): The parsed .zlw file; its modification time is
+            the scrape date.
+    """
+    if not parsed.stats:
+        return
+    url = parsed.listing_url
+    property_id = property_manager.get_property_id_from_url(url) if url else None
+    if not property_id:
+        log.warning("No Zillow listing URL found in %s; stats not saved to the database.", parsed.file_name)
+        return
+    stats = parsed.stats
+    writer.add(property_id, parsed.name, url,
+               stats['days_on_zillow'], stats['views'], stats['saves'],
+               scrape_date=zillow_db.scrape_timestamp(parsed.mtime))
+
+
+def load_format_manifest(output_folder):
+    """
+    Loads the manifest of inputs already formatted into output_folder.
+    A manifest written by a different PARSER_VERSION is treated as empty.
+
+    Returns:
+        dict: Maps .zlw file names to their size, mtime_ns and sha256, and
+        'db': True once the file's stats are stored in the database.
+    """
+    manifest_path = Path(output_folder) / FORMAT_MANIFEST_FILE
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        log.warning("Ignoring unreadable manifest %s: %s", manifest_path, e)
+        return {}
+    if manifest.get('parser_version') != PARSER_VERSION:
+        return {}
+    return manifest.get('files', {})
+
+
+def save_format_manifest(output_folder, files):
+    """Writes the manifest atomically, so an interrupted run can't corrupt it."""
+    manifest_path = Path(output_folder) / FORMAT_MANIFEST_FILE
+    temp_path = manifest_path.with_name(manifest_path.name + '.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'parser_version': PARSER_VERSION, 'files': files}, f, indent=1, sort_keys=True)
+    os.replace(temp_path, manifest_path)
+
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_unchanged(file_path, entry, output_path):
+    """
+    Checks an input against its manifest entry. Size and mtime are compared
+    first; the content hash is only computed when they differ, so a file that
+    was merely touched is still recognized as unchanged.
 
-def format_scrape(scrapes_folder_path = default_scrapes_path, output_folder_path = default_scrapes_path):
+    Args:
+        file_path (Path): The .zlw input.
+        entry (dict): Its manifest entry, or None.
+        output_path (Path): The Markdown report it produces.
+
+    Returns:
+        tuple: (unchanged, fingerprint) where fingerprint is the file's
+        current manifest entry.
+    """
+    stat = file_path.stat()
+    fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if not entry or not output_path.exists():
+        fingerprint['sha256'] = file_sha256(file_path)
+        return False, fingerprint
+    if entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+        fingerprint['sha256'] = entry.get('sha256')
+        return True, fingerprint
+    fingerprint['sha256'] = file_sha256(file_path)
+    return fingerprint['sha256'] == entry.get('sha256'), fingerprint
+
+
+def format_scrape(scrapes_folder_path = default_scrapes_path, output_folder_path = default_scrapes_path,
+                  db_path = zillow_db.DEFAULT_DB_PATH, force = False, workers = None,
+                  export = True, parquet = False, compact = False):
+    """
+    Formats every .zlw page scrape in a folder into a Markdown report and,
+    unless db_path is None, saves each listing's stats to the database.
+
+    Inputs whose size, mtime or content hash match the manifest from the
+    previous run (and whose report still exists) are skipped; force=True
+    reprocesses everything. With a database, so are inputs whose stats the
+    manifest doesn't record as stored, e.g. after a run with db_path=None.
+    The manifest is written once the database writer has flushed.
+
+    Parsing is spread over `workers` processes (default: os.cpu_count());
+    reports and database rows are still written by this process, in file
+    name order.
+
+    Unless export is False, every listing is also written as a structured
+    record to listings.jsonl in the output folder (and listings.parquet when
+    parquet is True); see zillow_export.ListingExporter.
+
+    compact=True only saves stats that changed since the previous snapshot
+    of the listing; see zillow_db.ScrapeResultWriter.
+    """
     
     scrapes_folder = Path(scrapes_folder_path)
     output_folder = Path(output_folder_path)
     # Create the output directory if it doesn't exist
     output_folder.mkdir(parents=True, exist_ok=True)
-    print(f"Parsed files will be saved in: {output_folder}")
-
-    print('Scrape Zillow listings')
+    log.info("Parsed files will be saved in: %s", output_folder)
 
     # Check if the directory exists first
     try:
@@ -312,121 +528,261 @@ def format_scrape(scrapes_folder_path = default_scrapes_path, output_folder_path
             raise FileNotFoundError(f"The directory '{scrapes_folder}' was not found.")
 
     except FileNotFoundError:
-        print(f"Error: The folder {zlw_files} was not found.")
+        log.error("The folder %s was not found.", scrapes_folder)
         sys.exit(1)
 
     # Use a generator expression to find all files with a .zlw extension
-    zlw_files = scrapes_folder.glob('*.zlw')
+    zlw_files = sorted(scrapes_folder.glob('*.zlw'))
         
-    print(f"\nListings from: {scrapes_folder}")
+    log.info("Listings from: %s", scrapes_folder)
 
-    for file_path in zlw_files:
+    previous = {} if force else load_format_manifest(output_folder)
+    files = {}
+    stored = []
+    formatted = 0
+    skipped = 0
+    failed = 0
 
-        file_lines = [] 
-        
-        # Print the name of the file being processed
-        print(f"Reading content from: {file_path.name}")
-    
-        try:
-            # Open the file for reading ('r') with the 'with' statement
-            with open(file_path, 'r', encoding='utf-8') as f:
-                # Read the entire content of the file into a single string
-                content = f.read()
-            stats = parse_zillow_stats(content)
-            details = parse_zillow_details(content)
-            description = parse_zillow_description(content)
-            facts = parse_zillow_facts(content)
-            listing_data = extract_mls_data(content)
+    writer = None
+    try:
+        with contextlib.ExitStack() as stack:
+            exporter = None
+            if db_path:
+                repository = stack.enter_context(zillow_db.ZillowRepository(db_path))
+                writer = stack.enter_context(zillow_db.ScrapeResultWriter(repository, compact=compact))
+            if export:
+                parquet_path = output_folder / zillow_export.LISTINGS_PARQUET_FILE if parquet else None
+                exporter = stack.enter_context(
+                    zillow_export.ListingExporter(output_folder / zillow_export.LISTINGS_JSONL_FILE, parquet_path))
+                exporter.retain(file_path.name for file_path in zlw_files)
+            pending = []
+            fingerprints = {}
+            for file_path in zlw_files:
+                entry = previous.get(file_path.name)
+                unchanged, fingerprint = is_unchanged(file_path, entry, output_folder / (file_path.name + '.md'))
+                if (unchanged and (exporter is None or exporter.has(file_path.name))
+                        and (writer is None or entry.get('db'))):
+                    if entry.get('db'):
+                        fingerprint['db'] = True
+                    files[file_path.name] = fingerprint
+                    skipped += 1
+                else:
+                    pending.append(file_path)
+                    fingerprints[file_path.name] = fingerprint
+
+            trace.count('files.skipped', skipped)
+            for parsed in parse_scrape_files(pending, workers):
+                if write_scrape_report(parsed, output_folder, writer, exporter):
+                    files[parsed.file_name] = fingerprints[parsed.file_name]
+                    if writer is not None:
+                        stored.append(parsed.file_name)
+                    formatted += 1
+                else:
+                    failed += 1
+        # Closing the stack flushed the writer; only now are the stats stored
+        if writer is None or not writer.pending:
+            for file_name in stored:
+                files[file_name]['db'] = True
+    finally:
+        if writer is not None and writer.pending:
+            log.warning("%d scrape results were not saved; their files will be formatted again next time.",
+                        writer.pending)
+        save_format_manifest(output_folder, files)
+
+    log.info("Formatted %d listings, skipped %d unchanged, %d failed.", formatted, skipped, failed)
+
+
+def parse_scrape_file(file_path):
+    """
+    Parses a single .zlw page scrape into its Markdown report lines and stats.
+    Writes nothing, so it can run in a worker process; see write_scrape_report.
+
+    Args:
+        file_path (Path): The .zlw file.
+
+    Returns:
+        ParsedScrape: The parsed listing, or one with `error` set if the file
+        couldn't be read.
+    """
+    file_path = Path(file_path)
+    file_lines = [] 
+
+    try:
+        # Stream the page once, keep only what the extractors need and run
+        # every extractor against the same small tree
+        with trace.span('parse.read', file=file_path.name):
+            document = ListingDocument.from_file(file_path)
+        with trace.span('parse.extract'):
+            stats = document.stats()
+            details = document.details()
+            description = document.description()
+            facts = document.facts()
+            listing_data = document.mls_data()
             name = property_address_from_filename(file_path.name)
-            image = extract_image_src(content)
+            image = document.image_src()
 
-            if image:
-                print(f"![{name}]({image})")
-                file_lines.append(f"![{name}]({image})")
-            else:
-                print("No image URL found.")
+        if image:
+            file_lines.append(f"![{name}]({image})")
 
+        with trace.span('parse.geocode'):
             address = get_formatted_address(name)
-            print(f"\n## Property: {name}")
-            file_lines.append(f"\n## Property: {name}")
-            if address:
-                print(f"## Address: {address}")
-                file_lines.append(f"### Address: {address}")
-            else:
-                print("No formatted address found.")
-                file_lines.append("No formatted address found.")
-
-            # Get the MLS ID from the listing_data
-            id = listing_data.get('MLS#', 'N/A')
-            print(f"### MLS Property ID: {id}")
-            file_lines.append(f"### MLS Property ID: {id}")
-
-            if details:
-                formatted_details = format_details(details)
-                print(f"## {formatted_details}")
-                file_lines.append(f"## {formatted_details}")
-
-
-            print("\n---\n -- Stats --")
-
-            if stats:
-                #print(f"Stats for {url}:")
-                for key, value in stats.items():
-                    print(f"  - {key.replace('_', ' ').capitalize()}: {value}")
-                    file_lines.append(f"  - {key.replace('_', ' ').capitalize()}: {value}")
-            else:
-                print(f"No stats retrieved for {name}.")
-                file_lines.append(f"No stats retrieved for {name}.")
-
-            print("\n---\n")
-            if listing_data:
-                print("## MLS Data:")
-                file_lines.append("## MLS Data:")
-                for key, value in listing_data.items():
-                    print(f"  - {key}: {value}")
-                    file_lines.append(f"  - {key}: {value}")
-            else:
-                print(f"No MLS data retrieved for {name}.")  
-                file_lines.append(f"No MLS data retrieved for {name}.")
-
-            print("\n---\n")
-
-            if description:
-                print("## Description:")
-                file_lines.append("## Description:")
-                print(description)
-                file_lines.append(description)
-
-            if facts:
-                formatted_description = format_zillow_data(facts)
-                print("## Facts:")
-                file_lines.append("## Facts:")
-                file_lines.append(formatted_description)
-                print(formatted_description)
-            else:
-                print(f"No facts retrieved for {name}.")
-                file_lines.append(f"No facts retrieved for {name}.")
-
-            print("\n---\n")
-            file_lines.append("\n---\n")
-                    
-            save_file_lines(file_lines, Path(output_folder) / (file_path.name + '.md'))
-
-            print(f"Finished processing {file_path.name}")
-
-        except IOError as e:
-            # Catch any potential file I/O errors (e.g., permission denied)
-            print(f"Error reading file {file_path}: {e}")
-        except UnicodeDecodeError as e:
-            # Catch encoding errors if the file isn't UTF-8
-            print(f"Encoding error with file {file_path}: {e}")
-
-
-
-def main():
+        file_lines.append(f"\n## Property: {name}")
+        if address:
+            file_lines.append(f"### Address: {address}")
+        else:
+            file_lines.append("No formatted address found.")
+
+        # Get the MLS ID from the listing_data
+        id = listing_data.get('MLS#', 'N/A')
+        file_lines.append(f"### MLS Property ID: {id}")
+
+        if details:
+            formatted_details = format_details(details)
+            file_lines.append(f"## {formatted_details}")
+
+        if stats:
+            #print(f"Stats for {url}:")
+            for key, value in stats.items():
+                file_lines.append(f"  - {key.replace('_', ' ').capitalize()}: {value}")
+        else:
+            file_lines.append(f"No stats retrieved for {name}.")
+
+        if listing_data:
+            file_lines.append("## MLS Data:")
+            for key, value in listing_data.items():
+                file_lines.append(f"  - {key}: {value}")
+        else:
+            file_lines.append(f"No MLS data retrieved for {name}.")
+
+        if description:
+            file_lines.append("## Description:")
+            file_lines.append(description)
+
+        if facts:
+            formatted_description = format_zillow_data(facts)
+            file_lines.append("## Facts:")
+            file_lines.append(formatted_description)
+        else:
+            file_lines.append(f"No facts retrieved for {name}.")
+
+        file_lines.append("\n---\n")
+
+        listing_url = document.listing_url(name)
+        stat = file_path.stat()
+        mtime = stat.st_mtime
+        trace.count('files.parsed')
+        trace.count('bytes.read', stat.st_size)
+        record = zillow_export.listing_record(file_path.name, name, mtime, stats, details, listing_data, facts,
+                                              description, image, listing_url, address)
+        return ParsedScrape(file_path.name, name, file_lines, stats, listing_url, mtime, record, None)
+
+    except IOError as e:
+        # Catch any potential file I/O errors (e.g., permission denied)
+        error = f"Error reading file {file_path}: {e}"
+    except UnicodeDecodeError as e:
+        # Catch encoding errors if the file isn't UTF-8
+        error = f"Encoding error with file {file_path}: {e}"
+    return ParsedScrape(file_path.name, None, None, None, None, None, None, error)
+
+
+def write_scrape_report(parsed, output_folder, writer=None, exporter=None):
+    """
+    Writes a parsed scrape's Markdown report, queues its stats on the
+    database writer and adds its record to the exporter. Runs in the parent
+    process, in input order.
+
+    Args:
+        parsed (ParsedScrape): The result of parse_scrape_file.
+        output_folder (Path): Where the .md report is written.
+        writer (ScrapeResultWriter, optional): The batched database writer.
+        exporter (ListingExporter, optional): The structured export.
+
+    Returns:
+        bool: True if the report was written, False if the file failed to parse.
+    """
+    if parsed.error:
+        log.error(parsed.error)
+        return False
+
+    log.debug("Report for %s:\n%s", parsed.file_name, '\n'.join(parsed.lines))
+    with trace.span('report.write', file=parsed.file_name):
+        save_file_lines(parsed.lines, Path(output_folder) / (parsed.file_name + '.md'))
+
+    if writer is not None:
+        save_listing_snapshot(writer, parsed)
+    if exporter is not None:
+        exporter.add(parsed.record)
+
+    log.debug("Finished processing %s", parsed.file_name)
+    return True
+
+
+def format_scrape_file(file_path, output_folder, writer=None):
+    """
+    Formats a single .zlw page scrape in this process; see format_scrape.
+
+    Returns:
+        bool: True if the report was written, False if the file couldn't be read.
+    """
+    return write_scrape_report(parse_scrape_file(file_path), output_folder, writer)
+
+
+def parse_scrape_files(file_paths, workers=None):
+    """
+    Parses .zlw files across a pool of worker processes.
+
+    Results are yielded in the order of file_paths, whatever order the
+    workers finish in. A file whose worker raises is reported as a
+    ParsedScrape with `error` set rather than stopping the batch.
+
+    Args:
+        file_paths (list): The .zlw files to parse.
+        workers (int, optional): Worker processes; defaults to os.cpu_count().
+            1 parses in this process.
+
+    Yields:
+        ParsedScrape: One per file, in input order.
+    """
+    workers = max(1, min(workers or os.cpu_count() or 1, len(file_paths)))
+    if workers == 1:
+        for file_path in file_paths:
+            yield _parse_isolated(file_path)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    traced = trace.enabled()
+    with ProcessPoolExecutor(max_workers=workers, **zillow_logging.worker_options()) as executor:
+        futures = [executor.submit(_parse_traced, file_path, traced) for file_path in file_paths]
+        for file_path, future in zip(file_paths, futures):
+            try:
+                parsed, spans = future.result()
+                trace.merge(spans)
+                yield parsed
+            except Exception as e:
+                yield ParsedScrape(Path(file_path).name, None, None, None, None, None, None,
+                                   f"Error parsing file {file_path}: {e!r}")
+
+
+def _parse_isolated(file_path):
+    try:
+        return parse_scrape_file(file_path)
+    except Exception as e:
+        return ParsedScrape(Path(file_path).name, None, None, None, None, None, None,
+                            f"Error parsing file {file_path}: {e!r}")
+
+
+def _parse_traced(file_path, traced):
+    # Worker processes trace into memory and hand the spans back with the result
+    with trace.capture(traced) as tracer:
+        parsed = parse_scrape_file(file_path)
+    return parsed, tracer.export() if tracer is not None else None
+
+
+
+def main(argv=None, prog=None):
 
     """Main function to handle command-line arguments and run the scraper."""
-    parser = argparse.ArgumentParser(description='Scrape Zillow listing from scrape folder.')
+    parser = argparse.ArgumentParser(prog=prog, description='Scrape Zillow listing from scrape folder.')
    # Add the 'scrapes_folder' argument with the absolute default path
     parser.add_argument('scrapes_folder', 
                     nargs='?', 
@@ -436,9 +792,39 @@ def main():
                         type=str, 
                         default=default_scrapes_path,
                         help=f'Path to the output folder for scraped files. Defaults to "{default_scrapes_path}" if not provided.')
+    parser.add_argument('--db',
+                        type=str,
+                        default=zillow_db.DEFAULT_DB_PATH,
+                        help=f'SQLite database to save listing stats to. Defaults to "{zillow_db.DEFAULT_DB_PATH}".')
+    parser.add_argument('--no-db',
+                        action='store_true',
+                        help='Only write the Markdown reports; do not save stats to the database.')
+    parser.add_argument('--compact',
+                        action='store_true',
+                        help='Only save stats that changed since the previous scrape beyond the daily days-on-market tick.')
+    parser.add_argument('--force',
+                        action='store_true',
+                        help='Reformat every scrape, even those unchanged since the last run.')
+    parser.add_argument('--no-export',
+                        action='store_true',
+                        help='Do not write the structured listings.jsonl export.')
+    parser.add_argument('--parquet',
+                        action='store_true',
+                        help='Also write the export as listings.parquet (requires pyarrow).')
+    parser.add_argument('--workers',
+                        type=int,
+                        default=os.cpu_count(),
+                        help='Number of processes used to parse scrapes. Defaults to the number of CPU cores.')
+    trace.add_arguments(parser)
+    real_estate_config.add_arguments(parser)
+    zillow_logging.add_arguments(parser)
     
-    args = parser.parse_args()  
-    format_scrape(args.scrapes_folder, args.output_folder)
+    args = parser.parse_args(argv)
+    real_estate_config.from_arguments(args)
+    zillow_logging.from_arguments(args)
+    with trace.from_arguments(args, 'format'):
+        format_scrape(args.scrapes_folder, args.output_folder, None if args.no_db else args.db, args.force,
+                      args.workers, not args.no_export, args.parquet, args.compact)
         
 if __name__ == "__main__":
     main()
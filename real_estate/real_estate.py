@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+import sys
+
+# The real_estate tools behind one command:
+#
+#     python real_estate.py scrape zillow_listing_urls.txt --fast
+#     python real_estate.py format page_scrapes -o output
+#     python real_estate.py db info
+#
+# Only the subcommand being run is imported, and each module keeps its heavy
+# dependencies (Playwright, requests, lxml, pandas) inside the functions that
+# use them, so `--help` and short cron jobs don't pay for what they don't run.
+
+PROG = 'real_estate'
+
+# Subcommand -> (module whose main(argv, prog) runs it, one-line description)
+COMMANDS = {
+    'scrape': ('scrape_zillow', 'Scrape listing stats for a file of Zillow URLs.'),
+    'format': ('parse_zillow_page', 'Format saved .zlw pages into Markdown reports, stats and exports.'),
+    'rename': ('zillow_file_manager', 'Rename raw page scrapes after the address on the page.'),
+    'images': ('zillow_image_manager', 'Extract and download listing gallery images.'),
+    'db': ('zillow_db', 'Inspect the listings database: info, migrate, movers.'),
+}
+
+
+def usage():
+    lines = [f"usage: {PROG} <command> [options]", "", "commands:"]
+    for command, (_, description) in COMMANDS.items():
+        lines.append(f"  {command:<8} {description}")
+    lines += ["", f"Run '{PROG} <command> --help' for the options of a command."]
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    """
+    Runs one subcommand.
+
+    Args:
+        argv (list, optional): The arguments after the program name.
+            Defaults to sys.argv[1:].
+
+    Returns:
+        int: The exit status.
+    """
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        return 0 if argv else 2
+
+    command, rest = argv[0], argv[1:]
+    if command not in COMMANDS:
+        print(usage(), file=sys.stderr)
+        print(f"\n{PROG}: unknown command '{command}'", file=sys.stderr)
+        return 2
+
+    import importlib
+    module = importlib.import_module(COMMANDS[command][0])
+    module.main(rest, prog=f"{PROG} {command}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
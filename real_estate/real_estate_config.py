@@ -1,7 +1,206 @@
 import os
 import json
+import threading
+from dataclasses import dataclass, fields
+from typing import Optional
+import zillow_logging
 
-real_estate_config_path = os.path.expanduser('~/local_projects/config/real_estate.json')
+log = zillow_logging.get_logger(__name__)
+
+# Point RE_CONFIG_PATH at another file to use it instead
+DEFAULT_CONFIG_PATH = '~/local_projects/config/real_estate.json'
+real_estate_config_path = os.path.expanduser(os.getenv('RE_CONFIG_PATH', DEFAULT_CONFIG_PATH))
+
+
+@dataclass(frozen=True)
+class DefaultFolders:
+    """
+    The 'environment.default_folder' section: where each kind of file lives.
+    Every folder can be overridden by its RE_DEFAULT_FOLDER_<NAME> environment
+    variable; folders set nowhere are None.
+    """
+    page_scrapes: Optional[str] = None
+    image_scrapes: Optional[str] = None
+    logs: Optional[str] = None
+    output: Optional[str] = None
+    data: Optional[str] = None
+    test: Optional[str] = None
+    temp: Optional[str] = None
+
+
+class RealEstateConfig:
+    """
+    The project configuration from real_estate.json, read on first use.
+
+    Creating one does no I/O; the file is read once, the first time a
+    setting is asked for, and never when the environment already holds the
+    settings (RE_CONFIG_LOADED=true, as left by ensure_config()).
+    Pickling sends the resolved settings, so worker processes don't read
+    the file again.
+
+    Usage:
+        config = RealEstateConfig()
+        config.folders.logs
+        config.section('scraper')
+        config.override(logs='/var/log/real_estate').folders.logs
+
+    Args:
+        path (str, optional): The JSON file. Defaults to RE_CONFIG_PATH, or
+            ~/local_projects/config/real_estate.json.
+        overrides (dict, optional): Folder values that win over both the
+            environment and the file, e.g. from command-line options.
+    """
+
+    def __init__(self, path=None, overrides=None):
+        self.path = os.path.expanduser(path) if path else real_estate_config_path
+        self.overrides = {key: value for key, value in (overrides or {}).items() if value is not None}
+        self._data = None
+        self._folders = None
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        return (_restore_config, (self.path, self.overrides, self.data, self.folders))
+
+    @property
+    def data(self):
+        """The parsed file; {} if it is missing or unreadable."""
+        if self._data is None:
+            with self._lock:
+                if self._data is None:
+                    self._data = self._read()
+        return self._data
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            log.debug("No config file at %s", self.path)
+            return {}
+        except (OSError, json.JSONDecodeError) as e:
+            log.error("Error reading config file %s: %s", self.path, e)
+            return {}
+        if not isinstance(data, dict):
+            log.error("Config file %s does not hold a JSON object.", self.path)
+            return {}
+        return data
+
+    @property
+    def environment(self):
+        """The file's 'environment' section."""
+        value = self.data.get('environment', {})
+        return value if isinstance(value, dict) else {}
+
+    @property
+    def folders(self):
+        """The default folders (DefaultFolders), with overrides and environment variables applied."""
+        if self._folders is None:
+            self._folders = self._resolve_folders()
+        return self._folders
+
+    def _resolve_folders(self):
+        values = {}
+        from_file = None
+        for field in fields(DefaultFolders):
+            value = self.overrides.get(field.name) or os.getenv(f"RE_DEFAULT_FOLDER_{field.name.upper()}")
+            if value is None and os.getenv('RE_CONFIG_LOADED') != 'true':
+                # Only read the file for what the environment doesn't say
+                if from_file is None:
+                    from_file = self.environment.get('default_folder', {})
+                    from_file = from_file if isinstance(from_file, dict) else {}
+                value = from_file.get(field.name)
+            values[field.name] = os.path.expanduser(value) if value else None
+        return DefaultFolders(**values)
+
+    def section(self, name):
+        """
+        One top-level section (other than 'environment'), e.g. 'scraper'.
+
+        Returns:
+            dict: The section's contents, or an empty dict if it is missing.
+        """
+        value = self.data.get(name, {})
+        return value if isinstance(value, dict) else {}
+
+    def override(self, path=None, **folders):
+        """
+        A copy of this config with another file and/or folder overrides.
+
+        Args:
+            path (str, optional): Read this file instead.
+            **folders: DefaultFolders values, e.g. logs='/tmp/logs'.
+
+        Returns:
+            RealEstateConfig: The new config; this one is unchanged.
+        """
+        unknown = set(folders) - {field.name for field in fields(DefaultFolders)}
+        if unknown:
+            raise ValueError(f"Unknown config folders: {', '.join(sorted(unknown))}")
+        copy = RealEstateConfig(path or self.path, {**self.overrides, **folders})
+        if path is None or path == self.path:
+            copy._data = self._data
+        return copy
+
+    def env_vars(self):
+        """
+        The settings as environment variables, e.g. RE_DEFAULT_FOLDER_LOGS,
+        for scripts and tools that read them from the environment.
+        """
+        prefix = str(self.environment.get('prefix', 'RE')).upper()
+        env = {}
+        for top_key, inner_data in self.environment.items():
+            if top_key == 'prefix' or not isinstance(inner_data, dict):
+                continue
+            for child_key, value in inner_data.items():
+                parts = [prefix] if prefix else []
+                env['_'.join(parts + [top_key.upper(), child_key.upper()])] = str(value)
+        for field in fields(DefaultFolders):
+            value = getattr(self.folders, field.name)
+            if value is not None:
+                env[f"RE_DEFAULT_FOLDER_{field.name.upper()}"] = value
+        return env
+
+
+def _restore_config(path, overrides, data, folders):
+    config = RealEstateConfig(path, overrides)
+    config._data = data
+    config._folders = folders
+    return config
+
+
+_config = RealEstateConfig()
+
+
+def get_config():
+    """The process-wide RealEstateConfig."""
+    return _config
+
+
+def configure(path=None, **folders):
+    """
+    Replaces the process-wide config, e.g. from command-line options; see
+    RealEstateConfig.override.
+
+    Returns:
+        RealEstateConfig: The new config.
+    """
+    global _config
+    _config = _config.override(path, **folders)
+    return _config
+
+
+def add_arguments(parser):
+    """Adds the --config option to a command-line parser."""
+    parser.add_argument('--config',
+                        metavar='FILE',
+                        help=f'Read settings from this file instead of RE_CONFIG_PATH or {DEFAULT_CONFIG_PATH}.')
+
+
+def from_arguments(args):
+    """Applies the add_arguments() options to the process-wide config."""
+    if args.config:
+        return configure(args.config)
+    return _config
 
 
 # Function to ensure all configuration data is loaded
@@ -10,71 +209,41 @@ def ensure_config():
 
 
 def ensure_env_vars_loaded():
+    """Copies the settings into environment variables, for code that reads them from there."""
     if os.getenv("RE_CONFIG_LOADED") != "true":
-        # Load the JSON configuration from the file
-        with open(real_estate_config_path, 'r') as file:
-            json_data = file.read()
-            set_env_vars_from_json(json_data)
+        for name, value in _config.env_vars().items():
+            os.environ.setdefault(name, value)
+        os.environ["RE_CONFIG_LOADED"] = "true"
 
-def set_env_vars_from_json(json_content):
+
+def load_config_section(section):
     """
-    Parses a JSON string and sets environment variables, using a flag
-    that is dynamically created from the prefix.
+    Reads one top-level section (other than 'environment') from the config file.
+
+    Args:
+        section (str): The name of the top-level key, e.g. 'scraper'.
+
+    Returns:
+        dict: The section's contents, or an empty dict if it is missing or
+        the file cannot be read.
     """
-    try:
-        # Load the JSON data from the string
-        data = json.loads(json_content)
-
-        if 'environment' not in data or not isinstance(data['environment'], dict):
-            print("Error: JSON data is missing the 'environment' key or it is not a dictionary.")
-            return
-
-        environment_data = data['environment']
-
-        # This line fetches the prefix from the JSON data!
-        prefix = environment_data.get('prefix', '').upper()
-        # Dynamically create the config flag name from the prefix
-        config_flag = f"{prefix}_CONFIG_LOADED"
-
-        # Check if the configurations have already been loaded using the dynamic flag
-        if os.getenv(config_flag) == "true":
-            print(f"Configurations are already loaded. Exiting.")
-            return
-        
-        print("Populating environment variables from JSON...")
-
-        for top_key, inner_data in environment_data.items():
-            # Skip the 'prefix' key as it's not a folder and the dynamically created config_flag
-            if top_key == 'prefix' or not isinstance(inner_data, dict):
-                continue
-            
-            parent_key_upper = top_key.upper()
+    return _config.section(section)
 
-            for child_key, value in inner_data.items():
-                env_var_name_parts = []
-                if prefix:
-                    env_var_name_parts.append(prefix)
-                env_var_name_parts.append(parent_key_upper)
-                env_var_name_parts.append(child_key.upper())
-                
-                env_var_name = "_".join(env_var_name_parts)
-
-                os.environ[env_var_name] = value
-                print(f"Set environment variable: {env_var_name} = '{os.environ[env_var_name]}'")
-
-        # Set the flag to indicate that configurations are loaded
-        os.environ[config_flag] = "true"
-        print(f"\nSuccessfully set all environment variables and the flag: {config_flag}")
-
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON: {e}")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
 
-if __name__ == "__main__":
-    ensure_config()
+# The folders scripts used to read from here, resolved on first access
+_FOLDER_ATTRIBUTES = {
+    'scrapes_dir': 'page_scrapes',
+    'images_dir': 'image_scrapes',
+    'output_folder': 'output',
+}
 
-ensure_config()
-scrapes_dir = os.getenv('RE_DEFAULT_FOLDER_PAGE_SCRAPES')
-images_dir = os.getenv('RE_DEFAULT_FOLDER_IMAGE_SCRAPES')
-output_folder = os.getenv('RE_DEFAULT_FOLDER_OUTPUT')
\ No newline at end of file
+
+def __getattr__(name):
+    if name in _FOLDER_ATTRIBUTES:
+        return getattr(_config.folders, _FOLDER_ATTRIBUTES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if __name__ == "__main__":
+    for name, value in sorted(get_config().env_vars().items()):
+        print(f"{name}={value}")
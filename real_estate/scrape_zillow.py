@@ -1,36 +1,154 @@
 import os
 import sys
 import argparse
-import time
-from playwright_stealth import Stealth
-from playwright.sync_api import sync_playwright
-import parse_zillow_page as zillow_page
+import logging
+from contextlib import contextmanager, aclosing
 import zillow_property_manager as property_manager
-from zillow_image_manager import extract_image_src
+import zillow_db
+import zillow_trace as trace
+from zillow_job_queue import JobQueue, DEFAULT_MAX_ATTEMPTS, default_batch_name
+from zillow_scrape_settings import (CAPTCHA_MARKER, STATS_SELECTOR, DEFAULT_PAGES_PER_CONTEXT, DEFAULT_CONCURRENCY,
+                                    DEFAULT_PAGES_PER_MINUTE, DEFAULT_JITTER_SECONDS, CAPTCHA_PAUSE_SECONDS,
+                                    positive_float)
+import zillow_logging
+import real_estate_config
 
+log = zillow_logging.get_logger(__name__)
 
-def scrape_zillow(zillow_url):
+# Jobs claimed from the queue per round (at least --concurrency). A CAPTCHA
+# ends the round, and the jobs it didn't reach go back to the queue.
+CLAIM_SIZE = 10
+
+
+class BrowserPool:
+    """
+    Keeps one stealth Chromium browser alive across many scrapes.
+
+    Launching Chromium costs seconds per URL, so the pool starts the browser
+    once and hands out pages from a shared context. The context is thrown away
+    and replaced after `max_pages_per_context` pages, or whenever `recycle()`
+    is called (e.g. after a CAPTCHA), so a flagged session is not reused.
+    If a ResourceBlocker is given, it is installed on every new context.
+
+    Usage:
+        with BrowserPool() as pool:
+            for url in urls:
+                content = scrape_zillow(url, pool)
+    """
+
+    def __init__(self, max_pages_per_context=DEFAULT_PAGES_PER_CONTEXT, headless=True, blocker=None):
+        self.max_pages_per_context = max_pages_per_context
+        self.headless = headless
+        self.blocker = blocker
+        self._manager = None
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        self._pages_served = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        """Starts Playwright and launches the browser, if not already running."""
+        if self._browser is not None:
+            return
+        # Playwright is only imported once a browser is needed
+        from playwright_stealth import Stealth
+        from playwright.sync_api import sync_playwright
+        self._manager = Stealth().use_sync(sync_playwright())
+        self._playwright = self._manager.__enter__()
+        self._browser = self._playwright.chromium.launch(headless=self.headless)
+
+    def recycle(self):
+        """Closes the current context; the next page gets a fresh one."""
+        if self._context is not None:
+            try:
+                self._context.close()
+            except Exception as e:
+                log.warning("Error closing browser context: %s", e)
+        self._context = None
+        self._pages_served = 0
+
+    def new_page(self):
+        """
+        Opens a new page, rotating the context when it has served its quota.
+
+        Returns:
+            Page: A Playwright page. The caller is responsible for closing it.
+        """
+        self.start()
+        if self._context is not None and self._pages_served >= self.max_pages_per_context:
+            self.recycle()
+        if self._context is None:
+            self._context = self._browser.new_context()
+            if self.blocker is not None:
+                self.blocker.attach(self._context)
+        self._pages_served += 1
+        return self._context.new_page()
+
+    @contextmanager
+    def page(self):
+        """Context manager that yields a page and closes it afterwards."""
+        page = self.new_page()
+        try:
+            yield page
+        finally:
+            try:
+                page.close()
+            except Exception:
+                pass
+
+    def close(self):
+        """Closes the context, the browser and Playwright itself."""
+        self.recycle()
+        if self._browser is not None:
+            try:
+                self._browser.close()
+            except Exception as e:
+                log.warning("Error closing browser: %s", e)
+            self._browser = None
+        if self._manager is not None:
+            self._manager.__exit__(None, None, None)
+            self._manager = None
+            self._playwright = None
+
+
+def scrape_zillow(zillow_url, pool=None, blocker=None):
     """Scrapes html content for a single Zillow listing.
         
     Args:
         zillow_url (str): The URL for the page.
+        pool (BrowserPool, optional): A running pool to take the page from.
+            When omitted, a browser is started and closed just for this URL.
+        blocker (ResourceBlocker, optional): Aborts images, fonts, media and
+            analytics requests on the single-use browser. Ignored when a pool
+            is passed in; give the blocker to the pool instead.
 
     Returns:
         content: the raw html string, or None if an Exception is thrown.
     
     """
-    
+    if pool is None:
+        with BrowserPool(blocker=blocker) as single_use_pool:
+            return scrape_zillow(zillow_url, single_use_pool)
+
     try:
-        print(f"Scraping {zillow_url}...")
+        log.debug("Scraping %s...", zillow_url)
         
-        with Stealth().use_sync(sync_playwright()) as p:
-            browser = p.chromium.launch()
-            page = browser.new_page()
-            page.goto(zillow_url)
+        with pool.page() as page:
+            with trace.span('scrape.goto', url=zillow_url):
+                page.goto(zillow_url)
             
             # Check for CAPTCHA page content, which indicates a bot block.
-            if "Press & Hold to confirm you are" in page.content():
-                print("CAPTCHA detected. Cannot proceed.")
+            if CAPTCHA_MARKER in page.content():
+                log.warning("CAPTCHA detected for %s. Cannot proceed.", zillow_url)
+                # Don't keep using a session that has been flagged
+                pool.recycle()
                 return None
             # --- End CAPTCHA check ---
 
@@ -38,9 +156,10 @@ def scrape_zillow(zillow_url):
             # Wait for the page by waiting for a known element to load.
             # Use a try-except block to handle cases where the element doesn't exist.
             try:
-                page.wait_for_selector("dl[class*='StyledOverviewStats']", timeout=10000)
+                with trace.span('scrape.wait_for_stats'):
+                    page.wait_for_selector(STATS_SELECTOR, timeout=10000)
             except Exception:
-                print(f" - Stats element not found within timeout for {zillow_url}.")
+                log.warning("Stats element not found within timeout for %s.", zillow_url)
                 return None
 
             # Get the page content after the element has loaded
@@ -55,10 +174,79 @@ def scrape_zillow(zillow_url):
         return content
 
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        log.exception("An unexpected error occurred scraping %s: %s", zillow_url, e)
         return None
 
-def main():
+def report_listing(url, content, writer=None, job_id=None):
+    """
+    Logs the parsed stats, MLS data and facts for one scraped listing (at
+    DEBUG level), and queues its stats on the database writer if one is given.
+
+    Args:
+        url (str): The listing URL.
+        content (str): The page HTML, or None if the scrape failed.
+        writer (ScrapeResultWriter, optional): Batched database writer.
+        job_id (int, optional): The scrape_jobs row the stats complete.
+
+    Returns:
+        bool: True if stats were queued on the writer.
+    """
+    import parse_zillow_page as zillow_page
+    name = property_manager.get_property_name(url)
+    if content is None:
+        # The scraper has already logged why
+        log.debug("No content retrieved for %s.", url)
+        return False
+
+    with trace.span('parse.listing'):
+        document = zillow_page.ListingDocument(content)
+        stats = document.stats()
+        facts = document.facts()
+        listing_data = document.mls_data()
+        image = document.image_src()
+
+    id = property_manager.get_property_id_from_url(url)
+    queued = False
+    if stats:
+        if writer is not None and id:
+            writer.add(id, name, url, stats['days_on_zillow'], stats['views'], stats['saves'], job_id=job_id)
+            queued = True
+    else:
+        log.warning("No stats retrieved for %s.", url)
+
+    if not log.isEnabledFor(logging.DEBUG):
+        return queued
+
+    lines = [f"![{name}]{image}" if image else "No image URL found.",
+             f"\n## Property: {name}",
+             f"## Zillow Property ID: {id}",
+             "\n---\n -- Stats --"]
+    if stats:
+        for key, value in stats.items():
+            lines.append(f"  - {key.replace('_', ' ').capitalize()}: {value}")
+    else:
+        lines.append(f"No stats retrieved for {url}.")
+
+    lines.append("\n---\n")
+    if listing_data:
+        lines.append("## MLS Data:")
+        for key, value in listing_data.items():
+            lines.append(f"  - {key}: {value}")
+    else:
+        lines.append(f"No MLS data retrieved for {url}.")
+
+    lines.append("\n---\n")
+    if facts:
+        lines.append("## Facts:")
+        lines.append(zillow_page.format_zillow_data(facts))
+    else:
+        lines.append(f"No facts retrieved for {url}.")
+
+    log.debug('\n'.join(lines))
+    return queued
+
+
+def main(argv=None, prog=None):
 
     script_dir = os.path.dirname(os.path.abspath(__file__))
 
@@ -69,70 +257,175 @@ def main():
     default_file_path = os.path.join(script_dir, default_filename)
 
     """Main function to handle command-line arguments and run the scraper."""
-    parser = argparse.ArgumentParser(description='Scrape Zillow listing stats.')
+    parser = argparse.ArgumentParser(prog=prog, description='Scrape Zillow listing stats.')
    # Add the 'url_file' argument with the absolute default path
     parser.add_argument('url_file', 
                     nargs='?', 
                     default=default_file_path,
                     help=f'Path to a text file containing Zillow URLs, one per line. Defaults to "{default_file_path}" if not provided.')
-    args = parser.parse_args()
-    
-    print('Scrape Zillow listings')
+    parser.add_argument('--pages-per-context',
+                        type=int,
+                        default=DEFAULT_PAGES_PER_CONTEXT,
+                        help=f'Recycle the browser context after this many pages. Defaults to {DEFAULT_PAGES_PER_CONTEXT}.')
+    parser.add_argument('--concurrency',
+                        type=int,
+                        default=DEFAULT_CONCURRENCY,
+                        help=f'Number of pages to load at the same time. Defaults to {DEFAULT_CONCURRENCY}.')
+    parser.add_argument('--pages-per-minute',
+                        type=positive_float,
+                        default=DEFAULT_PAGES_PER_MINUTE,
+                        help=f'Maximum page loads per minute against zillow.com. Defaults to {DEFAULT_PAGES_PER_MINUTE}.')
+    parser.add_argument('--jitter',
+                        type=float,
+                        default=DEFAULT_JITTER_SECONDS,
+                        help=f'Maximum random delay in seconds added to each page load. Defaults to {DEFAULT_JITTER_SECONDS}.')
+    parser.add_argument('--fast',
+                        action='store_true',
+                        help='Block images, media, fonts and analytics hosts while loading pages (see "scraper" in real_estate.json).')
+    parser.add_argument('--db',
+                        type=str,
+                        default=zillow_db.DEFAULT_DB_PATH,
+                        help=f'SQLite database to save listing stats to. Defaults to "{zillow_db.DEFAULT_DB_PATH}".')
+    parser.add_argument('--no-db',
+                        action='store_true',
+                        help='Only log the results (see them with --verbose); do not save stats to the database.')
+    parser.add_argument('--compact',
+                        action='store_true',
+                        help='Only save stats that changed since the last scrape beyond the daily days-on-market tick.')
+    parser.add_argument('--batch',
+                        type=str,
+                        help='Name of the resumable batch in the job queue. Defaults to the URL file and today\'s date, '
+                             'so rerunning the same list on the same day resumes it.')
+    parser.add_argument('--restart',
+                        action='store_true',
+                        help='Discard the batch\'s progress and scrape every URL again.')
+    parser.add_argument('--max-attempts',
+                        type=int,
+                        default=DEFAULT_MAX_ATTEMPTS,
+                        help=f'Give up on a URL after this many failed attempts. Defaults to {DEFAULT_MAX_ATTEMPTS}.')
+    parser.add_argument('--archive',
+                        type=str,
+                        help='Also store each captured page in this compressed page archive (see zillow_page_archive.py).')
+    trace.add_arguments(parser)
+    real_estate_config.add_arguments(parser)
+    zillow_logging.add_arguments(parser)
+    args = parser.parse_args(argv)
+    real_estate_config.from_arguments(args)
+    zillow_logging.from_arguments(args)
+    import asyncio
 
     try:
         with open(args.url_file, 'r') as f:
             urls = [line.strip() for line in f if line.strip()]
     except FileNotFoundError:
-        print(f"Error: The file {args.url_file} was not found.")
+        log.error("The file %s was not found.", args.url_file)
         sys.exit(1)
 
-    print(f"\nListings from: {args.url_file:}")
+    log.info("Listings from: %s", args.url_file)
 
-    for url in urls:
-        content = scrape_zillow(url)
-        stats = zillow_page.parse_zillow_stats(content)
-        facts = zillow_page.parse_zillow_facts(content)
-        listing_data = zillow_page.extract_mls_data(content)
-        name = property_manager.get_property_name(url)
-        image = extract_image_src(content)
+    # Scrape concurrently under a per-host rate limit instead of sleeping
+    # a fixed two minutes between URLs
+    import zillow_async_scraper as async_scraper
 
-        if image:
-            print(f"![{name}]{image}")
-        else:
-            print("No image URL found.")
-     
-        print(f"\n## Property: {name}")
-        id = property_manager.get_property_id_from_url(url)
-        print(f"## Zillow Property ID: {id}")
-
-        print("\n---\n -- Stats --")
-
-        if stats:
-            #print(f"Stats for {url}:")
-            for key, value in stats.items():
-                print(f"  - {key.replace('_', ' ').capitalize()}: {value}")
-        else:
-            print(f"No stats retrieved for {url}.")
+    blocker = None
+    if args.fast:
+        from zillow_resource_blocker import ResourceBlocker
+        blocker = ResourceBlocker.from_config()
 
-        print("\n---\n")
-        if listing_data:
-            print("## MLS Data:")
-            for key, value in listing_data.items():
-                print(f"  - {key}: {value}")
-        else:
-            print(f"No MLS data retrieved for {url}.")  
+    archive = None
+    if args.archive:
+        import zillow_page_archive
+        archive = zillow_page_archive.PageArchive(args.archive)
 
-        print("\n---\n")
+    def scrape_batch(batch_urls):
+        return async_scraper.scrape_zillow_batch(batch_urls,
+                                                 concurrency=args.concurrency,
+                                                 pages_per_minute=args.pages_per_minute,
+                                                 jitter=args.jitter,
+                                                 pages_per_context=args.pages_per_context,
+                                                 blocker=blocker)
 
-        if facts:
-            formatted_description = zillow_page.format_zillow_data(facts)
-            print("## Facts:")
-            print(formatted_description)
+    def archive_result(result):
+        if archive is not None and result.status == 'ok':
+            with trace.span('archive.add'):
+                archive.add(zillow_page_archive.archive_name_for_url(result.url), result.content,
+                            zpid=property_manager.get_property_id_from_url(result.url))
+
+    async def run_batch():
+        async for result in scrape_batch(urls):
+            report_listing(result.url, result.content)
+            archive_result(result)
+
+    async def run_queue(queue, writer):
+        # Claim a few ready jobs at a time, scrape them, then wait for the
+        # earliest retry until every job is done or out of attempts
+        while True:
+            jobs = queue.claim(max(CLAIM_SIZE, args.concurrency))
+            if not jobs:
+                wait = queue.seconds_until_retry()
+                if wait is None:
+                    return
+                log.info("Retrying failed listings in %.1f minutes.", wait / 60)
+                await asyncio.sleep(wait)
+                continue
+            job_ids = {url: job_id for job_id, url in jobs}
+            unreached = set(job_ids.values())
+            captcha = False
+            async with aclosing(scrape_batch(list(job_ids))) as results:
+                async for result in results:
+                    job_id = job_ids[result.url]
+                    unreached.discard(job_id)
+                    # A job with stats is completed by the writer, with its snapshot
+                    if not report_listing(result.url, result.content, writer, job_id):
+                        if result.status == 'ok':
+                            queue.fail(job_id, 'No stats found on the page')
+                        elif async_scraper.closed_target_error(result):
+                            # Not the listing's fault: retry it without charging an attempt
+                            queue.release([job_id])
+                        else:
+                            queue.fail(job_id, result.error or result.status,
+                                       'captcha' if result.status == 'captcha' else 'failed')
+                    archive_result(result)
+                    if result.status == 'captcha':
+                        captcha = True
+                        break
+            # Checkpoint: store the snapshots and complete their jobs
+            writer.flush()
+            if captcha:
+                # Don't spend the rest of the round on a blocked session
+                queue.release(unreached)
+                log.warning("CAPTCHA detected; pausing for %d minutes with %d listings left in this round.",
+                            CAPTCHA_PAUSE_SECONDS // 60, len(unreached))
+                await asyncio.sleep(CAPTCHA_PAUSE_SECONDS)
+
+    with trace.from_arguments(args, 'scrape'):
+        if args.no_db:
+            asyncio.run(run_batch())
         else:
-            print(f"No facts retrieved for {url}.")
+            with zillow_db.ZillowRepository(args.db) as repository:
+                queue = JobQueue(repository, args.batch or default_batch_name(args.url_file), args.max_attempts)
+                if args.restart:
+                    queue.reset()
+                queue.enqueue(urls)
+                recovered = queue.recover()
+                if recovered:
+                    log.info("Retrying %d listings left unfinished by an interrupted run.", recovered)
+                done = queue.counts().get('done', 0)
+                if done:
+                    log.info("Resuming batch %s: %d of %d listings already done.", queue.batch, done, len(urls))
+                with zillow_db.ScrapeResultWriter(repository, compact=args.compact) as writer:
+                    asyncio.run(run_queue(queue, writer))
+                counts = queue.counts()
+                log.info("Batch %s: %s", queue.batch,
+                         ", ".join(f"{count} {state}" for state, count in sorted(counts.items())))
+                for url, state, attempts, error in queue.failures():
+                    log.error("Gave up on %s after %d attempts (%s): %s", url, attempts, state, error)
+
+    if archive is not None:
+        archive.close()
+    if blocker is not None:
+        blocker.log_summary()
+
 
-        print("\n---\n")
-        print("Waiting 2 minutes before the next scrape...")
-        time.sleep(120)
 if __name__ == "__main__":
     main()
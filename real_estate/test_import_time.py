@@ -0,0 +1,95 @@
+# test_import_time.py
+#
+# Import-time budget for the real_estate CLI. Starting a subcommand, or just
+# asking for its --help, must stay cheap: no Playwright, asyncio, requests or
+# pandas until a command actually needs them, and lxml only for the commands
+# that parse HTML.
+#
+#     python test_import_time.py
+#     python -m pytest test_import_time.py
+
+import os
+import subprocess
+import sys
+
+import real_estate
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Cumulative import time allowed for each subcommand's module, in milliseconds
+# (best of IMPORT_RUNS). Set IMPORT_BUDGET_MS to loosen it on a slow machine.
+IMPORT_BUDGET_MS = float(os.getenv('IMPORT_BUDGET_MS', 100))
+IMPORT_RUNS = 3
+
+# Top-level packages no subcommand may import just to start up
+HEAVY_MODULES = {'playwright', 'playwright_stealth', 'asyncio', 'requests', 'urllib3', 'pandas', 'numpy',
+                 'bs4', 'zstandard', 'lxml'}
+# ...except for these, which are needed by every run of the command
+ALLOWED_HEAVY_MODULES = {
+    'format': {'lxml'},
+    'images': {'lxml'},
+}
+
+
+def run_python(*args):
+    env = dict(os.environ, PYTHONPATH=SCRIPT_DIR)
+    return subprocess.run([sys.executable, *args], cwd=SCRIPT_DIR, env=env, capture_output=True, text=True)
+
+
+def import_times(module):
+    """
+    Imports `module` in a fresh interpreter under -X importtime.
+
+    Returns:
+        tuple: (cumulative microseconds for the module, set of the top-level
+        packages imported along the way).
+    """
+    result = run_python('-X', 'importtime', '-c', f'import {module}')
+    assert result.returncode == 0, result.stderr
+    total = None
+    packages = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit():
+            continue  # The header line
+        packages.add(name.strip().split('.')[0])
+        if name.strip() == module:
+            total = int(cumulative)
+    return total, packages
+
+
+def test_cli_entry_point_imports_nothing():
+    total, packages = import_times('real_estate')
+    assert not packages & HEAVY_MODULES, sorted(packages & HEAVY_MODULES)
+    assert total / 1000 < IMPORT_BUDGET_MS
+
+
+def test_subcommand_imports_within_budget():
+    for command, (module, _) in real_estate.COMMANDS.items():
+        runs = [import_times(module) for _ in range(IMPORT_RUNS)]
+        best = min(total for total, _ in runs) / 1000
+        heavy = runs[0][1] & (HEAVY_MODULES - ALLOWED_HEAVY_MODULES.get(command, set()))
+        assert not heavy, f"'{command}' imports {sorted(heavy)} at startup"
+        assert best < IMPORT_BUDGET_MS, f"'{command}' takes {best:.1f} ms to import (budget {IMPORT_BUDGET_MS:g} ms)"
+
+
+def test_subcommand_help():
+    for command in real_estate.COMMANDS:
+        result = run_python('real_estate.py', command, '--help')
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.startswith(f"usage: real_estate {command}"), result.stdout
+
+
+def test_unknown_command():
+    result = run_python('real_estate.py', 'bogus')
+    assert result.returncode == 2
+    assert "unknown command 'bogus'" in result.stderr
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"{name} passed")
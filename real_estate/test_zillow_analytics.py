@@ -0,0 +1,61 @@
+# test_zillow_analytics.py
+#
+# Trends must see the snapshots compact writes leave out of scrape_results:
+# a listing that stopped moving can't keep ranking on its old growth.
+#
+#     python test_zillow_analytics.py
+#     python -m pytest test_zillow_analytics.py
+
+import datetime
+import os
+import tempfile
+
+import zillow_analytics
+import zillow_db
+
+
+def write_daily_snapshots(repository, property_id, views_by_day, first_day=datetime.date(2026, 9, 1)):
+    for offset, views in enumerate(views_by_day):
+        scrape_date = f"{first_day + datetime.timedelta(days=offset)} 09:00:00"
+        repository.add_scrape_result(property_id, 10 + offset, views, 0, scrape_date=scrape_date, compact=True)
+
+
+def test_top_movers_after_compact_writes():
+    with tempfile.TemporaryDirectory() as folder:
+        with zillow_db.ZillowRepository(os.path.join(folder, 'zillow.db')) as repository:
+            # Listing 1 gained 100 views a day for 10 days, then stopped;
+            # listing 2 has been gaining 20 a day all along
+            write_daily_snapshots(repository, '1', [100 * min(day, 10) for day in range(30)])
+            write_daily_snapshots(repository, '2', [20 * day for day in range(30)])
+            with repository.connection() as conn:
+                assert len(zillow_db.get_property_history(conn, '1')) == 11
+                frame = zillow_analytics.load_scrape_results(conn)
+
+    assert len(frame) == 60
+    latest = frame.groupby('property_id', observed=True).tail(1)
+    assert list(latest['scrape_date'].dt.day) == [30, 30]
+    assert list(latest['days_on_market']) == [39, 39]
+
+    movers = zillow_analytics.top_movers(zillow_analytics.compute_trends(frame))
+    assert list(movers['property_id']) == ['2', '1']
+    assert movers['views_delta_per_day'].tolist() == [20.0, 0.0]
+
+
+def test_filters_apply_to_skipped_snapshots():
+    with tempfile.TemporaryDirectory() as folder:
+        with zillow_db.ZillowRepository(os.path.join(folder, 'zillow.db')) as repository:
+            write_daily_snapshots(repository, '1', [100] * 5)
+            write_daily_snapshots(repository, '2', [100] * 5)
+            with repository.connection() as conn:
+                frame = zillow_analytics.load_scrape_results(conn, property_ids=['1'],
+                                                             since=datetime.datetime(2026, 9, 3))
+
+    assert list(frame['property_id'].astype(str).unique()) == ['1']
+    assert list(frame['scrape_date'].dt.day) == [3, 4, 5]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"{name} passed")
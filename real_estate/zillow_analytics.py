@@ -0,0 +1,260 @@
+import argparse
+import json
+import numpy as np
+import pandas as pd
+import zillow_db
+
+# Trends compare each snapshot with the last one at least this many days older.
+DEFAULT_WINDOW_DAYS = 7
+DEFAULT_TOP_MOVERS = 10
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# One row per property, each snapshot column packed into a comma-separated
+# list. Fetching ~500 rows and parsing the lists with NumPy is several times
+# faster than fetching one Python tuple per snapshot.
+LOAD_SCRAPE_RESULTS_SQL = """
+SELECT r.property_id,
+       (SELECT property_name FROM properties p WHERE p.property_id = r.property_id),
+       group_concat(r.scrape_date),
+       group_concat(IFNULL(r.days_on_market, 'nan')),
+       group_concat(IFNULL(r.views, 'nan')),
+       group_concat(IFNULL(r.saves, 'nan')),
+       COUNT(*)
+FROM scrape_results r
+"""
+
+# The snapshots compact writes left out of scrape_results, rebuilt the way
+# zillow_db.get_daily_series() does: each day in compacted_days repeats the
+# last stored snapshot before it, days_on_market advanced by the calendar
+# days since (as of midnight, since the scrape time isn't kept), and a
+# latest_snapshots row newer than anything stored is taken as it is.
+LOAD_SKIPPED_SNAPSHOTS_SQL = """
+SELECT property_id,
+       (SELECT property_name FROM properties p WHERE p.property_id = skipped.property_id),
+       scrape_date, days_on_market, views, saves
+FROM (
+    SELECT c.property_id,
+           c.day || ' 00:00:00' AS scrape_date,
+           r.days_on_market + CAST(julianday(c.day) - julianday(substr(r.scrape_date, 1, 10)) AS INTEGER)
+               AS days_on_market,
+           r.views,
+           r.saves
+    FROM compacted_days c
+    JOIN scrape_results r ON r.result_id = (
+        SELECT result_id FROM scrape_results
+        WHERE property_id = c.property_id AND scrape_date < c.day
+        ORDER BY scrape_date DESC LIMIT 1)
+    WHERE NOT EXISTS (
+        SELECT 1 FROM scrape_results s
+        WHERE s.property_id = c.property_id AND s.scrape_date >= c.day AND s.scrape_date < date(c.day, '+1 day'))
+      AND NOT EXISTS (
+        SELECT 1 FROM latest_snapshots l
+        WHERE l.property_id = c.property_id AND substr(l.scrape_date, 1, 10) = c.day
+          AND l.scrape_date > (SELECT MAX(scrape_date) FROM scrape_results WHERE property_id = l.property_id))
+    UNION ALL
+    SELECT l.property_id, l.scrape_date, l.days_on_market, l.views, l.saves
+    FROM latest_snapshots l
+    WHERE l.scrape_date > (SELECT MAX(scrape_date) FROM scrape_results WHERE property_id = l.property_id)
+) AS skipped
+"""
+
+METRIC_COLUMNS = ('days_on_market', 'views', 'saves')
+TREND_COLUMNS = ('views_per_day', 'saves_per_day', 'save_view_ratio', 'views_delta', 'saves_delta',
+                 'views_delta_per_day', 'saves_delta_per_day')
+
+
+def _unpack(rows, column, dtype):
+    return np.array(','.join(row[column] for row in rows).split(','), dtype=dtype)
+
+
+def load_scrape_results(conn, property_ids=None, since=None, until=None):
+    """
+    Loads snapshots for one, many or all properties with a single query,
+    plus the ones compact writes left out of scrape_results (see
+    LOAD_SKIPPED_SNAPSHOTS_SQL), so trends reflect the latest scrape.
+
+    Args:
+        conn: The database connection object.
+        property_ids (iterable, optional): Only these ZPIDs; all properties if None.
+        since (datetime or float, optional): Only snapshots at or after this time.
+        until (datetime or float, optional): Only snapshots at or before this time.
+
+    Returns:
+        pandas.DataFrame: One row per snapshot with property_id (categorical),
+        property_name, scrape_date (datetime64), days_on_market, views and
+        saves (float, NaN when missing), sorted by property and date.
+    """
+    where, params = _filters('r.', property_ids, since, until)
+    query = LOAD_SCRAPE_RESULTS_SQL + where + "GROUP BY r.property_id ORDER BY r.property_id;"
+
+    rows = conn.execute(query, params).fetchall()
+    frame = _frame_from_packed_rows(rows)
+    where, params = _filters('', property_ids, since, until)
+    skipped = conn.execute(LOAD_SKIPPED_SNAPSHOTS_SQL + where + ";", params).fetchall()
+    if not skipped:
+        return frame
+    extra = pd.DataFrame({
+        'property_id': [row[0] for row in skipped],
+        'property_name': np.array([row[1] for row in skipped], dtype=object),
+        'scrape_date': np.array([row[2] for row in skipped], dtype='datetime64[s]'),
+        **{column: np.array([row[index] for row in skipped], dtype='float64')
+           for index, column in enumerate(METRIC_COLUMNS, start=3)},
+    })
+    frame = pd.concat([frame.astype({'property_id': str}), extra], ignore_index=True)
+    frame['property_id'] = pd.Categorical(frame['property_id'], categories=sorted(frame['property_id'].unique()))
+    return frame.sort_values(['property_id', 'scrape_date'], kind='stable').reset_index(drop=True)
+
+
+def _filters(prefix, property_ids, since, until):
+    # The WHERE clause and its parameters for load_scrape_results' filters
+    clauses, params = [], []
+    if property_ids is not None:
+        # One parameter however many ids there are
+        clauses.append(f"{prefix}property_id IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps([str(property_id) for property_id in property_ids]))
+    if since is not None:
+        clauses.append(f"{prefix}scrape_date >= ?")
+        params.append(zillow_db.scrape_timestamp(since))
+    if until is not None:
+        clauses.append(f"{prefix}scrape_date <= ?")
+        params.append(zillow_db.scrape_timestamp(until))
+    return ("WHERE " + " AND ".join(clauses) + "\n") if clauses else "", params
+
+
+def _frame_from_packed_rows(rows):
+    # One DataFrame row per snapshot from LOAD_SCRAPE_RESULTS_SQL's packed rows
+    if not rows:
+        return pd.DataFrame({
+            'property_id': pd.Categorical([]), 'property_name': pd.Series([], dtype=object),
+            'scrape_date': pd.Series([], dtype='datetime64[s]'),
+            **{column: pd.Series([], dtype='float64') for column in METRIC_COLUMNS}})
+
+    counts = np.array([row[6] for row in rows])
+    codes = np.repeat(np.arange(len(rows)), counts)
+    # NumPy parses 'YYYY-MM-DD HH:MM:SS' directly, much faster than strptime
+    dates = _unpack(rows, 2, 'datetime64[s]')
+    # group_concat doesn't promise an order, so sort each property's snapshots here
+    order = np.lexsort((dates, codes))
+    frame = pd.DataFrame({
+        'property_id': pd.Categorical.from_codes(codes, categories=[row[0] for row in rows]),
+        'property_name': np.array([row[1] for row in rows], dtype=object)[codes],
+        'scrape_date': dates[order],
+    })
+    for index, column in enumerate(METRIC_COLUMNS, start=3):
+        frame[column] = _unpack(rows, index, 'float64')[order]
+    return frame
+
+
+def compute_trends(frame, window_days=DEFAULT_WINDOW_DAYS):
+    """
+    Adds rate and trend columns to snapshots loaded by load_scrape_results,
+    computed for every listing at once.
+
+    Added columns:
+        views_per_day, saves_per_day: change since the previous snapshot of
+            the same property, divided by the days between them.
+        save_view_ratio: saves / views for the snapshot.
+        views_delta, saves_delta: change since the latest snapshot at least
+            window_days older (NaN until the property has that much history).
+        views_delta_per_day, saves_delta_per_day: those changes divided by
+            the days they span.
+
+    Args:
+        frame (pandas.DataFrame): Snapshots, as returned by load_scrape_results.
+        window_days (float): The trailing window for the *_delta columns.
+
+    Returns:
+        pandas.DataFrame: A new frame sorted by property and date.
+    """
+    if frame.empty:
+        return frame.assign(**{column: pd.Series([], dtype='float64') for column in TREND_COLUMNS})
+
+    codes = pd.factorize(frame['property_id'], sort=True)[0].astype('int64')
+    seconds = frame['scrape_date'].to_numpy().astype('datetime64[s]').astype('int64')
+    order = np.lexsort((seconds, codes))
+    frame = frame.iloc[order].reset_index(drop=True)
+    codes = codes[order]
+    seconds = seconds[order]
+    views = frame['views'].to_numpy()
+    saves = frame['saves'].to_numpy()
+
+    # Change since the previous snapshot; the first row of each property has none
+    same_property = np.r_[False, codes[1:] == codes[:-1]]
+    elapsed = np.r_[np.nan, np.diff(seconds) / SECONDS_PER_DAY]
+    elapsed = np.where(same_property & (elapsed > 0), elapsed, np.nan)
+    frame['views_per_day'] = np.r_[np.nan, np.diff(views)] / elapsed
+    frame['saves_per_day'] = np.r_[np.nan, np.diff(saves)] / elapsed
+
+    frame['save_view_ratio'] = np.divide(saves, views, out=np.full(len(frame), np.nan), where=views > 0)
+
+    # For every snapshot, find the same property's latest snapshot taken at
+    # least window_days earlier with one binary search over (property, time).
+    keys = codes * (1 << 40) + seconds
+    earlier = np.searchsorted(keys, keys - int(window_days * SECONDS_PER_DAY), side='right') - 1
+    has_window = (earlier >= 0) & (codes[np.maximum(earlier, 0)] == codes)
+    earlier = np.maximum(earlier, 0)
+    span = np.where(has_window, (seconds - seconds[earlier]) / SECONDS_PER_DAY, np.nan)
+    span = np.where(span > 0, span, np.nan)
+    frame['views_delta'] = np.where(has_window, views - views[earlier], np.nan)
+    frame['saves_delta'] = np.where(has_window, saves - saves[earlier], np.nan)
+    frame['views_delta_per_day'] = frame['views_delta'].to_numpy() / span
+    frame['saves_delta_per_day'] = frame['saves_delta'].to_numpy() / span
+    return frame
+
+
+def top_movers(trends, metric='views', limit=DEFAULT_TOP_MOVERS, as_of=None):
+    """
+    Ranks listings by how fast a metric grew over the trend window.
+
+    Args:
+        trends (pandas.DataFrame): The output of compute_trends.
+        metric (str): 'views' or 'saves'.
+        limit (int): How many listings to return.
+        as_of (datetime, optional): Rank the snapshots as they stood at this time.
+
+    Returns:
+        pandas.DataFrame: Each listing's latest snapshot, highest
+        <metric>_delta_per_day first; listings without enough history are left out.
+    """
+    if as_of is not None:
+        trends = trends[trends['scrape_date'] <= pd.Timestamp(as_of)]
+    latest = trends.groupby('property_id', sort=False, observed=True).tail(1)
+    column = f'{metric}_delta_per_day'
+    ranked = latest.dropna(subset=[column]).sort_values(column, ascending=False, kind='stable')
+    return ranked.head(limit).reset_index(drop=True)
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description='Trends and top movers from the scrape_results history.')
+    parser.add_argument('--db',
+                        type=str,
+                        default=zillow_db.DEFAULT_DB_PATH,
+                        help=f'SQLite database to read. Defaults to "{zillow_db.DEFAULT_DB_PATH}".')
+    parser.add_argument('--metric',
+                        choices=('views', 'saves'),
+                        default='views',
+                        help='Rank listings by growth in this metric. Defaults to views.')
+    parser.add_argument('--window',
+                        type=float,
+                        default=DEFAULT_WINDOW_DAYS,
+                        help=f'Trend window in days. Defaults to {DEFAULT_WINDOW_DAYS}.')
+    parser.add_argument('--limit',
+                        type=int,
+                        default=DEFAULT_TOP_MOVERS,
+                        help=f'Number of listings to show. Defaults to {DEFAULT_TOP_MOVERS}.')
+    args = parser.parse_args(argv)
+
+    with zillow_db.ZillowRepository(args.db) as repository:
+        with repository.connection() as conn:
+            frame = load_scrape_results(conn)
+
+    movers = top_movers(compute_trends(frame, args.window), args.metric, args.limit)
+    columns = ['property_id', 'property_name', 'scrape_date', 'views', 'saves', 'save_view_ratio',
+               f'{args.metric}_delta', f'{args.metric}_delta_per_day']
+    print(f"\n-- Top movers by {args.metric} over {args.window:g} days --")
+    print(movers[columns].to_string(index=False) if not movers.empty else "Not enough history yet.")
+
+
+if __name__ == "__main__":
+    main()
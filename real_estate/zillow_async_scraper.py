@@ -0,0 +1,315 @@
+import asyncio
+import random
+import time
+from collections import namedtuple
+from urllib.parse import urlparse
+from playwright_stealth import Stealth
+from playwright.async_api import async_playwright
+import zillow_trace as trace
+import zillow_logging
+from zillow_scrape_settings import (CAPTCHA_MARKER, STATS_SELECTOR, DEFAULT_PAGES_PER_CONTEXT,
+                                    DEFAULT_CONCURRENCY, DEFAULT_PAGES_PER_MINUTE, DEFAULT_JITTER_SECONDS)
+
+log = zillow_logging.get_logger(__name__)
+
+# The outcome of one URL in a batch.
+#   status is one of 'ok', 'captcha', 'timeout' or 'error';
+#   content is the page HTML when status is 'ok', otherwise None;
+#   error holds a short description of what went wrong, if anything.
+ScrapeResult = namedtuple('ScrapeResult', ['url', 'content', 'status', 'error'])
+
+# Playwright's messages for a page whose context or browser was closed under
+# it, e.g. by a recycle or shutdown rather than anything the listing did
+CLOSED_TARGET_ERRORS = ('Target page, context or browser has been closed', 'Target closed')
+
+
+def closed_target_error(result):
+    """True if `result` is an 'error' because its page's context or browser was closed."""
+    return result.status == 'error' and any(message in (result.error or '') for message in CLOSED_TARGET_ERRORS)
+
+
+class TokenBucket:
+    """
+    An asyncio token bucket: `rate_per_minute` tokens refill continuously,
+    up to `burst` tokens can be saved up, and each page load spends one.
+
+    Args:
+        rate_per_minute (float): Sustained number of acquisitions per minute;
+            must be greater than 0.
+        burst (int): How many acquisitions may happen back to back.
+        jitter (float): Upper bound, in seconds, of a random extra delay
+            added after each acquisition.
+    """
+
+    def __init__(self, rate_per_minute, burst=1, jitter=0.0):
+        if not rate_per_minute > 0:
+            raise ValueError(f"rate_per_minute must be greater than 0, not {rate_per_minute}")
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.jitter = jitter
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Waits until a token is available and takes it."""
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+        if self.jitter:
+            await asyncio.sleep(random.uniform(0, self.jitter))
+
+
+class HostRateLimiter:
+    """Hands out one TokenBucket per host so every site gets its own budget."""
+
+    def __init__(self, rate_per_minute=DEFAULT_PAGES_PER_MINUTE, burst=1, jitter=DEFAULT_JITTER_SECONDS):
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        self.jitter = jitter
+        self._buckets = {}
+
+    async def acquire(self, url):
+        host = urlparse(url).netloc.lower()
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = TokenBucket(self.rate_per_minute, self.burst, self.jitter)
+            self._buckets[host] = bucket
+        await bucket.acquire()
+
+
+class AsyncBrowserPool:
+    """
+    The asyncio counterpart of scrape_zillow.BrowserPool: one browser for the
+    whole batch, with the shared context recycled after
+    `max_pages_per_context` pages or on CAPTCHA detection. A recycled context
+    only stops handing out pages; it is closed once the pages other workers
+    still have open on it are closed with close_page(). If a
+    ResourceBlocker is given, it is installed on every new context.
+    """
+
+    def __init__(self, max_pages_per_context=DEFAULT_PAGES_PER_CONTEXT, headless=True, blocker=None):
+        self.max_pages_per_context = max_pages_per_context
+        self.headless = headless
+        self.blocker = blocker
+        self._manager = None
+        self._browser = None
+        self._context = None
+        self._pages_served = 0
+        # Open pages per context, including retired contexts still in use
+        self._open_pages = {}
+        self._page_contexts = {}
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def start(self):
+        if self._browser is not None:
+            return
+        self._manager = Stealth().use_async(async_playwright())
+        playwright = await self._manager.__aenter__()
+        self._browser = await playwright.chromium.launch(headless=self.headless)
+
+    @staticmethod
+    async def _close(context):
+        try:
+            await context.close()
+        except Exception as e:
+            log.warning("Error closing browser context: %s", e)
+
+    async def _retire_context(self):
+        # Stop handing out pages from the current context; close it now only
+        # if no page is still loading on it
+        context, self._context = self._context, None
+        self._pages_served = 0
+        if context is not None and not self._open_pages.get(context):
+            self._open_pages.pop(context, None)
+            await self._close(context)
+
+    async def recycle(self):
+        """Retires the current context; the next page gets a fresh one."""
+        async with self._lock:
+            await self._retire_context()
+
+    async def new_page(self):
+        """Opens a new page, rotating the context when it has served its quota."""
+        async with self._lock:
+            if self._context is not None and self._pages_served >= self.max_pages_per_context:
+                await self._retire_context()
+            if self._context is None:
+                self._context = await self._browser.new_context()
+                if self.blocker is not None:
+                    await self.blocker.attach_async(self._context)
+            self._pages_served += 1
+            page = await self._context.new_page()
+            self._open_pages[self._context] = self._open_pages.get(self._context, 0) + 1
+            self._page_contexts[page] = self._context
+            return page
+
+    async def close_page(self, page):
+        """Closes a page from new_page(), and its context if that was retired and this was its last page."""
+        try:
+            await page.close()
+        except Exception:
+            pass
+        async with self._lock:
+            context = self._page_contexts.pop(page, None)
+            if context is None:
+                return
+            self._open_pages[context] -= 1
+            if not self._open_pages[context] and context is not self._context:
+                del self._open_pages[context]
+                await self._close(context)
+
+    async def close(self):
+        async with self._lock:
+            await self._retire_context()
+            # Contexts whose pages were never closed
+            for context in list(self._open_pages):
+                await self._close(context)
+            self._open_pages.clear()
+            self._page_contexts.clear()
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception as e:
+                log.warning("Error closing browser: %s", e)
+            self._browser = None
+        if self._manager is not None:
+            await self._manager.__aexit__(None, None, None)
+            self._manager = None
+
+
+async def scrape_page(pool, url):
+    """
+    Loads one Zillow listing from the pool and returns a ScrapeResult.
+
+    Args:
+        pool (AsyncBrowserPool): A running browser pool.
+        url (str): The listing URL.
+
+    Returns:
+        ScrapeResult: The outcome for this URL.
+    """
+    log.debug("Scraping %s...", url)
+    with trace.span('scrape.page', url=url) as page_span:
+        result = await _scrape_page(pool, url)
+        page_span.set(status=result.status)
+    trace.count(f'pages.{result.status}')
+    if result.content is not None:
+        trace.count('bytes', len(result.content))
+    return result
+
+
+async def _scrape_page(pool, url):
+    try:
+        with trace.span('scrape.new_page'):
+            page = await pool.new_page()
+    except Exception as e:
+        return ScrapeResult(url, None, 'error', str(e))
+
+    try:
+        with trace.span('scrape.goto'):
+            await page.goto(url)
+
+        # Check for CAPTCHA page content, which indicates a bot block.
+        if CAPTCHA_MARKER in await page.content():
+            log.warning("CAPTCHA detected for %s.", url)
+            # Don't keep using a session that has been flagged
+            await pool.recycle()
+            return ScrapeResult(url, None, 'captcha', 'CAPTCHA detected')
+
+        try:
+            with trace.span('scrape.wait_for_stats'):
+                await page.wait_for_selector(STATS_SELECTOR, timeout=10000)
+        except Exception:
+            log.warning("Stats element not found within timeout for %s.", url)
+            return ScrapeResult(url, None, 'timeout', 'Stats element not found within timeout')
+
+        with trace.span('scrape.content'):
+            content = await page.content()
+        return ScrapeResult(url, content, 'ok', None)
+
+    except Exception as e:
+        log.exception("An unexpected error occurred scraping %s: %s", url, e)
+        return ScrapeResult(url, None, 'error', str(e))
+    finally:
+        await pool.close_page(page)
+
+
+async def scrape_zillow_batch(urls,
+                              concurrency=DEFAULT_CONCURRENCY,
+                              pages_per_minute=DEFAULT_PAGES_PER_MINUTE,
+                              jitter=DEFAULT_JITTER_SECONDS,
+                              pages_per_context=DEFAULT_PAGES_PER_CONTEXT,
+                              blocker=None):
+    """
+    Scrapes many Zillow listings concurrently and yields results as they finish.
+
+    Up to `concurrency` pages are in flight at once, while a per-host token
+    bucket caps how often a new page load may start. Politeness is therefore
+    a global rate rather than a fixed sleep between URLs.
+
+    Usage:
+        async for result in scrape_zillow_batch(urls):
+            if result.status == 'ok':
+                ...
+
+    Args:
+        urls (list): Listing URLs to scrape.
+        concurrency (int): Maximum number of pages loading at the same time.
+        pages_per_minute (float): Maximum page loads per minute per host.
+        jitter (float): Upper bound, in seconds, of random delay per page load.
+        pages_per_context (int): Recycle the browser context after this many pages.
+        blocker (ResourceBlocker, optional): Aborts requests the scraper doesn't
+            need (images, fonts, media, analytics) on every browser context.
+
+    Yields:
+        ScrapeResult: One per URL, in completion order.
+    """
+    urls = list(urls)
+    if not urls:
+        return
+
+    limiter = HostRateLimiter(pages_per_minute, jitter=jitter)
+    pending = asyncio.Queue()
+    for url in urls:
+        pending.put_nowait(url)
+    results = asyncio.Queue()
+
+    async def worker(pool):
+        while True:
+            try:
+                url = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                with trace.span('scrape.rate_limit_wait'):
+                    await limiter.acquire(url)
+                result = await scrape_page(pool, url)
+            except Exception as e:
+                result = ScrapeResult(url, None, 'error', str(e))
+            await results.put(result)
+
+    async with AsyncBrowserPool(max_pages_per_context=pages_per_context, blocker=blocker) as pool:
+        workers = [asyncio.create_task(worker(pool)) for _ in range(max(1, min(concurrency, len(urls))))]
+        try:
+            for _ in range(len(urls)):
+                yield await results.get()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
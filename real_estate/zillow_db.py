@@ -1,16 +1,116 @@
+import json
+import os
+import queue
 import sqlite3
 import datetime
+import threading
+import time
+from contextlib import contextmanager
+import zillow_trace as trace
+import zillow_logging
+
+log = zillow_logging.get_logger(__name__)
 
 # The database file name
 DB_FILE = 'zillow_data.db'
+# The database that ships next to these scripts
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), DB_FILE)
 
-def setup_db(conn):
+# Batched writes: flush once this many snapshots are queued, or once this
+# many seconds have passed since the last flush, whichever comes first.
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 30.0
+
+# ZillowRepository: at most this many open connections, how long a writer
+# waits on another writer's lock before giving up, and how many prepared
+# statements each connection keeps compiled.
+DEFAULT_POOL_SIZE = 4
+DEFAULT_BUSY_TIMEOUT = 30.0
+STATEMENT_CACHE_SIZE = 256
+
+INSERT_PROPERTY_SQL = """
+INSERT INTO properties (property_id, property_name, url, listing_agent_id)
+VALUES (?, ?, ?, ?);
+"""
+
+# Bulk variant: properties that already exist are left as they are
+INSERT_PROPERTY_IF_MISSING_SQL = """
+INSERT OR IGNORE INTO properties (property_id, property_name, url, listing_agent_id)
+VALUES (?, ?, ?, ?);
+"""
+
+INSERT_AGENT_SQL = """
+INSERT INTO listing_agents (agent_name, address, phone, comments)
+VALUES (?, ?, ?, ?);
+"""
+
+# A snapshot already stored for the same property and scrape date (e.g. a
+# .zlw file formatted again) is ignored rather than duplicated
+INSERT_SCRAPE_RESULT_SQL = """
+INSERT OR IGNORE INTO scrape_results (property_id, scrape_date, days_on_market, views, saves)
+VALUES (?, ?, ?, ?, ?);
+"""
+
+# Records the newest snapshot seen for a property, whether or not it was
+# written to scrape_results. Older snapshots (backfills) leave it alone.
+UPSERT_LATEST_SNAPSHOT_SQL = """
+INSERT INTO latest_snapshots (property_id, scrape_date, days_on_market, views, saves)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (property_id) DO UPDATE SET
+    scrape_date = excluded.scrape_date,
+    days_on_market = excluded.days_on_market,
+    views = excluded.views,
+    saves = excluded.saves
+WHERE excluded.scrape_date >= latest_snapshots.scrape_date;
+"""
+
+# Days on which a compact write left a snapshot out of scrape_results;
+# get_daily_series() fills only these days back in
+INSERT_COMPACTED_DAY_SQL = """
+INSERT OR IGNORE INTO compacted_days (property_id, day) VALUES (?, ?);
+"""
+
+SELECT_LATEST_SNAPSHOTS_SQL = """
+SELECT property_id, scrape_date, days_on_market, views, saves
+FROM latest_snapshots
+WHERE property_id IN (SELECT value FROM json_each(?));
+"""
+
+
+def connect_db(db_path=DEFAULT_DB_PATH):
+    """
+    Opens the database and makes sure the schema exists.
+
+    Args:
+        db_path (str): Path to the SQLite file. Defaults to the one next to this module.
+
+    Returns:
+        sqlite3.Connection: The open connection.
+    """
+    conn = sqlite3.connect(db_path)
+    setup_db(conn)
+    return conn
+
+
+def scrape_timestamp(when=None):
     """
-    Creates the necessary tables in the database.
-    This function should be run once to set up the schema.
+    Formats a scrape date the way it is stored in scrape_results.
+
+    Args:
+        when (datetime or float, optional): A datetime or a POSIX timestamp.
+            Defaults to now.
+
+    Returns:
+        str: The date as 'YYYY-MM-DD HH:MM:SS'.
     """
-    cursor = conn.cursor()
+    if when is None:
+        when = datetime.datetime.now()
+    elif not isinstance(when, datetime.datetime):
+        when = datetime.datetime.fromtimestamp(when)
+    return when.strftime('%Y-%m-%d %H:%M:%S')
 
+def _create_base_tables(cursor):
+    """Migration 1: the original listing_agents, properties and scrape_results tables."""
     # Create listing_agents table
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS listing_agents (
@@ -45,95 +145,413 @@ def setup_db(conn):
         FOREIGN KEY (property_id) REFERENCES properties (property_id)
     );
     """)
-    conn.commit()
 
-def update_scrape_results(conn, property_id, days_on_market, views, saves):
+
+def _add_scrape_result_indexes(cursor):
+    """Migration 2: indexes for the per-property time series and latest-snapshot lookups."""
+    # Covering index: history and latest-snapshot queries for a property are
+    # answered from the index alone, without touching the table rows.
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_scrape_results_property_date
+    ON scrape_results (property_id, scrape_date, days_on_market, views, saves);
+    """)
+    # "Everything scraped since <date>" for dashboards
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_scrape_results_date
+    ON scrape_results (scrape_date);
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_properties_listing_agent
+    ON properties (listing_agent_id);
+    """)
+
+
+def _add_latest_snapshots(cursor):
+    """Migration 3: the last snapshot seen per property, used by compact writes."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS latest_snapshots (
+        property_id TEXT PRIMARY KEY,
+        scrape_date TEXT NOT NULL,
+        days_on_market INTEGER,
+        views INTEGER,
+        saves INTEGER
+    ) WITHOUT ROWID;
+    """)
+    cursor.execute("""
+    INSERT OR REPLACE INTO latest_snapshots (property_id, scrape_date, days_on_market, views, saves)
+    SELECT property_id, MAX(scrape_date), days_on_market, views, saves
+    FROM scrape_results
+    GROUP BY property_id;
+    """)
+
+
+def _create_scrape_schedule(cursor):
+    """Migration 4: when each listing is next due to be scraped (see zillow_scheduler.py)."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS scrape_schedule (
+        property_id TEXT PRIMARY KEY,
+        url TEXT NOT NULL,
+        next_due TEXT NOT NULL,
+        interval_hours REAL NOT NULL,
+        priority REAL NOT NULL DEFAULT 0,
+        last_attempt TEXT,
+        last_status TEXT,
+        failures INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (property_id) REFERENCES properties (property_id)
+    );
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_scrape_schedule_next_due
+    ON scrape_schedule (next_due);
+    """)
+
+
+def _create_scrape_jobs(cursor):
+    """Migration 5: the resumable work queue behind scrape_zillow.py batches (see zillow_job_queue.py)."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS scrape_jobs (
+        job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        batch TEXT NOT NULL,
+        url TEXT NOT NULL,
+        state TEXT NOT NULL DEFAULT 'pending'
+            CHECK (state IN ('pending', 'in_flight', 'done', 'failed', 'captcha')),
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        next_attempt TEXT NOT NULL,
+        claimed_at TEXT,
+        completed_at TEXT,
+        UNIQUE (batch, url)
+    );
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_scrape_jobs_batch_state
+    ON scrape_jobs (batch, state, next_attempt);
+    """)
+
+
+def _add_scrape_results_unique_snapshot(cursor):
+    """Migration 6: at most one scrape_results row per property and scrape date."""
+    # Reprocessed pages used to insert their snapshot again; keep the first copy
+    cursor.execute("""
+    DELETE FROM scrape_results
+    WHERE result_id NOT IN (
+        SELECT MIN(result_id) FROM scrape_results GROUP BY property_id, scrape_date
+    );
+    """)
+    cursor.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_scrape_results_unique_snapshot
+    ON scrape_results (property_id, scrape_date);
+    """)
+
+
+def _create_compacted_days(cursor):
+    """Migration 7: the days compact writes skipped, so only those are filled in."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS compacted_days (
+        property_id TEXT NOT NULL,
+        day TEXT NOT NULL,
+        PRIMARY KEY (property_id, day)
+    ) WITHOUT ROWID;
+    """)
+    # Earlier skips weren't recorded; the one behind a latest snapshot newer
+    # than anything stored is the only one we can tell
+    cursor.execute("""
+    INSERT OR IGNORE INTO compacted_days (property_id, day)
+    SELECT l.property_id, substr(l.scrape_date, 1, 10)
+    FROM latest_snapshots l
+    WHERE l.scrape_date > (SELECT MAX(r.scrape_date) FROM scrape_results r WHERE r.property_id = l.property_id);
+    """)
+
+
+# Ordered schema migrations: (version, description, function taking a cursor).
+# Append new migrations to the end; never edit or reorder applied ones.
+MIGRATIONS = [
+    (1, 'create base tables', _create_base_tables),
+    (2, 'index scrape_results by property and date', _add_scrape_result_indexes),
+    (3, 'track the latest snapshot per property', _add_latest_snapshots),
+    (4, 'add the scrape schedule', _create_scrape_schedule),
+    (5, 'add the scrape job queue', _create_scrape_jobs),
+    (6, 'make scrape_results snapshots unique per property and date', _add_scrape_results_unique_snapshot),
+    (7, 'record the days compact writes skipped', _create_compacted_days),
+]
+
+# Connection settings applied every time the database is opened.
+#   WAL lets readers keep reading while a writer commits, and with it
+#   synchronous=NORMAL is still crash-safe but skips an fsync per commit.
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -20000),        # negative means KiB: about 20 MB of page cache
+    ('mmap_size', 268435456),      # memory-map up to 256 MB of the file
+    ('temp_store', 'MEMORY'),
+)
+
+
+def apply_pragmas(conn):
     """
-    Inserts a new record into the scrape_results table.
+    Applies the connection PRAGMAS (WAL journal, cache and mmap sizes).
 
     Args:
         conn: The database connection object.
-        property_id (str): The unique ID of the property.
-        days_on_market (int): The number of days the property has been on the market.
-        views (int): The number of views.
-        saves (int): The number of saves.
     """
-    try:
-        # Get a cursor object
-        cursor = conn.cursor()
+    for name, value in PRAGMAS:
+        conn.execute(f"PRAGMA {name} = {value};")
 
-        # Generate a timestamp for the scrape date
-        scrape_date = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-        # SQL statement to insert data into the table using a parameterized query
-        sql = """
-        INSERT INTO scrape_results (property_id, scrape_date, days_on_market, views, saves)
-        VALUES (?, ?, ?, ?, ?);
-        """
-        
-        # Execute the SQL statement with the data
-        cursor.execute(sql, (property_id, scrape_date, days_on_market, views, saves))
-        
-        # Commit the transaction to save the changes to the database
-        conn.commit()
-        print(f"Successfully inserted scrape results for property '{property_id}'.")
+def get_schema_version(conn):
+    """
+    Returns the highest migration version applied to the database.
 
-    except sqlite3.Error as e:
-        print(f"An error occurred while inserting data: {e}")
+    Args:
+        conn: The database connection object.
 
+    Returns:
+        int: The schema version, 0 for a database without a schema_version table.
+    """
+    row = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'schema_version';"
+    ).fetchone()
+    if row is None:
+        return 0
+    version = conn.execute("SELECT MAX(version) FROM schema_version;").fetchone()[0]
+    return version or 0
 
-# --- Example Usage ---
-if __name__ == "__main__":
-    try:
-        # Connect to the SQLite database. It will create the file if it doesn't exist.
-        conn = sqlite3.connect(DB_FILE)
-        print(f"Connected to database: {DB_FILE}")
 
-        # Set up the tables (run this once)
-        setup_db(conn)
+def migrate(conn):
+    """
+    Applies any migrations newer than the database's schema version.
+    Each migration runs in its own write transaction together with its
+    schema_version row, so a failed migration leaves no partial changes and
+    two processes opening the database at once don't both apply it.
 
-        # To test the foreign key constraint, we must first add a property.
-        # This is a one-time step for a new property ID.
-        try:
-            conn.execute("INSERT INTO properties (property_id, property_name, url) VALUES (?, ?, ?)", 
-                         ('200000', '123 Test St', 'https://www.zillow.com/test-property'))
-            conn.commit()
-            print("Added a sample property to the 'properties' table.")
-        except sqlite3.IntegrityError:
-            print("Sample property already exists.")
-
-        # Sample data from a Zillow scrape
-        scraped_data = {
-            'property_id': '200000',
-            'days_on_market': 204,
-            'views': 1188,
-            'saves': 61
-        }
-        
-        # Call the function to update the scrape results table
-        update_scrape_results(
-            conn, 
-            scraped_data['property_id'],
-            scraped_data['days_on_market'],
-            scraped_data['views'],
-            scraped_data['saves']
-        )
-
-        # --- Verification Step ---
-        print("\nVerifying the data was inserted:")
+    Args:
+        conn: The database connection object.
+
+    Returns:
+        int: The schema version after migrating.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TEXT NOT NULL
+    );
+    """)
+    current = get_schema_version(conn)
+    for version, description, apply_migration in MIGRATIONS:
+        if version <= current:
+            continue
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM scrape_results WHERE property_id = '200000'")
-        results = cursor.fetchall()
-        for row in results:
-            print(row)
+        try:
+            cursor.execute("BEGIN IMMEDIATE;")
+            # Another connection may have applied it while we waited for the lock
+            if get_schema_version(conn) >= version:
+                cursor.execute("COMMIT;")
+                current = version
+                continue
+            apply_migration(cursor)
+            cursor.execute("INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?);",
+                           (version, description, scrape_timestamp()))
+            cursor.execute("COMMIT;")
+        except sqlite3.Error:
+            cursor.execute("ROLLBACK;")
+            raise
+        log.info("Applied database migration %d: %s", version, description)
+        current = version
+    return current
 
-    except sqlite3.Error as e:
-        print(f"A connection error occurred: {e}")
 
-    finally:
-        if conn:
-            conn.close()
-            print("Database connection closed.")
+def setup_db(conn):
+    """
+    Prepares a connection for use: applies the PRAGMAS and brings the schema
+    up to date by running any pending MIGRATIONS. Safe to call on every connect.
+    """
+    apply_pragmas(conn)
+    migrate(conn)
+
+
+def get_property_history(conn, property_id):
+    """
+    Returns every snapshot of one property, oldest first.
+
+    Args:
+        conn: The database connection object.
+        property_id (str): The Zillow Property ID (ZPID).
+
+    Returns:
+        list: Tuples of (scrape_date, days_on_market, views, saves).
+    """
+    return conn.execute("""
+    SELECT scrape_date, days_on_market, views, saves
+    FROM scrape_results
+    WHERE property_id = ?
+    ORDER BY scrape_date;
+    """, (property_id,)).fetchall()
+
+
+def get_latest_snapshots(conn):
+    """
+    Returns the most recent snapshot of every property.
+
+    Args:
+        conn: The database connection object.
+
+    Returns:
+        list: Tuples of (property_id, scrape_date, days_on_market, views, saves).
+    """
+    # Kept up to date by every write, including snapshots that compact
+    # writes leave out of scrape_results
+    return conn.execute("""
+    SELECT property_id, scrape_date, days_on_market, views, saves
+    FROM latest_snapshots
+    ORDER BY property_id;
+    """).fetchall()
+
+
+def _scrape_day(scrape_date):
+    return datetime.date.fromisoformat(scrape_date[:10])
+
+
+def is_expected_tick(previous, snapshot):
+    """
+    Checks whether a snapshot tells us nothing new: views and saves are
+    unchanged and days_on_market only advanced by the calendar days elapsed.
+
+    Args:
+        previous (tuple): The last known (scrape_date, days_on_market, views, saves).
+        snapshot (tuple): A newer (scrape_date, days_on_market, views, saves).
+
+    Returns:
+        bool: True if the snapshot can be rebuilt from the previous one.
+    """
+    previous_date, previous_days, previous_views, previous_saves = previous
+    scrape_date, days_on_market, views, saves = snapshot
+    if scrape_date < previous_date or views != previous_views or saves != previous_saves:
+        return False
+    if previous_days is None or days_on_market is None:
+        return previous_days == days_on_market
+    return days_on_market - previous_days == (_scrape_day(scrape_date) - _scrape_day(previous_date)).days
+
+
+def compact_scrape_results(conn, results):
+    """
+    Drops the snapshots that only repeat what is already known, so a property
+    gains a scrape_results row only when one of its metrics changes.
+
+    Each snapshot is compared with the last one known for its property: the
+    latest_snapshots row, read once per call for all the properties in
+    `results`, then the previous snapshot in `results` itself. Snapshots
+    older than the last known one are kept, since they can't be compared.
+
+    Args:
+        conn: The database connection object. Call inside the write
+            transaction so another writer can't move latest_snapshots meanwhile.
+        results (list): Tuples of (property_id, scrape_date, days_on_market, views, saves).
+
+    Returns:
+        list: The tuples worth writing, oldest first per property.
+    """
+    return _compact_scrape_results(conn, results)[0]
+
+
+def _compact_scrape_results(conn, results):
+    # compact_scrape_results(), plus the tuples it dropped
+    property_ids = json.dumps(sorted({str(row[0]) for row in results}))
+    known = {row[0]: row[1:] for row in conn.execute(SELECT_LATEST_SNAPSHOTS_SQL, (property_ids,))}
+    changed = []
+    skipped = []
+    for row in sorted(results, key=lambda row: (str(row[0]), row[1])):
+        property_id, snapshot = str(row[0]), tuple(row[1:])
+        previous = known.get(property_id)
+        if previous is not None and is_expected_tick(previous, snapshot):
+            known[property_id] = snapshot
+            skipped.append(row)
+            continue
+        changed.append(row)
+        if previous is None or snapshot[0] >= previous[0]:
+            known[property_id] = snapshot
+    return changed, skipped
+
+
+def get_daily_series(conn, property_id, start=None, end=None):
+    """
+    Rebuilds one value per day for a property from its stored snapshots.
+    Days on which a compact write skipped the snapshot (see compacted_days)
+    repeat the last stored views and saves, with days_on_market advanced by
+    the calendar days since, which is exactly what compact writes leave out.
+    Days the property wasn't scraped at all are left out of the series
+    rather than invented.
+
+    Args:
+        conn: The database connection object.
+        property_id (str): The Zillow Property ID (ZPID).
+        start (str or datetime.date, optional): First day to return ('YYYY-MM-DD').
+        end (str or datetime.date, optional): Last day to return.
+
+    Returns:
+        list: Tuples of (day 'YYYY-MM-DD', days_on_market, views, saves),
+        oldest first; empty if the property has no snapshots.
+    """
+    rows = get_property_history(conn, property_id)
+    if not rows:
+        return []
+
+    # The last snapshot of each day stands for that day
+    by_day = {}
+    for scrape_date, days_on_market, views, saves in rows:
+        by_day[_scrape_day(scrape_date)] = (days_on_market, views, saves)
+    compacted = conn.execute("SELECT day FROM compacted_days WHERE property_id = ?;", (property_id,)).fetchall()
+    days = sorted(set(by_day) | {datetime.date.fromisoformat(row[0]) for row in compacted})
+
+    series = []
+    stored_day = None
+    for day in days:
+        if day in by_day:
+            stored_day = day
+            current = by_day[day]
+        elif stored_day is None:
+            continue  # Nothing stored yet to rebuild it from
+        else:
+            days_on_market, views, saves = by_day[stored_day]
+            if days_on_market is not None:
+                days_on_market += (day - stored_day).days
+            current = (days_on_market, views, saves)
+        series.append((day.isoformat(), *current))
+    if start is not None:
+        first = str(start)[:10]
+        series = [entry for entry in series if entry[0] >= first]
+    if end is not None:
+        last = str(end)[:10]
+        series = [entry for entry in series if entry[0] <= last]
+    return series
+
+
+def update_scrape_results(conn, property_id, days_on_market, views, saves, compact=False):
+    """
+    Inserts a new record into the scrape_results table.
+
+    Args:
+        conn: The database connection object.
+        property_id (str): The unique ID of the property.
+        days_on_market (int): The number of days the property has been on the market.
+        views (int): The number of views.
+        saves (int): The number of saves.
+        compact (bool): Skip the insert if nothing changed but the day count.
+    """
+    try:
+        # Generate a timestamp for the scrape date
+        scrape_date = scrape_timestamp()
+
+        # Insert the row (unless compact and unchanged) and remember it as the latest snapshot
+        inserted = insert_scrape_results(conn, [(property_id, scrape_date, days_on_market, views, saves)],
+                                         commit=True, compact=compact)
+        if inserted:
+            log.debug("Inserted scrape results for property '%s'.", property_id)
+        else:
+            log.debug("Scrape results for property '%s' are unchanged; nothing inserted.", property_id)
+
+    except sqlite3.Error as e:
+        log.error("An error occurred while inserting data: %s", e)
 
 
 def insert_property(conn, property_id, property_name, url, listing_agent_id=None):
@@ -152,19 +570,15 @@ def insert_property(conn, property_id, property_name, url, listing_agent_id=None
     """
     try:
         cursor = conn.cursor()
-        sql = """
-        INSERT INTO properties (property_id, property_name, url, listing_agent_id)
-        VALUES (?, ?, ?, ?);
-        """
-        cursor.execute(sql, (property_id, property_name, url, listing_agent_id))
+        cursor.execute(INSERT_PROPERTY_SQL, (property_id, property_name, url, listing_agent_id))
         conn.commit()
-        print(f"✅ Successfully inserted new property: {property_name} ({property_id})")
+        log.info("Inserted new property: %s (%s)", property_name, property_id)
         return True
     except sqlite3.IntegrityError:
-        print(f"⚠️ Property with ID {property_id} or URL {url} already exists. Skipping.")
+        log.warning("Property with ID %s or URL %s already exists. Skipping.", property_id, url)
         return False
     except sqlite3.Error as e:
-        print(f"❌ An error occurred inserting a new property: {e}")
+        log.error("An error occurred inserting a new property: %s", e)
         return False
 
 # Example usage:
@@ -189,17 +603,13 @@ def insert_agent(conn, agent_name, address=None, phone=None, comments=None):
     """
     try:
         cursor = conn.cursor()
-        sql = """
-        INSERT INTO listing_agents (agent_name, address, phone, comments)
-        VALUES (?, ?, ?, ?);
-        """
-        cursor.execute(sql, (agent_name, address, phone, comments))
+        cursor.execute(INSERT_AGENT_SQL, (agent_name, address, phone, comments))
         conn.commit()
         agent_id = cursor.lastrowid
-        print(f"✅ Successfully inserted new agent: {agent_name} with ID {agent_id}")
+        log.info("Inserted new agent: %s with ID %s", agent_name, agent_id)
         return agent_id
     except sqlite3.Error as e:
-        print(f"❌ An error occurred inserting a new agent: {e}")
+        log.error("An error occurred inserting a new agent: %s", e)
         return None
 
 # Example usage:
@@ -238,7 +648,7 @@ def update_property(conn, property_id, property_name=None, url=None, listing_age
             params.append(listing_agent_id)
 
         if not updates:
-            print("⚠️ No fields provided for update.")
+            log.warning("No fields provided for update.")
             return False
 
         sql = f"UPDATE properties SET {', '.join(updates)} WHERE property_id = ?;"
@@ -248,14 +658,14 @@ def update_property(conn, property_id, property_name=None, url=None, listing_age
         conn.commit()
         
         if cursor.rowcount > 0:
-            print(f"✅ Successfully updated property with ID: {property_id}")
+            log.info("Updated property with ID: %s", property_id)
             return True
         else:
-            print(f"❌ No property found with ID: {property_id}")
+            log.warning("No property found with ID: %s", property_id)
             return False
             
     except sqlite3.Error as e:
-        print(f"❌ An error occurred while updating the property: {e}")
+        log.error("An error occurred while updating the property: %s", e)
         return False
 
 # Example usage:
@@ -298,7 +708,7 @@ def update_agent(conn, agent_id, agent_name=None, address=None, phone=None, comm
             params.append(comments)
 
         if not updates:
-            print("⚠️ No fields provided for update.")
+            log.warning("No fields provided for update.")
             return False
         
         sql = f"UPDATE listing_agents SET {', '.join(updates)} WHERE agent_id = ?;"
@@ -308,17 +718,528 @@ def update_agent(conn, agent_id, agent_name=None, address=None, phone=None, comm
         conn.commit()
         
         if cursor.rowcount > 0:
-            print(f"✅ Successfully updated agent with ID: {agent_id}")
+            log.info("Updated agent with ID: %s", agent_id)
             return True
         else:
-            print(f"❌ No agent found with ID: {agent_id}")
+            log.warning("No agent found with ID: %s", agent_id)
             return False
             
     except sqlite3.Error as e:
-        print(f"❌ An error occurred while updating the agent: {e}")
+        log.error("An error occurred while updating the agent: %s", e)
         return False
 
 # Example usage:
 # conn = sqlite3.connect('zillow_data.db')
 # update_agent(conn, 1, agent_name='Jane Doe, Realtor')
-# conn.close()
\ No newline at end of file
+# conn.close()
+
+
+def insert_properties(conn, properties, commit=True):
+    """
+    Inserts many property records with a single executemany call.
+    Properties that already exist (same ID or URL) are skipped.
+
+    Args:
+        conn: The SQLite database connection object.
+        properties (list): Tuples of (property_id, property_name, url, listing_agent_id).
+        commit (bool): Commit when done. Pass False to keep the inserts in
+            the caller's transaction.
+
+    Returns:
+        int: The number of new properties inserted.
+    """
+    before = conn.total_changes
+    conn.executemany(INSERT_PROPERTY_IF_MISSING_SQL, properties)
+    if commit:
+        conn.commit()
+    return conn.total_changes - before
+
+
+def insert_scrape_results(conn, results, commit=True, compact=False):
+    """
+    Inserts many scrape_results rows with a single executemany call and
+    records the newest of them in latest_snapshots. Snapshots already
+    stored for the same property and scrape_date are skipped.
+
+    Args:
+        conn: The SQLite database connection object.
+        results (list): Tuples of (property_id, scrape_date, days_on_market, views, saves).
+        commit (bool): Commit when done. Pass False to keep the inserts in
+            the caller's transaction.
+        compact (bool): Only insert the snapshots whose metrics changed;
+            see compact_scrape_results(). The days left out are recorded in
+            compacted_days, and get_daily_series() rebuilds them.
+
+    Returns:
+        int: The number of scrape_results rows inserted, not counting
+        snapshots that were already stored or compacted away.
+    """
+    rows, skipped = _compact_scrape_results(conn, results) if compact else (results, [])
+    before = conn.total_changes
+    conn.executemany(INSERT_SCRAPE_RESULT_SQL, rows)
+    inserted = conn.total_changes - before
+    conn.executemany(INSERT_COMPACTED_DAY_SQL, [(str(row[0]), row[1][:10]) for row in skipped])
+    conn.executemany(UPSERT_LATEST_SNAPSHOT_SQL, results)
+    if commit:
+        conn.commit()
+    return inserted
+
+
+def complete_scrape_jobs(conn, job_ids, when=None):
+    """
+    Marks scrape_jobs rows done, unless they already are.
+
+    Args:
+        conn: The database connection object.
+        job_ids (iterable): The jobs to complete.
+        when (datetime, optional): The completion time. Defaults to now.
+
+    Returns:
+        set: The IDs that were not done before this call. Write a job's
+        results only if its ID is in here, in the same transaction, and a
+        job finished twice still stores its snapshot once.
+    """
+    completed_at = scrape_timestamp(when)
+    completed = set()
+    for job_id in job_ids:
+        cursor = conn.execute("""
+        UPDATE scrape_jobs SET state = 'done', attempts = attempts + 1, completed_at = ?, last_error = NULL
+        WHERE job_id = ? AND state != 'done';
+        """, (completed_at, job_id))
+        if cursor.rowcount:
+            completed.add(job_id)
+    return completed
+
+
+class ZillowRepository:
+    """
+    Thread-safe access to the Zillow database.
+
+    The repository owns a small pool of connections that any thread can
+    borrow. Each connection keeps its prepared statements cached, and a busy
+    timeout makes concurrent writers wait their turn instead of failing with
+    "database is locked". Every method runs in a transaction. Wrap several calls in
+    `transaction()` to commit them together: calls made on the same thread
+    inside the block join it instead of committing on their own.
+
+    Usage:
+        with ZillowRepository() as repo:
+            with repo.transaction():
+                repo.insert_properties(rows)
+                repo.add_scrape_results(results)
+
+    Args:
+        db_path (str): Path to the SQLite file. Defaults to the one next to this module.
+        pool_size (int): Maximum number of open connections.
+        busy_timeout (float): Seconds to wait for another writer's lock.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, pool_size=DEFAULT_POOL_SIZE, busy_timeout=DEFAULT_BUSY_TIMEOUT):
+        self.db_path = db_path
+        self.pool_size = max(1, pool_size)
+        self.busy_timeout = busy_timeout
+        self._idle = queue.LifoQueue()
+        self._connections = []
+        # Connections open or being opened; a slot is reserved before connecting
+        self._opened = 1
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Open the first connection now so the schema is migrated up front
+        conn = self._connect()
+        migrate(conn)
+        self._idle.put(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _connect(self):
+        # isolation_level=None: we issue BEGIN/COMMIT ourselves in transaction()
+        conn = sqlite3.connect(self.db_path,
+                               timeout=self.busy_timeout,
+                               isolation_level=None,
+                               check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        apply_pragmas(conn)
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrows a connection from the pool for the duration of the block.
+        Inside a transaction() on this thread, that transaction's connection
+        is yielded instead.
+        """
+        active = getattr(self._local, 'conn', None)
+        if active is not None:
+            yield active
+            return
+
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.pool_size
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                try:
+                    conn = self._connect()
+                except BaseException:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                # Not if close() closed it meanwhile
+                pooled = any(conn is open_conn for open_conn in self._connections)
+            if pooled:
+                self._idle.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Runs the block in a single write transaction and commits at the end,
+        or rolls back if it raises. Nested calls on the same thread join the
+        outermost transaction.
+        """
+        if getattr(self._local, 'conn', None) is not None:
+            yield self._local.conn
+            return
+
+        with self.connection() as conn:
+            # IMMEDIATE takes the write lock up front, so two writers queue on
+            # the busy timeout instead of deadlocking halfway through
+            conn.execute("BEGIN IMMEDIATE;")
+            self._local.conn = conn
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK;")
+                raise
+            else:
+                conn.execute("COMMIT;")
+            finally:
+                self._local.conn = None
+
+    def close(self):
+        """
+        Closes every connection in the pool. Using the repository afterwards
+        opens new ones.
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._opened = 0
+            while True:
+                try:
+                    self._idle.get_nowait()
+                except queue.Empty:
+                    break
+        for conn in connections:
+            conn.close()
+
+    # --- properties ---
+
+    def insert_property(self, property_id, property_name, url, listing_agent_id=None):
+        """
+        Inserts a new property record.
+
+        Returns:
+            bool: True if inserted, False if the ID or URL already exists.
+        """
+        try:
+            with self.transaction() as conn:
+                conn.execute(INSERT_PROPERTY_SQL, (property_id, property_name, url, listing_agent_id))
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def insert_properties(self, properties):
+        """
+        Inserts many properties in one transaction, skipping existing ones.
+
+        Args:
+            properties (list): Tuples of (property_id, property_name, url, listing_agent_id).
+
+        Returns:
+            int: The number of new properties inserted.
+        """
+        with self.transaction() as conn:
+            return insert_properties(conn, properties, commit=False)
+
+    def update_property(self, property_id, property_name=None, url=None, listing_agent_id=None):
+        """
+        Updates the given fields of a property.
+
+        Returns:
+            bool: True if a property was updated, False otherwise.
+        """
+        return self._update('properties', 'property_id', property_id,
+                            property_name=property_name, url=url, listing_agent_id=listing_agent_id)
+
+    # --- agents ---
+
+    def insert_agent(self, agent_name, address=None, phone=None, comments=None):
+        """
+        Inserts a new listing agent.
+
+        Returns:
+            int: The agent_id of the new record.
+        """
+        with self.transaction() as conn:
+            return conn.execute(INSERT_AGENT_SQL, (agent_name, address, phone, comments)).lastrowid
+
+    def insert_agents(self, agents):
+        """
+        Inserts many listing agents in one transaction.
+
+        Args:
+            agents (list): Tuples of (agent_name, address, phone, comments).
+
+        Returns:
+            list: The agent_id of each new record, in input order.
+        """
+        with self.transaction() as conn:
+            return [conn.execute(INSERT_AGENT_SQL, tuple(agent)).lastrowid for agent in agents]
+
+    def update_agent(self, agent_id, agent_name=None, address=None, phone=None, comments=None):
+        """
+        Updates the given fields of a listing agent.
+
+        Returns:
+            bool: True if an agent was updated, False otherwise.
+        """
+        return self._update('listing_agents', 'agent_id', agent_id,
+                            agent_name=agent_name, address=address, phone=phone, comments=comments)
+
+    def _update(self, table, key_column, key, **fields):
+        fields = {column: value for column, value in fields.items() if value is not None}
+        if not fields:
+            return False
+        assignments = ', '.join(f"{column} = ?" for column in fields)
+        sql = f"UPDATE {table} SET {assignments} WHERE {key_column} = ?;"
+        with self.transaction() as conn:
+            return conn.execute(sql, (*fields.values(), key)).rowcount > 0
+
+    # --- scrape results ---
+
+    def add_scrape_result(self, property_id, days_on_market, views, saves, scrape_date=None, compact=False):
+        """Inserts one scrape_results row; scrape_date defaults to now. Returns whether it was written."""
+        return self.add_scrape_results(
+            [(property_id, scrape_date or scrape_timestamp(), days_on_market, views, saves)], compact) > 0
+
+    def add_scrape_results(self, results, compact=False):
+        """
+        Inserts many scrape_results rows in one transaction.
+
+        Args:
+            results (list): Tuples of (property_id, scrape_date, days_on_market, views, saves).
+            compact (bool): Only insert the snapshots whose metrics changed.
+
+        Returns:
+            int: The number of rows inserted.
+        """
+        with self.transaction() as conn:
+            return insert_scrape_results(conn, results, commit=False, compact=compact)
+
+    def get_property_history(self, property_id):
+        """Every snapshot of one property, oldest first; see get_property_history()."""
+        with self.connection() as conn:
+            return get_property_history(conn, property_id)
+
+    def get_latest_snapshots(self):
+        """The most recent snapshot of every property; see get_latest_snapshots()."""
+        with self.connection() as conn:
+            return get_latest_snapshots(conn)
+
+    def get_daily_series(self, property_id, start=None, end=None):
+        """One snapshot per scraped day for a property, compacted days filled in; see get_daily_series()."""
+        with self.connection() as conn:
+            return get_daily_series(conn, property_id, start, end)
+
+
+class ScrapeResultWriter:
+    """
+    Buffers scrape snapshots and writes them in batches. A snapshot already
+    stored for the same property and scrape date is not written again and
+    counts as unchanged.
+
+    Each flush upserts the listings' properties rows and inserts their
+    scrape_results rows with executemany inside one transaction, so a large
+    backfill pays for one commit per batch instead of one per row. A flush
+    happens when `batch_size` snapshots are queued, when `flush_interval`
+    seconds have passed since the last one, and when the writer is closed.
+    The writer may be shared between threads.
+
+    Usage:
+        with ZillowRepository() as repo, ScrapeResultWriter(repo) as writer:
+            writer.add(property_id, name, url, days_on_market, views, saves)
+
+    With compact=True only snapshots whose views, saves or days on market
+    changed (beyond the daily tick) are written, so scraping more often
+    doesn't grow scrape_results; get_daily_series() fills the gaps back in.
+
+    Args:
+        repository (ZillowRepository): Where the snapshots are written.
+        batch_size (int): Flush once this many snapshots are queued.
+        flush_interval (float): Flush once this many seconds have passed.
+        compact (bool): Skip snapshots that only repeat the last known one.
+    """
+
+    def __init__(self, repository, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 compact=False):
+        self.repository = repository
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compact = compact
+        self.written = 0
+        self.unchanged = 0
+        self._properties = {}
+        self._results = []
+        self._jobs = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, property_id, property_name, url, days_on_market, views, saves, scrape_date=None, job_id=None):
+        """
+        Queues one snapshot, flushing if a size or time threshold is reached.
+
+        Args:
+            property_id (str): The Zillow Property ID (ZPID).
+            property_name (str): A descriptive name for the property.
+            url (str): The full Zillow listing URL.
+            days_on_market (int): Days the property has been on the market.
+            views (int): The number of views.
+            saves (int): The number of saves.
+            scrape_date (str, optional): When the page was captured.
+                Defaults to now.
+            job_id (int, optional): The scrape_jobs row this snapshot
+                completes. The job is marked done in the same transaction
+                the snapshot is written in, and the snapshot is dropped if
+                the job was already done.
+        """
+        with self._lock:
+            self._properties.setdefault(property_id, (property_id, property_name, url, None))
+            self._results.append((property_id, scrape_date or scrape_timestamp(),
+                                  days_on_market, views, saves))
+            self._jobs.append(job_id)
+            due = (len(self._results) >= self.batch_size
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes everything queued so far in a single transaction.
+
+        Returns:
+            int: The number of scrape_results rows written.
+        """
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._results:
+                return 0
+            properties = list(self._properties.values())
+            results = self._results
+            jobs = self._jobs
+            try:
+                with trace.span('db.flush', rows=len(results)), self.repository.transaction() as conn:
+                    self.repository.insert_properties(properties)
+                    job_ids = [job_id for job_id in jobs if job_id is not None]
+                    if job_ids:
+                        # One snapshot per job that wasn't already done
+                        completed = complete_scrape_jobs(conn, set(job_ids))
+                        kept = []
+                        for result, job_id in zip(results, jobs):
+                            if job_id is None or job_id in completed:
+                                kept.append(result)
+                                completed.discard(job_id)
+                        results = kept
+                    count = self.repository.add_scrape_results(results, self.compact)
+            except sqlite3.Error as e:
+                log.error("An error occurred writing a batch of %d scrape results: %s", len(results), e)
+                return 0
+            self._properties = {}
+            self._results = []
+            self._jobs = []
+            self.written += count
+            self.unchanged += len(results) - count
+            trace.count('db.rows_written', count)
+        if count < len(results):
+            log.info("Saved %d scrape results to the database (%d unchanged).", count, len(results) - count)
+        else:
+            log.info("Saved %d scrape results to the database.", count)
+        return count
+
+    def close(self):
+        """Flushes whatever is still queued."""
+        self.flush()
+
+    @property
+    def pending(self):
+        """The number of snapshots queued but not yet written, e.g. after a failed flush."""
+        with self._lock:
+            return len(self._results)
+
+
+# Tables reported by `db info`, in the order they were added
+INFO_TABLES = ('listing_agents', 'properties', 'scrape_results', 'latest_snapshots', 'scrape_schedule', 'scrape_jobs',
+               'compacted_days')
+
+
+def main(argv=None, prog=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=prog, description='Inspect and maintain the listings database.')
+    parser.add_argument('--db',
+                        type=str,
+                        default=DEFAULT_DB_PATH,
+                        help=f'SQLite database to use. Defaults to "{DEFAULT_DB_PATH}".')
+    zillow_logging.add_arguments(parser)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('info', help='Show the schema version, row counts and the latest scrape.')
+    commands.add_parser('migrate', help='Apply any pending schema migrations.')
+    commands.add_parser('movers', add_help=False,
+                        help='Trends and top movers; the remaining options go to zillow_analytics.')
+    args, rest = parser.parse_known_args(argv)
+    zillow_logging.from_arguments(args)
+
+    if args.command == 'movers':
+        # pandas is only imported for this one
+        import zillow_analytics
+        zillow_analytics.main(['--db', args.db, *rest], prog=f"{parser.prog} movers")
+        return
+    if rest:
+        parser.error(f"unrecognized arguments: {' '.join(rest)}")
+
+    with ZillowRepository(args.db) as repository:
+        with repository.connection() as conn:
+            version = get_schema_version(conn)
+            if args.command == 'migrate':
+                print(f"{args.db} is at schema version {version}.")
+                return
+            print(f"Database: {args.db}")
+            print(f"  - Schema version: {version}")
+            for table in INFO_TABLES:
+                count = conn.execute(f"SELECT COUNT(*) FROM {table};").fetchone()[0]
+                print(f"  - {table}: {count:,} rows")
+            latest = conn.execute("SELECT MAX(scrape_date) FROM latest_snapshots;").fetchone()[0]
+            print(f"  - Latest scrape: {latest or 'never'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import json
+import os
+import re
+import zillow_property_manager as property_manager
+import zillow_db
+import zillow_trace as trace
+import zillow_logging
+
+log = zillow_logging.get_logger(__name__)
+
+LISTINGS_JSONL_FILE = 'listings.jsonl'
+LISTINGS_PARQUET_FILE = 'listings.parquet'
+
+# Record fields and their types. Nested MLS data and facts are kept as objects
+# in the JSON Lines file and stored as JSON strings in Parquet.
+RECORD_FIELDS = (
+    ('file_name', 'string'),
+    ('property_name', 'string'),
+    ('property_id', 'string'),
+    ('listing_url', 'string'),
+    ('scrape_date', 'string'),
+    ('address', 'string'),
+    ('formatted_address', 'string'),
+    ('price', 'int'),
+    ('beds', 'float'),
+    ('baths', 'float'),
+    ('sqft', 'int'),
+    ('days_on_zillow', 'int'),
+    ('views', 'int'),
+    ('saves', 'int'),
+    ('mls_id', 'string'),
+    ('mls_data', 'json'),
+    ('facts', 'json'),
+    ('description', 'string'),
+    ('image_url', 'string'),
+)
+
+
+def parse_number(text, cast=int):
+    """
+    Converts a displayed figure such as '$450,000', '1,234' or '2.5' to a number.
+
+    Args:
+        text (str): The text to convert; may be None.
+        cast (type): int or float.
+
+    Returns:
+        The number, or None if the text holds no number (e.g. '--').
+    """
+    if text is None:
+        return None
+    if isinstance(text, (int, float)):
+        return cast(text)
+    match = re.search(r'\d[\d,]*(?:\.\d+)?', str(text))
+    if not match:
+        return None
+    value = float(match.group(0).replace(',', ''))
+    return cast(value)
+
+
+def listing_record(file_name, property_name, mtime, stats, details, mls_data, facts, description,
+                   image_url, listing_url, formatted_address):
+    """
+    Builds the structured record for one parsed listing.
+
+    Args:
+        file_name (str): The .zlw file name.
+        property_name (str): The property name from the file name.
+        mtime (float): The file's modification time; used as the scrape date.
+        stats (dict): Parsed stats, or None.
+        details (dict): Parsed price/address/beds/baths/sqft, or None.
+        mls_data (dict): Parsed MLS data.
+        facts (dict): Parsed facts and features.
+        description (str): The listing description, or None.
+        image_url (str): The main image URL, or None.
+        listing_url (str): The canonical listing URL, or None.
+        formatted_address (str): The geocoded address, or None.
+
+    Returns:
+        dict: The record, with the fields in RECORD_FIELDS.
+    """
+    stats = stats or {}
+    details = details or {}
+    mls_data = mls_data or {}
+    return {
+        'file_name': file_name,
+        'property_name': property_name,
+        'property_id': property_manager.get_property_id_from_url(listing_url) if listing_url else None,
+        'listing_url': listing_url,
+        'scrape_date': zillow_db.scrape_timestamp(mtime),
+        'address': details.get('address'),
+        'formatted_address': formatted_address,
+        'price': parse_number(details.get('price')),
+        'beds': parse_number(details.get('beds'), float),
+        'baths': parse_number(details.get('baths'), float),
+        'sqft': parse_number(details.get('sqft')),
+        'days_on_zillow': stats.get('days_on_zillow'),
+        'views': stats.get('views'),
+        'saves': stats.get('saves'),
+        'mls_id': mls_data.get('MLS#'),
+        'mls_data': mls_data,
+        'facts': facts or {},
+        'description': description,
+        'image_url': image_url,
+    }
+
+
+class ListingExporter:
+    """
+    Keeps a JSON Lines file with one record per formatted listing and,
+    optionally, a Parquet copy with typed columns.
+
+    Records already in the file are loaded first, so a run that only
+    reformats changed scrapes still writes the complete set. The files are
+    rewritten atomically, in file name order, when the exporter is closed.
+
+    Args:
+        jsonl_path (str): The JSON Lines file.
+        parquet_path (str, optional): Also write a Parquet file here.
+            Requires pyarrow.
+    """
+
+    def __init__(self, jsonl_path, parquet_path=None):
+        if parquet_path:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ImportError("Parquet export requires pyarrow (pip install pyarrow).") from None
+        self.jsonl_path = str(jsonl_path)
+        self.parquet_path = str(parquet_path) if parquet_path else None
+        self.records = self._load()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _load(self):
+        records = {}
+        try:
+            with open(self.jsonl_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        records[record['file_name']] = record
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            log.warning("Ignoring unreadable export %s: %s", self.jsonl_path, e)
+            records = {}
+        return records
+
+    def has(self, file_name):
+        return file_name in self.records
+
+    def add(self, record):
+        self.records[record['file_name']] = record
+
+    def retain(self, file_names):
+        """Drops records whose .zlw file is no longer in the scrapes folder."""
+        keep = set(file_names)
+        self.records = {name: record for name, record in self.records.items() if name in keep}
+
+    def close(self):
+        records = [self.records[name] for name in sorted(self.records)]
+        with trace.span('export.write', records=len(records)):
+            self._write_jsonl(records)
+            if self.parquet_path:
+                self._write_parquet(records)
+        log.info("Exported %d listings to %s", len(records), self.jsonl_path)
+
+    def _write_jsonl(self, records):
+        temp_path = self.jsonl_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        os.replace(temp_path, self.jsonl_path)
+
+    def _write_parquet(self, records):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        types = {'string': pa.string(), 'int': pa.int64(), 'float': pa.float64(), 'json': pa.string()}
+        schema = pa.schema([(name, types[kind]) for name, kind in RECORD_FIELDS])
+        columns = {}
+        for name, kind in RECORD_FIELDS:
+            values = [record.get(name) for record in records]
+            if kind == 'json':
+                values = [json.dumps(value, ensure_ascii=False) for value in values]
+            columns[name] = values
+        table = pa.Table.from_pydict(columns, schema=schema)
+        temp_path = self.parquet_path + '.tmp'
+        pq.write_table(table, temp_path)
+        os.replace(temp_path, self.parquet_path)
@@ -1,35 +1,39 @@
 #!/usr/bin/env python3
 
 import os
-import sys
 import shutil
-from bs4 import BeautifulSoup
 import re
+import zillow_logging
+
+log = zillow_logging.get_logger(__name__)
 
 def extract_address(html_content):
     """
     Extracts the address text from a div with a class name containing "AddressWrapper".
 
     Args:
-        html_content (str): The raw HTML content of the Zillow page.
+        html_content (str or lxml element): The raw HTML content of the Zillow page.
 
     Returns:
         str: The extracted address text, or None if the element is not found.
     """
+    # lxml is only needed here, not by the file name helpers
+    from zillow_html import make_tree, text_of
+    from zillow_selectors import select_one
     try:
-        # Create a BeautifulSoup object to parse the HTML
-        soup = BeautifulSoup(html_content, 'lxml')
+        # Parse the HTML (or reuse an already parsed tree)
+        tree = make_tree(html_content)
 
-        # Use re.compile to find a class attribute that contains the substring "AddressWrapper"
-        address_div = soup.find('div', class_=re.compile("AddressWrapper"))
+        # Find a div whose class attribute contains the substring "AddressWrapper"
+        address_div = select_one(tree, 'address')
 
         # Check if the element was found and return its text content
-        if address_div:
-            return address_div.get_text(strip=True)
+        if address_div is not None:
+            return text_of(address_div)
         else:
             return None
     except Exception as e:
-        print(f"An error occurred while parsing the address: {e}")
+        log.warning("An error occurred while parsing the address: %s", e)
         return None
 
 
@@ -69,10 +73,11 @@ def rename_files_in_dir(directory):
         directory (str): The path to the directory containing the files.
     """
     if not os.path.isdir(directory):
-        print(f"Error: Directory not found at {directory}")
+        log.error("Directory not found at %s", directory)
         return
+    from zillow_html import read_subtrees, ADDRESS_SUBTREES
 
-    print(f"Processing files in directory: {directory}")
+    log.info("Processing files in directory: %s", directory)
 
     # Walk through the directory to find all files
     for root, _, files in os.walk(directory):
@@ -82,9 +87,8 @@ def rename_files_in_dir(directory):
             if has_extension(full_path):
                 continue
             try:
-                # Read the file content
-                with open(full_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
+                # Stream the file, keeping only the address element
+                content = read_subtrees(full_path, ADDRESS_SUBTREES)
                 
                 # Extract and sanitize the address
                 address = extract_address(content)
@@ -102,14 +106,14 @@ def rename_files_in_dir(directory):
 
                     # Rename the file
                     os.rename(full_path, new_full_path)
-                    print(f"Renamed '{filename}' to '{new_filename}'")
+                    log.debug("Renamed '%s' to '%s'", filename, new_filename)
                 else:
-                    print(f"Could not find a valid address in '{filename}'. Skipping rename.")
+                    log.warning("Could not find a valid address in '%s'. Skipping rename.", filename)
             
             except UnicodeDecodeError:
-                print(f"Skipping '{filename}' due to a UnicodeDecodeError. Please ensure file is UTF-8 encoded.")
+                log.warning("Skipping '%s' due to a UnicodeDecodeError. Please ensure file is UTF-8 encoded.", filename)
             except Exception as e:
-                print(f"An unexpected error occurred with file '{filename}': {e}")
+                log.exception("An unexpected error occurred with file '%s': %s", filename, e)
 
 
 def has_extension(filename):
@@ -148,20 +152,32 @@ def save_file_lines(lines, output_filename):
         with open(output_filename, 'w', encoding='utf-8') as f:
             for line in lines:
                 f.write(line + '\n')
-        print(f"Saved output to {output_filename}")
+        log.debug("Saved output to %s", output_filename)
     except IOError as e:
-        print(f"Error writing to file {output_filename}: {e}")
+        log.error("Error writing to file %s: %s", output_filename, e)
+
+
+
+def main(argv=None, prog=None):
+    import argparse
+
+    # Get the directory of the script
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    default_directory = os.path.join(script_dir, 'page_scrapes')
+
+    parser = argparse.ArgumentParser(prog=prog, description='Rename raw page scrapes after the address on the page.')
+    # If the user provides a directory, use it.
+    # Otherwise, use the page_scrapes next to this script.
+    parser.add_argument('directory',
+                        nargs='?',
+                        default=default_directory,
+                        help=f'Folder of page scrapes without an extension. Defaults to "{default_directory}".')
+    zillow_logging.add_arguments(parser)
+    args = parser.parse_args(argv)
+    zillow_logging.from_arguments(args)
+
+    rename_files_in_dir(args.directory)
 
-        
 
 if __name__ == "__main__":
-    # If the user provides a directory, use it. 
-    # Otherwise, use the page_scrapes under current directory.
-    if len(sys.argv) > 1:
-        dir_to_process = sys.argv[1]
-    else:
-        # Get the directory of the script
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        dir_to_process = os.path.join(script_dir, 'page_scrapes')
-
-    rename_files_in_dir(dir_to_process)
+    main()
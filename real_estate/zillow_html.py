@@ -0,0 +1,115 @@
+import codecs
+from lxml import etree
+import zillow_selectors as selectors
+
+
+def make_tree(html_content):
+    """
+    Returns an lxml tree for the given HTML.
+
+    Extractors call this instead of building their own tree, so a caller that
+    already parsed the page can pass the tree in and skip a second parse.
+
+    Args:
+        html_content (str or lxml element): Raw HTML, or an already parsed tree.
+
+    Returns:
+        lxml element: The root of the parsed tree (the input itself if it was
+        already parsed).
+    """
+    if isinstance(html_content, etree._Element):
+        return html_content
+    root = etree.fromstring(html_content, etree.HTMLParser()) if html_content.strip() else None
+    return root if root is not None else etree.Element('html')
+
+
+def text_of(element, separator=''):
+    """
+    Returns the text inside an element with each piece stripped and empty
+    pieces dropped, like BeautifulSoup's get_text(separator, strip=True).
+    """
+    return separator.join(text.strip() for text in element.xpath('.//text()') if text.strip())
+
+
+# Subtrees kept when a saved page is streamed, as zillow_selectors page
+# fields. Everything outside these subtrees is discarded while the file is read.
+LISTING_SUBTREES = ('stats', 'details', 'description', 'facts', 'mls', 'media_tile',
+                    'canonical_link', 'og_url', 'zpid_link')
+GALLERY_SUBTREES = ('gallery_source', 'gallery_address')
+ADDRESS_SUBTREES = ('address',)
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def iter_subtrees(file_path, subtrees, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Streams a saved page through lxml's incremental HTML parser and yields
+    each element matching one of the page fields, serialized as HTML.
+
+    Elements outside the matched subtrees are cleared as soon as they close,
+    so the tree never holds more than the kept subtrees and the path to the
+    element being parsed. (libxml2 still buffers the raw input, so peak memory
+    is about the file size, not the many times that a full DOM costs.)
+
+    Args:
+        file_path (str or Path): The saved page; read as UTF-8.
+        subtrees (tuple): zillow_selectors page fields, e.g. LISTING_SUBTREES.
+        chunk_size (int): Characters fed to the parser at a time.
+
+    Yields:
+        str: The HTML of each matching subtree, in document order.
+
+    Raises:
+        UnicodeDecodeError: If the file isn't valid UTF-8.
+    """
+    parser = etree.HTMLPullParser(events=('start', 'end'))
+    capturing = None
+
+    def drain():
+        nonlocal capturing
+        for event, element in parser.read_events():
+            if not isinstance(element.tag, str):
+                continue
+            if event == 'start':
+                if capturing is None and selectors.is_match(element, subtrees):
+                    capturing = element
+                continue
+            if element is capturing:
+                capturing = None
+                yield etree.tostring(element, method='html', encoding='unicode', with_tail=False)
+            elif capturing is not None:
+                continue
+            # Outside any kept subtree: drop this element's content and the
+            # siblings already finished before it.
+            element.clear(keep_tail=False)
+            parent = element.getparent()
+            while parent is not None and element.getprevious() is not None:
+                del parent[0]
+
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            parser.feed(decoder.decode(chunk))
+            yield from drain()
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        parser.feed(tail)
+    parser.close()
+    yield from drain()
+
+
+def read_subtrees(file_path, subtrees, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Streams a saved page and returns a small tree holding only the matching
+    subtrees. The extractors work on it exactly as on a full parse.
+
+    Args:
+        file_path (str or Path): The saved page.
+        subtrees (tuple): zillow_selectors page fields, e.g. LISTING_SUBTREES.
+        chunk_size (int): Characters fed to the parser at a time.
+
+    Returns:
+        lxml element: The root of a tree of the kept subtrees.
+    """
+    fragments = ''.join(iter_subtrees(file_path, subtrees, chunk_size))
+    return make_tree(f'<html><body>{fragments}</body></html>')
@@ -0,0 +1,175 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from requests.adapters import HTTPAdapter
+import zillow_logging
+
+log = zillow_logging.get_logger(__name__)
+
+# Gallery downloads: how many images are fetched at once, how many times a
+# failed download is retried (with exponential backoff starting at
+# DEFAULT_BACKOFF seconds), and how much of a body is held in memory at a time.
+DEFAULT_WORKERS = 8
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+CHUNK_SIZE = 64 * 1024
+# (connect, read) timeouts in seconds
+REQUEST_TIMEOUT = (10, 60)
+
+# Suffix for a download in progress; it is renamed into place once complete,
+# so a file without the suffix is always a finished image.
+PARTIAL_SUFFIX = '.part'
+
+
+class DownloadSummary:
+    """Counts what a batch of downloads did."""
+
+    def __init__(self):
+        self.downloaded = 0
+        self.resumed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes = 0
+        self.failures = []
+        self._lock = threading.Lock()
+
+    def record(self, status, url, size=0, error=None):
+        with self._lock:
+            if status == 'downloaded':
+                self.downloaded += 1
+            elif status == 'resumed':
+                self.resumed += 1
+            elif status == 'skipped':
+                self.skipped += 1
+            else:
+                self.failed += 1
+                self.failures.append((url, error))
+            self.bytes += size
+
+    @property
+    def total(self):
+        return self.downloaded + self.resumed + self.skipped + self.failed
+
+    def log_summary(self):
+        """Logs the counts as one INFO record."""
+        lines = ["-- Image downloads --",
+                 f"  - Downloaded: {self.downloaded}",
+                 f"  - Resumed: {self.resumed}",
+                 f"  - Skipped (already complete): {self.skipped}",
+                 f"  - Failed: {self.failed}",
+                 f"  - Bytes transferred: {self.bytes:,}"]
+        lines.extend(f"      {url}: {error}" for url, error in self.failures)
+        log.info("%s", "\n".join(lines), extra={'downloaded': self.downloaded, 'resumed': self.resumed,
+                                                 'skipped': self.skipped, 'failed': self.failed,
+                                                 'bytes_transferred': self.bytes})
+
+
+class ImageDownloader:
+    """
+    Downloads images over a shared, pooled HTTP session.
+
+    Each image is streamed to disk in chunks under a '.part' name and renamed
+    into place when complete. Finished files are skipped, and an interrupted
+    '.part' file is resumed with an HTTP Range request. Failed downloads are
+    retried with exponential backoff; 4xx responses other than 429 are not
+    retried.
+
+    Args:
+        workers (int): Maximum number of concurrent downloads.
+        retries (int): Retries per image after the first attempt.
+        backoff (float): Initial retry delay in seconds; doubles each retry.
+        session (requests.Session, optional): Session to use instead of a new one.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, session=None):
+        self.workers = max(1, workers)
+        self.retries = retries
+        self.backoff = backoff
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.workers)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
+
+    def download(self, image_url, save_path, summary=None):
+        """
+        Downloads one image, resuming or skipping as appropriate.
+
+        Args:
+            image_url (str): The URL of the image to download.
+            save_path (str): The file path where the image will be saved.
+            summary (DownloadSummary, optional): Where to record the outcome.
+
+        Returns:
+            str: 'downloaded', 'resumed', 'skipped' or 'failed'.
+        """
+        summary = summary if summary is not None else DownloadSummary()
+        if os.path.exists(save_path):
+            summary.record('skipped', image_url)
+            return 'skipped'
+
+        partial_path = save_path + PARTIAL_SUFFIX
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                status, size = self._fetch(image_url, partial_path)
+                os.replace(partial_path, save_path)
+                summary.record(status, image_url, size)
+                return status
+            except requests.exceptions.HTTPError as e:
+                error = e
+                code = e.response.status_code if e.response is not None else None
+                if code is not None and 400 <= code < 500 and code != 429:
+                    break
+            except (requests.exceptions.RequestException, OSError) as e:
+                error = e
+
+        log.error("Failed to download %s: %s", image_url, error)
+        summary.record('failed', image_url, error=str(error))
+        return 'failed'
+
+    def _fetch(self, image_url, partial_path):
+        offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        with self.session.get(image_url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as response:
+            if offset and response.status_code == 416:
+                # The partial file already holds the whole image
+                return 'resumed', 0
+            response.raise_for_status()
+            resuming = offset and response.status_code == 206
+            size = 0
+            with open(partial_path, 'ab' if resuming else 'wb') as file:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    file.write(chunk)
+                    size += len(chunk)
+        return ('resumed' if resuming else 'downloaded'), size
+
+    def download_all(self, jobs, summary=None):
+        """
+        Downloads many images concurrently.
+
+        Args:
+            jobs (list): Tuples of (image_url, save_path).
+            summary (DownloadSummary, optional): Add the outcomes to this
+                summary instead of a new one.
+
+        Returns:
+            DownloadSummary: What was downloaded, resumed, skipped and failed.
+        """
+        summary = summary if summary is not None else DownloadSummary()
+        jobs = list(jobs)
+        if not jobs:
+            return summary
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(jobs))) as executor:
+            futures = {executor.submit(self.download, url, path, summary): path for url, path in jobs}
+            for done, future in enumerate(as_completed(futures), start=1):
+                log.debug("[%d/%d] %s: %s", done, len(jobs), future.result(), futures[future])
+        return summary
+
+    def close(self):
+        self.session.close()
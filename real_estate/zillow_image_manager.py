@@ -1,63 +1,57 @@
 import argparse
-from bs4 import BeautifulSoup
 import real_estate_config as config
 import zillow_file_manager as file_manager
+from zillow_html import make_tree, text_of, read_subtrees, GALLERY_SUBTREES
+from zillow_selectors import select_all, select_one
+import zillow_logging
 import os
 
-# --- Mandatory first step for any script in this project ---
-# Call the function to ensure configurations are loaded.
-# This makes the dependency explicit.
-config.ensure_config()
+log = zillow_logging.get_logger(__name__)
 
 def extract_image_src(html_content):
     """
     Extracts the image source URL from the provided HTML snippet.
     
     Args:
-        html_content (str): A string containing the HTML to parse.
+        html_content (str or lxml element): A string containing the HTML to parse.
         
     Returns:
         str: The URL of the image, or None if not found.
     """
-    soup = BeautifulSoup(html_content, 'lxml')
+    tree = make_tree(html_content)
     
     # Find the <li> tag with the specific class
-    list_item = soup.find('li', class_='media-stream-tile')
+    list_item = select_one(tree, 'media_tile')
     
-    if list_item:
+    if list_item is not None:
         # Inside the <li>, find the <img> tag
-        img_tag = list_item.find('img')
+        img_tag = select_one(list_item, 'media_tile.image')
         
-        if img_tag:
+        if img_tag is not None:
             # Get the value of the 'src' attribute
             return img_tag.get('src')
             
     return None
 
-# class_=lambda c: c and 'StyledTextButton' in c: 
-# This is a powerful feature of BeautifulSoup. 
-# Instead of a simple string, you can pass a function to the class_ argument.
-# lambda c: creates an anonymous function that takes one argument, c (which represents each class string it encounters).
-# c and 'StyledTextButton' in c: 
-# This condition checks if the class string c is not empty # and if it contains the substring 'StyledTextButton'.
+# The 'gallery_address' selector matches a button whose class contains 'StyledTextButton'.
 # This approach ensures that even if the unique random characters change, as long as the core class name remains constant, 
 # your code will correctly identify the target element. It's a much more stable and generalized solution for dealing 
 # with this type of HTML structure. 
 def extract_address_from_html(html_content):
-    # Create a BeautifulSoup object
-    soup = BeautifulSoup(html_content, 'lxml')
+    # Parse the HTML (or reuse an already parsed tree)
+    tree = make_tree(html_content)
 
     # Find the button element by checking if its class contains the "StyledTextButton" substring
-    address_button = soup.find('button', class_=lambda c: c and 'StyledTextButton' in c)
+    address_button = select_one(tree, 'gallery_address')
 
     # Check if the element was found and extract the text
-    if address_button:
-        address_text = address_button.get_text(strip=True, separator=' ')
+    if address_button is not None:
+        address_text = text_of(address_button, ' ')
         address_filename = file_manager.sanitize_filename(address_text)
-        print(address_filename)
+        log.debug("Gallery address: %s", address_filename)
         return address_filename
     else:
-        print("Address element not found.")
+        log.warning("Address element not found.")
     return None
 
 
@@ -92,11 +86,11 @@ def get_largest_imageURL_from_srcset(srcset_string):
     return largest_url
 
 def extract_images_from_gallery(html_content):
-    # Parse the HTML using BeautifulSoup with the lxml parser
-    soup = BeautifulSoup(html_content, 'lxml')
+    # Parse the HTML with lxml (or reuse an already parsed tree)
+    tree = make_tree(html_content)
 
     # Find all <source> tags with the type attribute set to "image/jpeg"
-    source_tags = soup.find_all('source', {'type': 'image/jpeg'})
+    source_tags = select_all(tree, 'gallery_source')
 
     # List to store the largest image URL for each srcset
     largest_urls = []
@@ -113,6 +107,16 @@ def extract_images_from_gallery(html_content):
     # print(largest_urls)
     return largest_urls
 
+_downloader = None
+
+def get_downloader():
+    """Returns the shared ImageDownloader, so single downloads reuse its pooled session."""
+    global _downloader
+    if _downloader is None:
+        from zillow_image_downloader import ImageDownloader
+        _downloader = ImageDownloader()
+    return _downloader
+
 def download_image(image_url, save_path):
     """
     Downloads an image from the specified URL and saves it to the given path.
@@ -121,70 +125,94 @@ def download_image(image_url, save_path):
         image_url (str): The URL of the image to download.
         save_path (str): The file path where the image will be saved.
     """
-    import requests
-    
-    response = requests.get(image_url)
-    
-    if response.status_code == 200:
-        with open(save_path, 'wb') as file:
-            file.write(response.content)
-        print(f"Image successfully downloaded: {save_path}")
-    else:
-        print(f"Failed to retrieve image. Status code: {response.status_code}")
+    status = get_downloader().download(image_url, save_path)
+    if status == 'skipped':
+        log.debug("Image already downloaded: %s", save_path)
+    elif status != 'failed':
+        log.info("Image successfully %s: %s", status, save_path)
 
-def process_image_gallery_files(scrapes_dir=config.scrapes_dir, 
+def process_image_gallery_files(scrapes_dir=None, 
                                 download=False, 
-                                output_dir=config.output_folder):
+                                output_dir=None,
+                                workers=None):
     """
     Processes all image gallery HTML snippets in the folder to extract and optionally download images.
     
     Args:
-        scrapes_dir (str): The folder with HTML scrapes of the image galleries.
+        scrapes_dir (str, optional): The folder with HTML scrapes of the image
+            galleries. Defaults to the configured page_scrapes folder.
         download (bool): Whether to download the images.
-        output_dir (str): The directory to save downloaded images if download is True.
+        output_dir (str, optional): The directory to save downloaded images if
+            download is True. Defaults to the configured output folder.
+        workers (int, optional): Maximum concurrent downloads. Defaults to
+            zillow_image_downloader.DEFAULT_WORKERS.
+
+    Downloaded images go into a content-addressed ImageStore under output_dir:
+    each distinct photo is fetched and stored once, and every listing folder
+    holds hard links to it plus a manifest.json. A zillow_galleries.list of
+    all listings is written to output_dir.
     """
+    folders = config.get_config().folders
+    scrapes_dir = scrapes_dir or folders.page_scrapes
+    output_dir = output_dir or folders.output
     addresses_processed = set() # To track processed addresses and avoid duplicates
+    galleries = [] # (address folder, image urls), downloaded together at the end
 
-    if not os.path.exists(scrapes_dir):
-        print(f"Scrapes directory does not exist: {scrapes_dir}")
+    if not scrapes_dir or not os.path.exists(scrapes_dir):
+        log.error("Scrapes directory does not exist: %s", scrapes_dir)
         return None
     
     html_files = [filepath for filepath in os.listdir(scrapes_dir)]
     for filename in html_files:
-        with open(os.path.join(scrapes_dir, filename), 'r') as file:
-            html_content = file.read()
-            image_urls = extract_images_from_gallery(html_content)  
-            address_filename = extract_address_from_html(html_content)
-            addresses_processed.add(address_filename if address_filename else "unknown_property")
+        # Stream the file, keeping only the gallery <source> tags and the address button
+        html_content = read_subtrees(os.path.join(scrapes_dir, filename), GALLERY_SUBTREES)
+        image_urls = extract_images_from_gallery(html_content)  
+        address_filename = extract_address_from_html(html_content)
+        addresses_processed.add(address_filename if address_filename else "unknown_property")
 
         if download and output_dir:
-            images_folder = os.path.join(output_dir, address_filename if address_filename else "unknown_property")
-            if not os.path.exists(images_folder):
-                os.makedirs(images_folder)
-            
-            for idx, url in enumerate(image_urls):
-                file_extension = os.path.splitext(url)[1]
-                save_path = os.path.join(images_folder, f"image_{idx + 1}{file_extension}")
-                download_image(url, save_path)
-                print(f"Downloaded image to: {save_path}")
+            galleries.append((address_filename if address_filename else "unknown_property", image_urls))
         
-        print(f"Extracted Image URLs: \n{'\n'.join(image_urls)}\n")
-
-    print("Processing completed.")
+        log.debug("Extracted Image URLs:\n%s", '\n'.join(image_urls))
+
+    if galleries:
+        from zillow_image_downloader import ImageDownloader, DownloadSummary, DEFAULT_WORKERS
+        from zillow_image_store import ImageStore
+        downloader = ImageDownloader(workers=workers or DEFAULT_WORKERS)
+        summary = DownloadSummary()
+        try:
+            with ImageStore(output_dir) as store:
+                for address, image_urls in galleries:
+                    store.store_gallery(address, image_urls, downloader, summary)
+                log.info("Gallery list written to: %s", store.write_galleries_list())
+        finally:
+            downloader.close()
+        summary.log_summary()
+
+    log.info("Processing completed.")
     return list(addresses_processed)
 
 
-# --- Example Usage ---
-if __name__ == "__main__":
-
-    parser = argparse.ArgumentParser(description="Extract and download images from HTML snippets.")
-    parser.add_argument('--scraped_files_dir', default= os.getenv('RE_DEFAULT_FOLDER_IMAGE_SCRAPES'),type=str, help='Dir with html content to parse for images extraction.')
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Extract and download images from HTML snippets.")
+    parser.add_argument('--scraped_files_dir', type=str, help='Dir with html content to parse for images extraction. Defaults to the configured image_scrapes folder.')
     parser.add_argument('--download', action='store_true', help='Flag to download the extracted image.')
-    parser.add_argument('--output', default= os.getenv('RE_DEFAULT_FOLDER_TEST'), type=str, help='Output path to save the downloaded image.')
+    parser.add_argument('--output', type=str, help='Output path to save the downloaded image. Defaults to the configured test folder.')
+    parser.add_argument('--workers', type=int, default=None, help='Maximum number of images to download at once.')
+    config.add_arguments(parser)
+    zillow_logging.add_arguments(parser)
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    folders = config.from_arguments(args).folders
+    zillow_logging.from_arguments(args)
     
-    addresses_processed = process_image_gallery_files(args.scraped_files_dir, args.download, args.output)
+    addresses_processed = process_image_gallery_files(args.scraped_files_dir or folders.image_scrapes, args.download,
+                                                      args.output or folders.test, args.workers)
     print (f"images downloaded: {args.download}")
-    print(f"process_image_gallery_files processed: \n{'\n'.join(addresses_processed)}")
+    print(f"process_image_gallery_files processed: \n{'\n'.join(addresses_processed or [])}")
+
+
+# --- Example Usage ---
+if __name__ == "__main__":
+    main()
 
@@ -0,0 +1,249 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+
+# Zillow photo URLs carry a content hash and the rendition (size) served:
+# .../fp/<hash>-cc_ft_1536.jpg. One photo comes in several renditions.
+PHOTO_HASH_REGEX = re.compile(r'/fp/([0-9a-fA-F]{16,})-([^/.?]*)')
+
+OBJECTS_FOLDER = '.objects'
+INDEX_FILE = 'index.db'
+MANIFEST_FILE = 'manifest.json'
+GALLERIES_LIST_FILE = 'zillow_galleries.list'
+
+
+def photo_key_from_url(url):
+    """
+    Identifies the photo and rendition a Zillow image URL points to, e.g.
+    ('4f76...0e83', 'cc_ft_1536'). Renditions of one photo are different
+    images, so they are stored and looked up separately.
+
+    Args:
+        url (str): The image URL.
+
+    Returns:
+        tuple: (photo_hash, variant), or None if the URL has no photo hash.
+    """
+    match = PHOTO_HASH_REGEX.search(url)
+    return (match.group(1).lower(), match.group(2)) if match else None
+
+
+def sha256_of_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImageStore:
+    """
+    Content-addressed image archive shared by every listing.
+
+    Each distinct image is stored once under `<root>/.objects/`, named by the
+    SHA-256 of its bytes. An index maps Zillow photo hashes (from the URL) to
+    stored objects, one per rendition (cc_ft_768, cc_ft_1536, ...), so a
+    photo already seen at that size on any listing is never downloaded again. Listing folders (`<root>/<address>/image_N.jpg`) hold
+    hard links to the objects rather than copies, plus a manifest.json
+    describing where each image came from.
+
+    Args:
+        root (str): The gallery output folder.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.objects_dir = os.path.join(root, OBJECTS_FOLDER)
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(self.objects_dir, INDEX_FILE))
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS objects (
+            sha256 TEXT PRIMARY KEY,
+            extension TEXT NOT NULL,
+            size INTEGER NOT NULL
+        );
+        """)
+        self._create_photos_table()
+        self.conn.commit()
+
+    def _create_photos_table(self):
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(photos);")]
+        if columns and 'variant' not in columns:
+            # Indexes from before renditions were told apart: rekey each
+            # photo by the rendition its URL names
+            self.conn.execute("ALTER TABLE photos RENAME TO photos_by_hash;")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS photos (
+            photo_hash TEXT NOT NULL,
+            variant TEXT NOT NULL,
+            sha256 TEXT NOT NULL REFERENCES objects (sha256),
+            url TEXT NOT NULL,
+            PRIMARY KEY (photo_hash, variant)
+        );
+        """)
+        if columns and 'variant' not in columns:
+            rows = self.conn.execute("SELECT sha256, url FROM photos_by_hash;").fetchall()
+            self.conn.executemany("INSERT OR REPLACE INTO photos (photo_hash, variant, sha256, url) VALUES (?, ?, ?, ?);",
+                                  [(*photo_key_from_url(url), sha256, url) for sha256, url in rows
+                                   if photo_key_from_url(url)])
+            self.conn.execute("DROP TABLE photos_by_hash;")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def object_path(self, sha256, extension):
+        return os.path.join(self.objects_dir, sha256[:2], sha256 + extension)
+
+    def lookup(self, url):
+        """
+        Finds a stored object for an image URL by its Zillow photo hash and
+        rendition.
+
+        Returns:
+            tuple: (sha256, object_path), or None if the photo isn't stored.
+        """
+        photo_key = photo_key_from_url(url)
+        if not photo_key:
+            return None
+        row = self.conn.execute("""
+        SELECT o.sha256, o.extension FROM photos p JOIN objects o ON o.sha256 = p.sha256
+        WHERE p.photo_hash = ? AND p.variant = ?;
+        """, photo_key).fetchone()
+        if row is None:
+            return None
+        path = self.object_path(*row)
+        return (row[0], path) if os.path.exists(path) else None
+
+    def add_file(self, path, url):
+        """
+        Moves a downloaded file into the store, deduplicating by content.
+
+        Args:
+            path (str): The downloaded file; it is moved or deleted.
+            url (str): The URL it was downloaded from.
+
+        Returns:
+            tuple: (sha256, object_path) of the stored object.
+        """
+        sha256 = sha256_of_file(path)
+        extension = os.path.splitext(url)[1] or os.path.splitext(path)[1]
+        row = self.conn.execute("SELECT extension FROM objects WHERE sha256 = ?;", (sha256,)).fetchone()
+        if row is not None and os.path.exists(self.object_path(sha256, row[0])):
+            # Same bytes are already stored under another URL
+            os.remove(path)
+            extension = row[0]
+        else:
+            object_path = self.object_path(sha256, extension)
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            os.replace(path, object_path)
+            self.conn.execute("INSERT OR REPLACE INTO objects (sha256, extension, size) VALUES (?, ?, ?);",
+                              (sha256, extension, os.path.getsize(object_path)))
+        photo_key = photo_key_from_url(url)
+        if photo_key:
+            self.conn.execute("INSERT OR REPLACE INTO photos (photo_hash, variant, sha256, url) VALUES (?, ?, ?, ?);",
+                              (*photo_key, sha256, url))
+        self.conn.commit()
+        return sha256, self.object_path(sha256, extension)
+
+    def link(self, object_path, dest_path):
+        """Hard-links a stored object into a listing folder, copying if linking isn't possible."""
+        if os.path.exists(dest_path):
+            if os.path.samefile(object_path, dest_path):
+                return
+            os.remove(dest_path)
+        try:
+            os.link(object_path, dest_path)
+        except OSError:
+            shutil.copy2(object_path, dest_path)
+
+    def store_gallery(self, address, image_urls, downloader, summary=None):
+        """
+        Places a listing's images in `<root>/<address>/`, downloading only
+        photos the store doesn't already hold.
+
+        Args:
+            address (str): The sanitized listing address (folder name).
+            image_urls (list): The gallery image URLs, in display order.
+            downloader (ImageDownloader): Used for the missing images.
+            summary (DownloadSummary, optional): Accumulates download outcomes
+                across galleries.
+
+        Returns:
+            DownloadSummary: The outcome of the downloads that were needed.
+        """
+        listing_dir = os.path.join(self.root, address)
+        incoming_dir = os.path.join(self.objects_dir, 'incoming')
+        os.makedirs(listing_dir, exist_ok=True)
+        os.makedirs(incoming_dir, exist_ok=True)
+
+        located = {}
+        missing = {}
+        for idx, url in enumerate(image_urls):
+            found = self.lookup(url)
+            if found:
+                located[idx] = found
+            else:
+                photo_key = photo_key_from_url(url)
+                name = '-'.join(photo_key) if photo_key else hashlib.sha1(url.encode('utf-8')).hexdigest()
+                missing[idx] = os.path.join(incoming_dir, name + os.path.splitext(url)[1])
+
+        jobs = {path: image_urls[idx] for idx, path in missing.items()}
+        summary = downloader.download_all([(url, path) for path, url in jobs.items()], summary)
+        stored = {}
+        for path, url in jobs.items():
+            if os.path.exists(path):
+                stored[path] = self.add_file(path, url)
+        for idx, path in missing.items():
+            if path in stored:
+                located[idx] = stored[path]
+
+        entries = []
+        for idx, url in enumerate(image_urls):
+            if idx not in located:
+                continue
+            sha256, object_path = located[idx]
+            filename = f"image_{idx + 1}{os.path.splitext(object_path)[1]}"
+            self.link(object_path, os.path.join(listing_dir, filename))
+            photo_key = photo_key_from_url(url) or (None, None)
+            entries.append({'file': filename, 'url': url, 'photo_hash': photo_key[0], 'variant': photo_key[1],
+                            'sha256': sha256})
+
+        # 'urls' is the whole gallery, including images that failed to download
+        with open(os.path.join(listing_dir, MANIFEST_FILE), 'w', encoding='utf-8') as file:
+            json.dump({'address': address, 'urls': list(image_urls), 'images': entries}, file, indent=2)
+        return summary
+
+    def write_galleries_list(self, path=None):
+        """
+        Writes a zillow_galleries.list of every listing folder: the address,
+        then its gallery image URLs one per line, then a blank line.
+
+        Args:
+            path (str, optional): Defaults to `<root>/zillow_galleries.list`.
+
+        Returns:
+            str: The path written.
+        """
+        path = path or os.path.join(self.root, GALLERIES_LIST_FILE)
+        lines = []
+        for name in sorted(os.listdir(self.root)):
+            manifest_path = os.path.join(self.root, name, MANIFEST_FILE)
+            if not os.path.isfile(manifest_path):
+                continue
+            with open(manifest_path, 'r', encoding='utf-8') as file:
+                manifest = json.load(file)
+            urls = manifest.get('urls') or [image['url'] for image in manifest.get('images', [])]
+            lines += [manifest.get('address', name), "Extracted Image URLs: ", *urls, '']
+        with open(path, 'w', encoding='utf-8') as file:
+            for line in lines:
+                file.write(line + '\n')
+        return path
@@ -0,0 +1,217 @@
+import datetime
+import os
+import zillow_db
+
+# A job is tried at most this many times before it stays failed.
+DEFAULT_MAX_ATTEMPTS = 4
+
+# Retry delays double with every attempt: 2, 4, 8 ... minutes after a
+# failure, 15, 30, 60 ... minutes after a CAPTCHA.
+RETRY_BASE_SECONDS = 120
+CAPTCHA_RETRY_BASE_SECONDS = 15 * 60
+
+SELECT_READY_JOBS_SQL = """
+SELECT job_id, url
+FROM scrape_jobs
+WHERE batch = ? AND state IN ('pending', 'failed', 'captcha') AND attempts < ? AND next_attempt <= ?
+ORDER BY job_id
+LIMIT ?;
+"""
+
+
+def default_batch_name(url_file, day=None):
+    """
+    Names the batch for a URL file: one batch per file per day, so rerunning
+    after a crash resumes it and tomorrow's run starts fresh.
+    """
+    day = day or datetime.date.today()
+    return f"{os.path.abspath(url_file)}@{day.isoformat()}"
+
+
+def retry_delay(state, attempts):
+    """Seconds to wait before retrying a job that ended in `state` on attempt number `attempts`."""
+    base = CAPTCHA_RETRY_BASE_SECONDS if state == 'captcha' else RETRY_BASE_SECONDS
+    return base * 2 ** max(0, attempts - 1)
+
+
+class JobQueue:
+    """
+    The persistent work queue for one batch of listing URLs, kept in the
+    scrape_jobs table so a batch interrupted halfway resumes where it
+    stopped instead of starting over.
+
+    Every URL is a job: pending until claimed, in_flight while being
+    scraped, then done, or failed/captcha with the error and a retry time
+    that backs off exponentially. An attempt is counted when the scraper
+    returns a result for the job, so jobs claimed but never reached (a
+    crash, Ctrl-C, or a batch stopped by a CAPTCHA) don't use up attempts. Jobs that produce a snapshot are completed
+    by ScrapeResultWriter (pass job_id to add()) in the same transaction
+    that stores the snapshot, so a crash before the write leaves the job to
+    be redone and a job is never stored twice.
+
+    Only one run should work on a batch at a time: recover() assumes any
+    job still in flight belongs to a run that died.
+
+    Usage:
+        queue = JobQueue(repository, default_batch_name(url_file))
+        queue.enqueue(urls)
+        queue.recover()
+        for job_id, url in queue.claim(10):
+            ...
+
+    Args:
+        repository (ZillowRepository): The database holding the queue.
+        batch (str): The batch name; URLs are unique within a batch.
+        max_attempts (int): Give up on a job after this many tries.
+    """
+
+    def __init__(self, repository, batch, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.repository = repository
+        self.batch = batch
+        self.max_attempts = max(1, max_attempts)
+
+    def enqueue(self, urls):
+        """
+        Adds URLs to the batch as pending jobs; URLs already in it are left alone.
+
+        Returns:
+            int: The number of jobs added.
+        """
+        now = zillow_db.scrape_timestamp()
+        with self.repository.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany("""
+            INSERT OR IGNORE INTO scrape_jobs (batch, url, next_attempt) VALUES (?, ?, ?);
+            """, [(self.batch, url, now) for url in urls])
+            return conn.total_changes - before
+
+    def recover(self):
+        """
+        Returns jobs left in flight by a crashed run to pending.
+
+        Returns:
+            int: The number of jobs recovered.
+        """
+        return self.release()
+
+    def release(self, job_ids=None):
+        """
+        Puts claimed jobs back to pending without counting an attempt, e.g.
+        the rest of a batch stopped by a CAPTCHA.
+
+        Args:
+            job_ids (iterable, optional): The jobs to release. Defaults to
+                every job of the batch that is in flight.
+
+        Returns:
+            int: The number of jobs released.
+        """
+        now = zillow_db.scrape_timestamp()
+        with self.repository.transaction() as conn:
+            if job_ids is None:
+                return conn.execute("""
+                UPDATE scrape_jobs SET state = 'pending', next_attempt = ?
+                WHERE batch = ? AND state = 'in_flight';
+                """, (now, self.batch)).rowcount
+            released = 0
+            for job_id in job_ids:
+                released += conn.execute("""
+                UPDATE scrape_jobs SET state = 'pending', next_attempt = ?
+                WHERE job_id = ? AND state = 'in_flight';
+                """, (now, job_id)).rowcount
+            return released
+
+    def reset(self):
+        """Forgets the batch, so every URL is scraped again."""
+        with self.repository.transaction() as conn:
+            conn.execute("DELETE FROM scrape_jobs WHERE batch = ?;", (self.batch,))
+
+    def claim(self, limit=None):
+        """
+        Takes the jobs that are ready to run and marks them in flight. The
+        attempt is counted when the job fails or completes.
+
+        Args:
+            limit (int, optional): Claim at most this many. Keep it small:
+                what isn't reached before a CAPTCHA has to be released.
+
+        Returns:
+            list: Tuples of (job_id, url), in the order they were enqueued.
+        """
+        now = zillow_db.scrape_timestamp()
+        with self.repository.transaction() as conn:
+            jobs = conn.execute(SELECT_READY_JOBS_SQL,
+                                (self.batch, self.max_attempts, now, -1 if limit is None else limit)).fetchall()
+            conn.executemany("""
+            UPDATE scrape_jobs SET state = 'in_flight', claimed_at = ?
+            WHERE job_id = ?;
+            """, [(now, job_id) for job_id, _ in jobs])
+        return jobs
+
+    def complete(self, job_id):
+        """
+        Marks a job done without a snapshot. Jobs with a snapshot are
+        completed by ScrapeResultWriter instead.
+
+        Returns:
+            bool: False if the job was already done.
+        """
+        with self.repository.transaction() as conn:
+            return job_id in zillow_db.complete_scrape_jobs(conn, [job_id])
+
+    def fail(self, job_id, error, state='failed'):
+        """
+        Records a failed attempt and schedules the retry.
+
+        Args:
+            job_id (int): The job.
+            error (str): What went wrong.
+            state (str): 'failed', or 'captcha' for a longer backoff.
+        """
+        with self.repository.transaction() as conn:
+            row = conn.execute("SELECT attempts FROM scrape_jobs WHERE job_id = ?;", (job_id,)).fetchone()
+            attempts = row[0] + 1
+            next_attempt = datetime.datetime.now() + datetime.timedelta(seconds=retry_delay(state, attempts))
+            conn.execute("""
+            UPDATE scrape_jobs SET state = ?, attempts = attempts + 1, last_error = ?, next_attempt = ?
+            WHERE job_id = ? AND state != 'done';
+            """, (state, error, zillow_db.scrape_timestamp(next_attempt), job_id))
+
+    def seconds_until_retry(self):
+        """
+        Seconds until the next failed job may be retried.
+
+        Returns:
+            float: 0 if one is ready now, or None if nothing is left to retry.
+        """
+        with self.repository.connection() as conn:
+            row = conn.execute("""
+            SELECT MIN(next_attempt) FROM scrape_jobs
+            WHERE batch = ? AND state IN ('pending', 'failed', 'captcha') AND attempts < ?;
+            """, (self.batch, self.max_attempts)).fetchone()
+        if row[0] is None:
+            return None
+        due = datetime.datetime.fromisoformat(row[0])
+        return max(0.0, (due - datetime.datetime.now()).total_seconds())
+
+    def counts(self):
+        """Number of jobs in each state, e.g. {'done': 57, 'pending': 43}."""
+        with self.repository.connection() as conn:
+            return dict(conn.execute("""
+            SELECT state, COUNT(*) FROM scrape_jobs WHERE batch = ? GROUP BY state;
+            """, (self.batch,)).fetchall())
+
+    def failures(self):
+        """
+        The jobs that ran out of attempts without getting done, whatever
+        state they were left in.
+
+        Returns:
+            list: Tuples of (url, state, attempts, last_error).
+        """
+        with self.repository.connection() as conn:
+            return conn.execute("""
+            SELECT url, state, attempts, last_error FROM scrape_jobs
+            WHERE batch = ? AND state != 'done' AND attempts >= ?
+            ORDER BY job_id;
+            """, (self.batch, self.max_attempts)).fetchall()
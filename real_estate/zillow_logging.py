@@ -0,0 +1,234 @@
+import atexit
+import datetime
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+
+# Logging for the real_estate scripts.
+#
+#     log = zillow_logging.get_logger(__name__)
+#     log.info("Formatted %d listings", count)
+#
+# Every module logs under the 'real_estate' logger. setup_logging() puts a
+# QueueHandler on it, so a log call only queues the record; a background
+# listener thread formats it and writes it to the console and to a rotating
+# JSON-lines file in the logs folder. Until setup_logging() is called (e.g.
+# when a module is imported as a library), warnings and errors still reach
+# stderr through Python's last-resort handler and everything else is dropped.
+
+LOGGER_NAME = 'real_estate'
+LOG_FILE_NAME = 'real_estate.log'
+# Rotate the log file at this size, keeping this many old files
+MAX_LOG_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+# LogRecord attributes that are not extra fields passed by the caller
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_listener = None
+_queue = None
+_QueueHandler = None
+
+
+def get_logger(name):
+    """
+    The logger for a module; pass __name__.
+
+    Scripts run directly log under their file name instead of '__main__'.
+    """
+    if name == '__main__':
+        name = Path(sys.argv[0]).stem or 'main'
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+def default_log_folder():
+    """The logs folder from the config (RE_DEFAULT_FOLDER_LOGS), or None."""
+    # Imported here: real_estate_config logs through this module
+    import real_estate_config
+    return real_estate_config.get_config().folders.logs
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats each record as one JSON object: time, level, logger, message,
+    process and thread, any extra={...} fields and the traceback, if any.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """Prints informational messages as they are; warnings and errors get their level in front."""
+
+    def format(self, record):
+        message = super().format(record)
+        if record.levelno >= logging.WARNING:
+            return f"{record.levelname}: {message}"
+        return message
+
+
+def _queue_handler_class():
+    # Built on first use: logging.handlers and multiprocessing are only
+    # imported by scripts that set logging up, not by every import
+    global _QueueHandler
+    if _QueueHandler is None:
+        import logging.handlers
+
+        class QueueHandler(logging.handlers.QueueHandler):
+            # The stock prepare() formats the whole record into its message,
+            # which would leave the JSON formatter nothing to split into
+            # fields. Only render what may not survive the trip to the
+            # listener: the arguments and the traceback.
+            def prepare(self, record):
+                record = logging.makeLogRecord(vars(record))
+                record.msg = record.getMessage()
+                record.args = None
+                if record.exc_info:
+                    record.exc_text = logging.Formatter().formatException(record.exc_info)
+                    record.exc_info = None
+                return record
+
+        _QueueHandler = QueueHandler
+    return _QueueHandler
+
+
+def setup_logging(level=logging.INFO, log_folder=None, log_file=True):
+    """
+    Starts logging for a script: the console shows records from `level`
+    up and, unless log_file is False, a rotating JSON-lines file in the
+    logs folder keeps everything from INFO (or `level`, if lower) up.
+
+    Calling it again replaces the previous setup. The listener is stopped,
+    and its queue drained, at interpreter exit.
+
+    Args:
+        level (int): Console level, e.g. logging.DEBUG for per-listing detail.
+        log_folder (str, optional): Where real_estate.log is written. Defaults
+            to RE_DEFAULT_FOLDER_LOGS; without either, only the console is used.
+        log_file (bool): Write the log file.
+
+    Returns:
+        str: The log file path, or None if there is none.
+    """
+    global _listener, _queue
+    stop_logging()
+    import logging.handlers
+    import multiprocessing
+
+    console = logging.StreamHandler(sys.stderr)
+    console.setLevel(level)
+    console.setFormatter(ConsoleFormatter('%(message)s'))
+    handlers = [console]
+    logger_level = level
+
+    log_path = None
+    if log_file:
+        log_folder = log_folder or default_log_folder()
+    if log_file and log_folder:
+        try:
+            os.makedirs(log_folder, exist_ok=True)
+            log_path = os.path.join(log_folder, LOG_FILE_NAME)
+            file_handler = logging.handlers.RotatingFileHandler(
+                log_path, maxBytes=MAX_LOG_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+        except OSError as e:
+            print(f"Logging to the console only; cannot write to {log_folder}: {e}", file=sys.stderr)
+            log_path = None
+        else:
+            file_level = min(level, logging.INFO)
+            file_handler.setLevel(file_level)
+            file_handler.setFormatter(JsonFormatter())
+            handlers.append(file_handler)
+            logger_level = min(level, file_level)
+
+    # A multiprocessing queue, so worker processes can log through it too
+    _queue = multiprocessing.Queue()
+    _listener = logging.handlers.QueueListener(_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    _attach(_queue, logger_level)
+    # Registered after the queue exists, so it runs before multiprocessing's
+    # own exit hook closes the queue under the listener
+    atexit.unregister(stop_logging)
+    atexit.register(stop_logging)
+    return log_path
+
+
+def stop_logging():
+    """Writes out every queued record and stops the listener thread."""
+    global _listener, _queue
+    listener, _listener = _listener, None
+    if listener is None:
+        return
+    _detach(logging.getLogger(LOGGER_NAME))
+    try:
+        listener.stop()
+    except RuntimeError:
+        # At interpreter exit, a queue that never carried a record can't
+        # start the feeder thread the stop sentinel needs; nothing is queued
+        pass
+    for handler in listener.handlers:
+        handler.close()
+    _queue = None
+
+
+def _detach(logger):
+    for handler in list(logger.handlers):
+        if _QueueHandler is not None and isinstance(handler, _QueueHandler):
+            logger.removeHandler(handler)
+
+
+def _attach(log_queue, level):
+    logger = logging.getLogger(LOGGER_NAME)
+    _detach(logger)
+    logger.addHandler(_queue_handler_class()(log_queue))
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+def worker_options():
+    """
+    Keyword arguments for ProcessPoolExecutor that send the worker
+    processes' log records to this process's log.
+    """
+    if _queue is None:
+        return {}
+    return {'initializer': _attach, 'initargs': (_queue, logging.getLogger(LOGGER_NAME).level)}
+
+
+def add_arguments(parser):
+    """Adds the -v/--verbose, -q/--quiet, --log-folder and --no-log-file options to a command-line parser."""
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('-v', '--verbose',
+                       action='store_true',
+                       help='Also show per-listing detail on the console and in the log file.')
+    group.add_argument('-q', '--quiet',
+                       action='store_true',
+                       help='Only show warnings and errors on the console.')
+    parser.add_argument('--log-folder',
+                        help='Folder for the rotating JSON log file. Defaults to RE_DEFAULT_FOLDER_LOGS.')
+    parser.add_argument('--no-log-file',
+                        action='store_true',
+                        help='Only log to the console.')
+
+
+def from_arguments(args):
+    """Calls setup_logging() with the add_arguments() options."""
+    level = logging.DEBUG if args.verbose else logging.WARNING if args.quiet else logging.INFO
+    return setup_logging(level, args.log_folder, not args.no_log_file)
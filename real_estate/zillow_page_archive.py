@@ -0,0 +1,314 @@
+import argparse
+import datetime
+import hashlib
+import os
+import sqlite3
+from pathlib import Path
+import zstandard
+import zillow_db
+import zillow_property_manager as property_manager
+from zillow_file_manager import property_address_from_filename, sanitize_filename
+
+PACK_FILE = 'pages.pack'
+INDEX_FILE = 'index.db'
+
+# Pages are written once and read many times, so compress hard.
+DEFAULT_LEVEL = 15
+# Dictionaries are trained from this many stored pages, up to this size.
+DEFAULT_DICT_SAMPLES = 200
+DEFAULT_DICT_SIZE = 112 * 1024
+
+
+class PageArchive:
+    """
+    Compressed, deduplicated store of raw Zillow page captures.
+
+    Every distinct page is stored once, as its own zstd frame appended to
+    `<root>/pages.pack`. `<root>/index.db` maps each capture (listing name,
+    ZPID and capture time) to the SHA-256 of its content and the offset and
+    length of that frame, so reading one capture decompresses only that
+    frame. Identical captures of the same page share a frame.
+
+    Once enough pages are stored, train_dictionary() builds a zstd
+    dictionary from them; later pages are compressed with the newest
+    dictionary, which shrinks near-identical daily captures much further.
+
+    Args:
+        root (str): The archive folder; created if missing.
+        level (int): zstd compression level for new frames.
+    """
+
+    def __init__(self, root, level=DEFAULT_LEVEL):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.pack_path = self.root / PACK_FILE
+        self.level = level
+        # Autocommit; writes take an explicit BEGIN IMMEDIATE so concurrent
+        # writers append to the pack one at a time.
+        self.conn = sqlite3.connect(self.root / INDEX_FILE, timeout=zillow_db.DEFAULT_BUSY_TIMEOUT,
+                                    isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode = WAL;")
+        self.conn.executescript("""
+        CREATE TABLE IF NOT EXISTS dictionaries (
+            dict_id INTEGER PRIMARY KEY,
+            data BLOB NOT NULL,
+            created_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS blobs (
+            sha256 TEXT PRIMARY KEY,
+            offset INTEGER NOT NULL,
+            length INTEGER NOT NULL,
+            raw_size INTEGER NOT NULL,
+            dict_id INTEGER REFERENCES dictionaries (dict_id)
+        );
+        CREATE TABLE IF NOT EXISTS captures (
+            name TEXT NOT NULL,
+            zpid TEXT,
+            captured_at TEXT NOT NULL,
+            sha256 TEXT NOT NULL REFERENCES blobs (sha256),
+            PRIMARY KEY (name, captured_at)
+        );
+        CREATE INDEX IF NOT EXISTS idx_captures_zpid ON captures (zpid, captured_at);
+        """)
+        self._dictionaries = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def _dictionary(self, dict_id):
+        if dict_id is None:
+            return None
+        if dict_id not in self._dictionaries:
+            row = self.conn.execute("SELECT data FROM dictionaries WHERE dict_id = ?;", (dict_id,)).fetchone()
+            self._dictionaries[dict_id] = zstandard.ZstdCompressionDict(row[0])
+        return self._dictionaries[dict_id]
+
+    def _latest_dict_id(self):
+        row = self.conn.execute("SELECT MAX(dict_id) FROM dictionaries;").fetchone()
+        return row[0]
+
+    def add(self, name, html, captured_at=None, zpid=None):
+        """
+        Archives one capture of a listing page.
+
+        Args:
+            name (str): The listing's file name stem, e.g. '123_Main_St_Town_NM_87000'.
+            html (str): The page HTML.
+            captured_at (datetime or float, optional): When the page was
+                captured; defaults to now.
+            zpid (str, optional): The Zillow property ID.
+
+        Returns:
+            bool: True if the content was new, False if an identical page
+            was already stored and only the capture was recorded.
+        """
+        data = html.encode('utf-8')
+        sha256 = hashlib.sha256(data).hexdigest()
+        captured_at = zillow_db.scrape_timestamp(captured_at)
+
+        self.conn.execute("BEGIN IMMEDIATE;")
+        try:
+            stored = self.conn.execute("SELECT 1 FROM blobs WHERE sha256 = ?;", (sha256,)).fetchone()
+            if not stored:
+                dict_id = self._latest_dict_id()
+                compressor = zstandard.ZstdCompressor(level=self.level, dict_data=self._dictionary(dict_id))
+                frame = compressor.compress(data)
+                with open(self.pack_path, 'ab') as pack:
+                    offset = pack.seek(0, os.SEEK_END)
+                    pack.write(frame)
+                    pack.flush()
+                    os.fsync(pack.fileno())
+                self.conn.execute(
+                    "INSERT INTO blobs (sha256, offset, length, raw_size, dict_id) VALUES (?, ?, ?, ?, ?);",
+                    (sha256, offset, len(frame), len(data), dict_id))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO captures (name, zpid, captured_at, sha256) VALUES (?, ?, ?, ?);",
+                (name, zpid, captured_at, sha256))
+            self.conn.execute("COMMIT;")
+        except BaseException:
+            self.conn.execute("ROLLBACK;")
+            raise
+        return not stored
+
+    def add_file(self, file_path):
+        """
+        Archives a saved .zlw page; its modification time is the capture time.
+
+        Returns:
+            bool: True if the content was new; see add().
+        """
+        # Imported here: the parser pulls in the geocoding and image modules,
+        # which reading an archive doesn't need.
+        from parse_zillow_page import ListingDocument
+
+        file_path = Path(file_path)
+        with open(file_path, 'r', encoding='utf-8') as f:
+            html = f.read()
+        url = ListingDocument(html).listing_url(property_address_from_filename(file_path.name))
+        zpid = property_manager.get_property_id_from_url(url) if url else None
+        return self.add(file_path.stem, html, file_path.stat().st_mtime, zpid)
+
+    def captures(self, name=None, zpid=None):
+        """
+        Lists archived captures, oldest first.
+
+        Args:
+            name (str, optional): Only this listing.
+            zpid (str, optional): Only this Zillow property ID.
+
+        Returns:
+            list: (name, zpid, captured_at, sha256) tuples.
+        """
+        query = "SELECT name, zpid, captured_at, sha256 FROM captures"
+        clauses, params = [], []
+        if name:
+            clauses.append("name = ?")
+            params.append(name)
+        if zpid:
+            clauses.append("zpid = ?")
+            params.append(zpid)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        return self.conn.execute(query + " ORDER BY captured_at, name;", params).fetchall()
+
+    def read(self, sha256):
+        """
+        Returns the HTML of one stored page, decompressing only its frame.
+
+        Args:
+            sha256 (str): The page's content hash, as listed by captures().
+
+        Returns:
+            str: The page HTML.
+        """
+        row = self.conn.execute("SELECT offset, length, raw_size, dict_id FROM blobs WHERE sha256 = ?;",
+                                (sha256,)).fetchone()
+        if row is None:
+            raise KeyError(sha256)
+        offset, length, raw_size, dict_id = row
+        with open(self.pack_path, 'rb') as pack:
+            frame = os.pread(pack.fileno(), length, offset)
+        decompressor = zstandard.ZstdDecompressor(dict_data=self._dictionary(dict_id))
+        return decompressor.decompress(frame, max_output_size=raw_size).decode('utf-8')
+
+    def latest(self, as_of=None):
+        """
+        Returns the newest capture of every listing, optionally as of a date.
+
+        Args:
+            as_of (datetime or float, optional): Ignore captures after this time.
+
+        Returns:
+            list: (name, zpid, captured_at, sha256) tuples, one per listing.
+        """
+        cutoff = zillow_db.scrape_timestamp(as_of) if as_of is not None else '9999'
+        return self.conn.execute("""
+        SELECT name, zpid, MAX(captured_at), sha256 FROM captures
+        WHERE captured_at <= ? GROUP BY name ORDER BY name;
+        """, (cutoff,)).fetchall()
+
+    def extract(self, output_folder, as_of=None):
+        """
+        Writes the newest capture of every listing to `<name>.zlw` files that
+        format_scrape reads as usual. Each file's modification time is set to
+        its capture time, which format_scrape uses as the scrape date.
+
+        Args:
+            output_folder (str): Where the .zlw files are written.
+            as_of (datetime or float, optional): Extract the pages as they were then.
+
+        Returns:
+            int: The number of files written.
+        """
+        output_folder = Path(output_folder)
+        output_folder.mkdir(parents=True, exist_ok=True)
+        captures = self.latest(as_of)
+        for name, _, captured_at, sha256 in captures:
+            file_path = output_folder / (name + '.zlw')
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(self.read(sha256))
+            timestamp = datetime.datetime.strptime(captured_at, '%Y-%m-%d %H:%M:%S').timestamp()
+            os.utime(file_path, (timestamp, timestamp))
+        return len(captures)
+
+    def train_dictionary(self, samples=DEFAULT_DICT_SAMPLES, dict_size=DEFAULT_DICT_SIZE):
+        """
+        Trains a zstd dictionary from the most recently stored pages. Pages
+        added afterwards are compressed with it; existing frames keep theirs.
+
+        Returns:
+            int: The new dictionary's id.
+        """
+        rows = self.conn.execute("SELECT sha256 FROM blobs ORDER BY offset DESC LIMIT ?;", (samples,)).fetchall()
+        pages = [self.read(sha256).encode('utf-8') for (sha256,) in rows]
+        dictionary = zstandard.train_dictionary(dict_size, pages)
+        cursor = self.conn.execute("INSERT INTO dictionaries (data, created_at) VALUES (?, ?);",
+                                   (dictionary.as_bytes(), zillow_db.scrape_timestamp()))
+        return cursor.lastrowid
+
+    def stats(self):
+        """
+        Returns:
+            dict: Capture and page counts, raw bytes of the distinct pages
+            and bytes on disk in the pack.
+        """
+        captures = self.conn.execute("SELECT COUNT(*) FROM captures;").fetchone()[0]
+        pages, raw_bytes, stored_bytes = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(raw_size), 0), COALESCE(SUM(length), 0) FROM blobs;").fetchone()
+        return {'captures': captures, 'pages': pages, 'raw_bytes': raw_bytes, 'stored_bytes': stored_bytes}
+
+
+def archive_name_for_url(url):
+    """Returns the archive name for a scraped listing URL, matching the renamed .zlw file names."""
+    return sanitize_filename(property_manager.get_property_name(url))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compressed archive of Zillow page captures.')
+    parser.add_argument('archive', help='The archive folder.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    add_parser = subparsers.add_parser('add', help='Archive .zlw files.')
+    add_parser.add_argument('paths', nargs='+', help='.zlw files, or folders of them.')
+
+    extract_parser = subparsers.add_parser('extract', help='Write the newest capture of each listing as .zlw files.')
+    extract_parser.add_argument('output_folder', help='Where to write the .zlw files.')
+    extract_parser.add_argument('--as-of', help="Extract the pages as they were at this time ('YYYY-MM-DD [HH:MM:SS]').")
+
+    subparsers.add_parser('train', help='Train a compression dictionary from the stored pages.')
+    subparsers.add_parser('stats', help='Show the archive size.')
+
+    args = parser.parse_args()
+    with PageArchive(args.archive) as archive:
+        if args.command == 'add':
+            added = duplicates = 0
+            for path in map(Path, args.paths):
+                for file_path in sorted(path.glob('*.zlw')) if path.is_dir() else [path]:
+                    if archive.add_file(file_path):
+                        added += 1
+                    else:
+                        duplicates += 1
+            print(f"Archived {added} new pages, {duplicates} identical to pages already stored.")
+        elif args.command == 'extract':
+            as_of = datetime.datetime.fromisoformat(args.as_of) if args.as_of else None
+            count = archive.extract(args.output_folder, as_of)
+            print(f"Extracted {count} pages to {args.output_folder}")
+        elif args.command == 'train':
+            print(f"Trained dictionary {archive.train_dictionary()}")
+        else:
+            stats = archive.stats()
+            ratio = stats['raw_bytes'] / stats['stored_bytes'] if stats['stored_bytes'] else 0
+            print(f"  - Captures: {stats['captures']}")
+            print(f"  - Distinct pages: {stats['pages']}")
+            print(f"  - Raw size: {stats['raw_bytes']:,} bytes")
+            print(f"  - Stored size: {stats['stored_bytes']:,} bytes ({ratio:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
 from urllib.parse import urlparse
 import re
+import zillow_logging
+
+log = zillow_logging.get_logger(__name__)
 
 
 def get_property_id_from_url(url):
@@ -54,7 +57,7 @@ def get_property_name(url):
             return "Unknown Property"
 
     except Exception as e:
-        print(f"Error extracting property name from URL: {e}")
+        log.warning("Error extracting property name from URL: %s", e)
         return "Unknown Property"
     
     return "Unknown Property"
@@ -0,0 +1,146 @@
+from urllib.parse import urlparse
+import real_estate_config as config
+import zillow_logging
+
+log = zillow_logging.get_logger(__name__)
+
+# Only these Playwright resource types are let through by default. We read the
+# rendered HTML and nothing else, so images, media and fonts are pure overhead.
+DEFAULT_ALLOWED_RESOURCE_TYPES = ('document', 'script', 'xhr', 'fetch', 'stylesheet', 'websocket', 'other')
+
+# Analytics and ad hosts are blocked even when their resource type is allowed.
+DEFAULT_BLOCKED_HOSTS = (
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net',
+    'googlesyndication.com',
+    'facebook.net',
+)
+
+# Rough transfer sizes used to estimate what a blocked request would have cost.
+DEFAULT_ESTIMATED_BYTES = {
+    'image': 120000,
+    'media': 500000,
+    'font': 40000,
+    'stylesheet': 20000,
+    'script': 30000,
+    'other': 5000,
+}
+
+
+class ResourceBlocker:
+    """
+    Playwright route handler that aborts requests the scraper doesn't need.
+
+    A request is aborted when its resource type is not in the allowlist or
+    its host is (a subdomain of) a blocked host. The blocker keeps counts of
+    what it blocked and what it let through so a run can report the savings.
+
+    Args:
+        allowed_resource_types (iterable, optional): Resource types to load.
+        blocked_hosts (iterable, optional): Hosts whose requests are always aborted.
+        estimated_bytes (dict, optional): Estimated size per resource type, used
+            to report the bytes saved by blocked requests.
+    """
+
+    def __init__(self, allowed_resource_types=None, blocked_hosts=None, estimated_bytes=None):
+        self.allowed_resource_types = set(allowed_resource_types or DEFAULT_ALLOWED_RESOURCE_TYPES)
+        self.blocked_hosts = tuple(host.lower() for host in (blocked_hosts or DEFAULT_BLOCKED_HOSTS))
+        self.estimated_bytes = dict(DEFAULT_ESTIMATED_BYTES)
+        self.estimated_bytes.update(estimated_bytes or {})
+        self.blocked = {}
+        self.allowed_requests = 0
+        self.loaded_bytes = 0
+
+    @classmethod
+    def from_config(cls):
+        """Builds a blocker from the 'scraper.resource_blocking' config section."""
+        settings = config.load_config_section('scraper').get('resource_blocking', {})
+        return cls(settings.get('allowed_resource_types'),
+                   settings.get('blocked_hosts'),
+                   settings.get('estimated_bytes'))
+
+    def _is_blocked_host(self, url):
+        host = (urlparse(url).hostname or '').lower()
+        return any(host == blocked or host.endswith('.' + blocked) for blocked in self.blocked_hosts)
+
+    def should_block(self, request):
+        """
+        Decides whether a request should be aborted.
+
+        Args:
+            request: A Playwright Request.
+
+        Returns:
+            bool: True if the request should be aborted.
+        """
+        if request.resource_type not in self.allowed_resource_types:
+            return True
+        return self._is_blocked_host(request.url)
+
+    def _record_block(self, request):
+        resource_type = request.resource_type
+        self.blocked[resource_type] = self.blocked.get(resource_type, 0) + 1
+
+    def handle_route(self, route):
+        """Route handler for the sync Playwright API."""
+        if self.should_block(route.request):
+            self._record_block(route.request)
+            route.abort()
+        else:
+            self.allowed_requests += 1
+            route.continue_()
+
+    async def handle_route_async(self, route):
+        """Route handler for the async Playwright API."""
+        if self.should_block(route.request):
+            self._record_block(route.request)
+            await route.abort()
+        else:
+            self.allowed_requests += 1
+            await route.continue_()
+
+    def record_response(self, response):
+        """'response' event handler that tallies the bytes actually loaded."""
+        length = response.headers.get('content-length')
+        if length and length.isdigit():
+            self.loaded_bytes += int(length)
+
+    def attach(self, context):
+        """Installs the blocker on a sync BrowserContext."""
+        context.route('**/*', self.handle_route)
+        context.on('response', self.record_response)
+
+    async def attach_async(self, context):
+        """Installs the blocker on an async BrowserContext."""
+        await context.route('**/*', self.handle_route_async)
+        context.on('response', self.record_response)
+
+    def summary(self):
+        """
+        Returns the requests blocked and the bytes saved so far.
+
+        Returns:
+            dict: Counts of blocked requests (total and per resource type),
+            allowed requests, loaded bytes and estimated bytes saved.
+        """
+        saved_bytes = sum(count * self.estimated_bytes.get(resource_type, self.estimated_bytes.get('other', 0))
+                          for resource_type, count in self.blocked.items())
+        return {
+            'blocked_requests': sum(self.blocked.values()),
+            'blocked_by_type': dict(self.blocked),
+            'allowed_requests': self.allowed_requests,
+            'loaded_bytes': self.loaded_bytes,
+            'estimated_saved_bytes': saved_bytes,
+        }
+
+    def log_summary(self):
+        """Logs summary() as one INFO record, with its counts as fields."""
+        summary = self.summary()
+        lines = ["-- Resource blocking --", f"  - Requests blocked: {summary['blocked_requests']}"]
+        for resource_type, count in sorted(summary['blocked_by_type'].items()):
+            lines.append(f"      {resource_type}: {count}")
+        lines.append(f"  - Requests allowed: {summary['allowed_requests']}")
+        lines.append(f"  - Bytes loaded: {summary['loaded_bytes']:,}")
+        lines.append(f"  - Bytes saved (estimated): {summary['estimated_saved_bytes']:,}")
+        log.info("%s", "\n".join(lines), extra=summary)
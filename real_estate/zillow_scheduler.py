@@ -0,0 +1,432 @@
+import argparse
+import asyncio
+import collections
+import contextlib
+import datetime
+import logging
+import os
+import time
+import parse_zillow_page as zillow_page
+import zillow_db
+import zillow_property_manager as property_manager
+import zillow_logging
+import real_estate_config
+from zillow_scrape_settings import (DEFAULT_CONCURRENCY, DEFAULT_PAGES_PER_MINUTE, DEFAULT_JITTER_SECONDS,
+                                    DEFAULT_PAGES_PER_CONTEXT, CAPTCHA_PAUSE_SECONDS, positive_float)
+
+log = zillow_logging.get_logger(__name__)
+
+# The global scrape budget: page loads per rolling hour, across all listings.
+DEFAULT_PAGES_PER_HOUR = 30
+
+# Re-scrape intervals. A listing with no measurable activity is scraped every
+# BASE_INTERVAL_HOURS; one gaining HOT_ACTIVITY views per day (a save counts
+# as SAVE_WEIGHT views) twice as often, and so on, down to MIN_INTERVAL_HOURS.
+# Listings whose stats stop moving back off by STALE_BACKOFF per scrape, up to
+# MAX_INTERVAL_HOURS.
+MIN_INTERVAL_HOURS = 6.0
+BASE_INTERVAL_HOURS = 24.0
+MAX_INTERVAL_HOURS = 7 * 24.0
+HOT_ACTIVITY = 50.0
+SAVE_WEIGHT = 20.0
+STALE_BACKOFF = 1.5
+
+# Listings this new are scraped at least every NEW_LISTING_INTERVAL_HOURS.
+NEW_LISTING_DAYS = 14
+NEW_LISTING_INTERVAL_HOURS = 12.0
+
+# Failed scrapes are retried after RETRY_HOURS, doubling with every
+# consecutive failure, up to MAX_INTERVAL_HOURS. A CAPTCHA pauses everything
+# for CAPTCHA_PAUSE_SECONDS.
+RETRY_HOURS = 1.0
+
+# The daemon never sleeps longer than this, so new URLs and edits to the
+# schedule are picked up.
+POLL_SECONDS = 300
+
+SECONDS_PER_HOUR = 60 * 60
+SECONDS_PER_DAY = 24 * SECONDS_PER_HOUR
+
+# Hottest listings first when more are due than the budget allows
+SELECT_DUE_SQL = """
+SELECT property_id, url, interval_hours, failures
+FROM scrape_schedule
+WHERE next_due <= ?
+ORDER BY priority DESC, next_due
+LIMIT ?;
+"""
+
+INSERT_SCHEDULE_SQL = """
+INSERT OR IGNORE INTO scrape_schedule (property_id, url, next_due, interval_hours)
+VALUES (?, ?, ?, ?);
+"""
+
+UPDATE_SCHEDULE_SQL = """
+UPDATE scrape_schedule
+SET next_due = ?, interval_hours = ?, priority = ?, last_status = ?, failures = ?
+WHERE property_id = ?;
+"""
+
+
+def _parse_timestamp(value):
+    return datetime.datetime.fromisoformat(value)
+
+
+def listing_activity(previous, snapshot):
+    """
+    Measures how fast a listing is gaining attention between two snapshots.
+
+    Args:
+        previous (tuple): The earlier (scrape_date, days_on_market, views, saves), or None.
+        snapshot (tuple): The new (scrape_date, days_on_market, views, saves).
+
+    Returns:
+        float: Views per day plus SAVE_WEIGHT times saves per day, or None
+        if there is no earlier snapshot to compare with.
+    """
+    if previous is None:
+        return None
+    elapsed = (_parse_timestamp(snapshot[0]) - _parse_timestamp(previous[0])).total_seconds() / SECONDS_PER_DAY
+    if elapsed <= 0:
+        return None
+    views = max(0, (snapshot[2] or 0) - (previous[2] or 0))
+    saves = max(0, (snapshot[3] or 0) - (previous[3] or 0))
+    return (views + SAVE_WEIGHT * saves) / elapsed
+
+
+def next_interval(previous, snapshot, interval_hours):
+    """
+    Picks how long to wait before scraping a listing again.
+
+    Args:
+        previous (tuple): The snapshot before this scrape, or None.
+        snapshot (tuple): The snapshot just scraped.
+        interval_hours (float): The interval the listing was on.
+
+    Returns:
+        tuple: (interval_hours, priority), where priority is the listing's activity.
+    """
+    activity = listing_activity(previous, snapshot)
+    if activity is None:
+        interval = BASE_INTERVAL_HOURS
+    elif activity == 0:
+        interval = max(interval_hours, BASE_INTERVAL_HOURS) * STALE_BACKOFF
+    else:
+        interval = BASE_INTERVAL_HOURS / (1 + activity / HOT_ACTIVITY)
+    days_on_market = snapshot[1]
+    if days_on_market is not None and days_on_market <= NEW_LISTING_DAYS:
+        interval = min(interval, NEW_LISTING_INTERVAL_HOURS)
+    interval = min(MAX_INTERVAL_HOURS, max(MIN_INTERVAL_HOURS, interval))
+    return interval, activity or 0.0
+
+
+def retry_interval(failures):
+    """Hours to wait after `failures` consecutive failed scrapes."""
+    return min(MAX_INTERVAL_HOURS, RETRY_HOURS * 2 ** (failures - 1))
+
+
+class HourlyBudget:
+    """
+    Caps page loads per rolling hour. The start times of recent attempts are
+    read back from scrape_schedule on startup, so restarting the daemon
+    doesn't hand out a fresh hour's worth of pages.
+
+    Args:
+        pages_per_hour (int): The most page loads allowed in any hour.
+        recent (iterable): POSIX times of attempts made in the last hour.
+    """
+
+    def __init__(self, pages_per_hour, recent=()):
+        self.pages_per_hour = max(1, int(pages_per_hour))
+        self._attempts = collections.deque(sorted(recent))
+
+    def _prune(self, now):
+        while self._attempts and self._attempts[0] <= now - SECONDS_PER_HOUR:
+            self._attempts.popleft()
+
+    def available(self, now=None):
+        """How many pages may be loaded right now."""
+        self._prune(time.time() if now is None else now)
+        return max(0, self.pages_per_hour - len(self._attempts))
+
+    def seconds_until_available(self, now=None):
+        """Seconds until at least one page may be loaded."""
+        now = time.time() if now is None else now
+        if self.available(now):
+            return 0.0
+        return self._attempts[0] + SECONDS_PER_HOUR - now
+
+    def spend(self, count=1, now=None):
+        now = time.time() if now is None else now
+        self._attempts.extend([now] * count)
+
+
+def add_listings(conn, urls, now=None):
+    """
+    Puts listing URLs on the schedule, due immediately. Listings already
+    scheduled keep their place.
+
+    Args:
+        conn: The database connection object.
+        urls (iterable): Zillow listing URLs.
+        now (datetime, optional): When the new listings become due. Defaults to now.
+
+    Returns:
+        int: The number of listings added to the schedule.
+    """
+    due = zillow_db.scrape_timestamp(now)
+    properties = []
+    for url in urls:
+        property_id = property_manager.get_property_id_from_url(url)
+        if property_id:
+            properties.append((property_id, property_manager.get_property_name(url), url, None))
+    zillow_db.insert_properties(conn, properties, commit=False)
+    before = conn.total_changes
+    conn.executemany(INSERT_SCHEDULE_SQL,
+                     [(property_id, url, due, BASE_INTERVAL_HOURS) for property_id, _, url, _ in properties])
+    # Listings already in the database but never scheduled
+    conn.execute("""
+    INSERT OR IGNORE INTO scrape_schedule (property_id, url, next_due, interval_hours)
+    SELECT property_id, url, ?, ? FROM properties;
+    """, (due, BASE_INTERVAL_HOURS))
+    return conn.total_changes - before
+
+
+def claim_due_listings(conn, limit, now=None):
+    """
+    Returns up to `limit` listings that are due, hottest first, and stamps
+    them with the attempt time so the budget survives a restart.
+
+    Returns:
+        list: Tuples of (property_id, url, interval_hours, failures).
+    """
+    now = zillow_db.scrape_timestamp(now)
+    due = conn.execute(SELECT_DUE_SQL, (now, limit)).fetchall()
+    conn.executemany("UPDATE scrape_schedule SET last_attempt = ? WHERE property_id = ?;",
+                     [(now, row[0]) for row in due])
+    return due
+
+
+def recent_attempts(conn, now=None):
+    """POSIX times of the attempts started within the last hour."""
+    now = now or datetime.datetime.now()
+    since = zillow_db.scrape_timestamp(now - datetime.timedelta(hours=1))
+    rows = conn.execute("SELECT last_attempt FROM scrape_schedule WHERE last_attempt > ?;", (since,))
+    return [_parse_timestamp(row[0]).timestamp() for row in rows]
+
+
+def seconds_until_next_due(conn, now=None):
+    """Seconds until the earliest scheduled listing is due; None if nothing is scheduled."""
+    row = conn.execute("SELECT MIN(next_due) FROM scrape_schedule;").fetchone()
+    if row[0] is None:
+        return None
+    now = now or datetime.datetime.now()
+    return max(0.0, (_parse_timestamp(row[0]) - now).total_seconds())
+
+
+def record_result(conn, listing, status, stats=None, compact=True, now=None):
+    """
+    Saves one scrape's stats and moves the listing to its next due time, in
+    the caller's transaction.
+
+    Args:
+        conn: The database connection object.
+        listing (tuple): (property_id, url, interval_hours, failures) from claim_due_listings.
+        status (str): The ScrapeResult status: 'ok', 'captcha', 'timeout' or 'error'.
+        stats (dict, optional): Parsed stats when status is 'ok'.
+        compact (bool): Store the snapshot only if its metrics changed.
+        now (datetime, optional): The scrape time. Defaults to now.
+
+    Returns:
+        float: Hours until the listing is due again.
+    """
+    property_id, url, interval_hours, failures = listing
+    now = now or datetime.datetime.now()
+    if status == 'ok' and stats:
+        snapshot = (zillow_db.scrape_timestamp(now), stats.get('days_on_zillow'),
+                    stats.get('views'), stats.get('saves'))
+        previous = conn.execute("""
+        SELECT scrape_date, days_on_market, views, saves FROM latest_snapshots WHERE property_id = ?;
+        """, (property_id,)).fetchone()
+        zillow_db.insert_scrape_results(conn, [(property_id, *snapshot)], commit=False, compact=compact)
+        interval_hours, priority = next_interval(previous, snapshot, interval_hours)
+        wait_hours, failures = interval_hours, 0
+    else:
+        if status == 'captcha':
+            # Zillow blocked the scraper, not this listing
+            wait_hours = RETRY_HOURS
+        else:
+            if status == 'ok':
+                status = 'no stats'
+            failures += 1
+            wait_hours = retry_interval(failures)
+        priority = conn.execute("SELECT priority FROM scrape_schedule WHERE property_id = ?;",
+                                (property_id,)).fetchone()[0]
+    next_due = zillow_db.scrape_timestamp(now + datetime.timedelta(hours=wait_hours))
+    conn.execute(UPDATE_SCHEDULE_SQL, (next_due, interval_hours, priority, status, failures, property_id))
+    return wait_hours
+
+
+def get_schedule(conn, limit=None):
+    """
+    Returns the schedule, soonest due first.
+
+    Returns:
+        list: Tuples of (property_id, url, next_due, interval_hours, priority, last_status, failures).
+    """
+    return conn.execute("""
+    SELECT property_id, url, next_due, interval_hours, priority, last_status, failures
+    FROM scrape_schedule
+    ORDER BY next_due, priority DESC
+    LIMIT ?;
+    """, (-1 if limit is None else limit,)).fetchall()
+
+
+async def run_scheduler(repository, pages_per_hour=DEFAULT_PAGES_PER_HOUR, compact=True, once=False,
+                        blocker=None, **batch_options):
+    """
+    Scrapes listings as they fall due, forever (or until nothing is due when
+    once=True). Everything the scheduler knows lives in the database, so it
+    can be stopped at any point and picks up where it left off.
+
+    Args:
+        repository (ZillowRepository): The database to schedule from and write to.
+        pages_per_hour (int): The most page loads in any rolling hour.
+        compact (bool): Only store snapshots whose metrics changed.
+        once (bool): Return when no listing is due instead of waiting.
+        blocker (ResourceBlocker, optional): Passed to the batch scraper.
+        **batch_options: concurrency, pages_per_minute, jitter and
+            pages_per_context for zillow_async_scraper.scrape_zillow_batch.
+
+    Returns:
+        int: The number of listings scraped.
+    """
+    # Playwright is only needed once there is something to scrape
+    import zillow_async_scraper as async_scraper
+
+    with repository.connection() as conn:
+        budget = HourlyBudget(pages_per_hour, recent_attempts(conn))
+    scraped = 0
+    while True:
+        with repository.transaction() as conn:
+            due = claim_due_listings(conn, budget.available())
+        if not due:
+            if once:
+                return scraped
+            if budget.available():
+                with repository.connection() as conn:
+                    wait = seconds_until_next_due(conn)
+                wait = POLL_SECONDS if wait is None else min(POLL_SECONDS, max(wait, 1.0))
+            else:
+                wait = budget.seconds_until_available()
+                log.info("Hourly budget of %d pages spent.", budget.pages_per_hour)
+            log.info("Next scrape in %.1f minutes.", wait / 60)
+            await asyncio.sleep(wait)
+            continue
+
+        budget.spend(len(due))
+        listings = {listing[1]: listing for listing in due}
+        captcha = False
+        # aclosing: stop the workers and the browser before pausing, not whenever
+        # the abandoned generator happens to be finalized
+        batch = async_scraper.scrape_zillow_batch(list(listings), blocker=blocker, **batch_options)
+        async with contextlib.aclosing(batch) as results:
+            async for result in results:
+                stats = zillow_page.ListingDocument(result.content).stats() if result.status == 'ok' else None
+                with repository.transaction() as conn:
+                    hours = record_result(conn, listings[result.url], result.status, stats, compact)
+                scraped += 1
+                log.log(logging.DEBUG if result.status == 'ok' else logging.WARNING,
+                        "%s: %s (next in %.1f hours)", result.status, result.url, hours)
+                if result.status == 'captcha':
+                    captcha = True
+                    break
+        if captcha:
+            # Listings claimed but not reached stay due and go first next time
+            log.warning("CAPTCHA detected; pausing for %d minutes.", CAPTCHA_PAUSE_SECONDS // 60)
+            await asyncio.sleep(CAPTCHA_PAUSE_SECONDS)
+
+
+def main():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    default_file_path = os.path.join(script_dir, 'zillow_listing_urls.txt')
+
+    parser = argparse.ArgumentParser(description='Scrape Zillow listings as they fall due, hottest listings most often.')
+    parser.add_argument('url_file',
+                        nargs='?',
+                        default=default_file_path,
+                        help=f'Listing URLs to add to the schedule, one per line. Defaults to "{default_file_path}".')
+    parser.add_argument('--db',
+                        type=str,
+                        default=zillow_db.DEFAULT_DB_PATH,
+                        help=f'SQLite database holding the schedule and stats. Defaults to "{zillow_db.DEFAULT_DB_PATH}".')
+    parser.add_argument('--pages-per-hour',
+                        type=int,
+                        default=DEFAULT_PAGES_PER_HOUR,
+                        help=f'Most page loads in any rolling hour. Defaults to {DEFAULT_PAGES_PER_HOUR}.')
+    parser.add_argument('--concurrency',
+                        type=int,
+                        default=DEFAULT_CONCURRENCY,
+                        help=f'Number of pages to load at the same time. Defaults to {DEFAULT_CONCURRENCY}.')
+    parser.add_argument('--pages-per-minute',
+                        type=positive_float,
+                        default=DEFAULT_PAGES_PER_MINUTE,
+                        help=f'Maximum page loads per minute against zillow.com. Defaults to {DEFAULT_PAGES_PER_MINUTE}.')
+    parser.add_argument('--jitter',
+                        type=float,
+                        default=DEFAULT_JITTER_SECONDS,
+                        help=f'Maximum random delay in seconds added to each page load. Defaults to {DEFAULT_JITTER_SECONDS}.')
+    parser.add_argument('--fast',
+                        action='store_true',
+                        help='Block images, media, fonts and analytics hosts while loading pages.')
+    parser.add_argument('--full',
+                        action='store_true',
+                        help='Store every snapshot, not just those whose stats changed.')
+    parser.add_argument('--once',
+                        action='store_true',
+                        help='Scrape whatever is due now, then exit.')
+    parser.add_argument('--show',
+                        action='store_true',
+                        help='Print the schedule and exit.')
+    real_estate_config.add_arguments(parser)
+    zillow_logging.add_arguments(parser)
+    args = parser.parse_args()
+    real_estate_config.from_arguments(args)
+    zillow_logging.from_arguments(args)
+
+    with zillow_db.ZillowRepository(args.db) as repository:
+        if os.path.exists(args.url_file):
+            with open(args.url_file, 'r') as f:
+                urls = [line.strip() for line in f if line.strip()]
+            with repository.transaction() as conn:
+                added = add_listings(conn, urls)
+            if added:
+                log.info("Added %d listings to the schedule.", added)
+
+        if args.show:
+            with repository.connection() as conn:
+                for property_id, url, next_due, interval, priority, status, failures in get_schedule(conn):
+                    print(f"{next_due}  every {interval:5.1f}h  activity {priority:7.1f}  "
+                          f"{status or 'new':8}  {property_id}  {url}")
+            return
+
+        blocker = None
+        if args.fast:
+            from zillow_resource_blocker import ResourceBlocker
+            blocker = ResourceBlocker.from_config()
+
+        try:
+            scraped = asyncio.run(run_scheduler(repository, args.pages_per_hour, not args.full, args.once, blocker,
+                                                concurrency=args.concurrency,
+                                                pages_per_minute=args.pages_per_minute,
+                                                jitter=args.jitter,
+                                                pages_per_context=DEFAULT_PAGES_PER_CONTEXT))
+            log.info("Scraped %d listings.", scraped)
+        except KeyboardInterrupt:
+            log.info("Scheduler stopped; the schedule is saved and resumes on the next start.")
+        if blocker is not None:
+            blocker.log_summary()
+
+
+if __name__ == "__main__":
+    main()
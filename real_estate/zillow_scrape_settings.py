@@ -0,0 +1,36 @@
+import argparse
+
+# Settings shared by the sync scraper (scrape_zillow.py), the asyncio batch
+# scraper (zillow_async_scraper.py) and the scheduler. Kept apart from all
+# three so importing one doesn't import the others, or Playwright.
+
+# Recycle the browser context after this many pages so cookies, cache and
+# memory held by a single context don't grow without bound.
+DEFAULT_PAGES_PER_CONTEXT = 20
+
+# Batch politeness defaults: at most this many page loads per minute against
+# one host, with up to DEFAULT_JITTER_SECONDS of random delay so requests
+# don't arrive on a fixed beat.
+DEFAULT_CONCURRENCY = 2
+DEFAULT_PAGES_PER_MINUTE = 1.0
+DEFAULT_JITTER_SECONDS = 10.0
+
+CAPTCHA_MARKER = "Press & Hold to confirm you are"
+# A CAPTCHA stops the batch and pauses scraping this long, so the rest of
+# the list isn't loaded on a flagged session.
+CAPTCHA_PAUSE_SECONDS = 30 * 60
+
+# The stats block is the last thing we need on the page, so its arrival
+# means the listing has rendered.
+STATS_SELECTOR = "dl[class*='StyledOverviewStats']"
+
+
+def positive_float(value):
+    """An argparse type for rates: a float greater than zero."""
+    try:
+        number = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid number: '{value}'")
+    if not number > 0:
+        raise argparse.ArgumentTypeError(f"must be greater than 0: '{value}'")
+    return number
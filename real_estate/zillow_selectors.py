@@ -0,0 +1,173 @@
+from lxml import etree
+
+# Every XPath the parsers use, in one place. Each field maps to a fallback
+# chain: expressions are tried in order and the first one that matches wins,
+# so when Zillow rotates its hashed class names a looser expression can be
+# appended without touching the parsers.
+#
+# Page fields are single location steps (no axis) and are searched for
+# anywhere below the element they are evaluated on. The same steps decide
+# which subtrees zillow_html keeps while streaming a file, when only the
+# element's own tag and attributes are known, so their predicates must not
+# look at content. Sub-fields are relative paths evaluated on the element a
+# page field matched.
+
+
+def _has_token(attribute, name):
+    """XPath predicate for a whole token of a space-separated attribute such as class or rel."""
+    return f"contains(concat(' ', normalize-space(@{attribute}), ' '), ' {name} ')"
+
+
+def _has_class(name):
+    return _has_token('class', name)
+
+
+PAGE_SELECTORS = {
+    'stats': (
+        'dl[contains(@class, "StyledOverviewStats")]',
+        'dl[contains(@class, "OverviewStats")]',
+    ),
+    'details': (
+        'div[@data-testid="home-details-chip-container"]',
+    ),
+    'description': (
+        'div[@data-testid="description"]',
+    ),
+    'facts': (
+        'div[@data-testid="facts-and-features-module"]',
+    ),
+    'mls': (
+        'div[@aria-label="MLS information"]',
+    ),
+    'media_tile': (
+        f'li[{_has_class("media-stream-tile")}]',
+    ),
+    'canonical_link': (
+        f'link[{_has_token("rel", "canonical")}]',
+    ),
+    'og_url': (
+        'meta[@property="og:url"]',
+    ),
+    'zpid_link': (
+        'a[contains(@href, "_zpid")]',
+    ),
+    'gallery_source': (
+        'source[@type="image/jpeg"]',
+    ),
+    'gallery_address': (
+        'button[contains(@class, "StyledTextButton")]',
+    ),
+    'address': (
+        'div[contains(@class, "AddressWrapper")]',
+    ),
+}
+
+SUB_SELECTORS = {
+    'stats.values': (
+        './/strong',
+    ),
+    'details.price': (
+        './/span[@data-testid="price"]',
+    ),
+    'details.address': (
+        './/h1',
+    ),
+    'details.facts': (
+        './/div[@data-testid="bed-bath-sqft-facts"]',
+    ),
+    'details.fact': (
+        './/*[@data-testid="bed-bath-sqft-fact-container"]',
+    ),
+    'details.fact_value': (
+        f'.//span[{_has_class("--medium")}]',
+    ),
+    'details.fact_label': (
+        f'.//span[{_has_class("koMNUa")}]',
+        './/span[not(contains(@class, "--medium"))]',
+    ),
+    'description.text': (
+        f'.//div[{_has_class("Text-c11n-8-111-1__sc-aiai24-0")}]',
+        './/div[contains(@class, "Text-c11n")]',
+    ),
+    'facts.group_title': (
+        './/h3[contains(@class, "StyledCategoryGroupHeading")]',
+        './/h3',
+    ),
+    'facts.category': (
+        './/div[@data-testid="fact-category"]',
+    ),
+    'facts.category_title': (
+        './/h6[contains(@class, "StyledHeading")]',
+    ),
+    'facts.item': (
+        './/li',
+    ),
+    'mls.updated': (
+        './/p[@data-testid="current-list-attribution-last-updated"]',
+    ),
+    'mls.listed_by': (
+        './/div[@data-testid="seller-attribution"]',
+    ),
+    'mls.agent': (
+        './/p[@data-testid="attribution-LISTING_AGENT"]',
+    ),
+    'mls.broker': (
+        './/p[@data-testid="attribution-BROKER"]',
+    ),
+    'mls.source_info': (
+        './/div[contains(@class, "Spacer")]',
+    ),
+    'mls.source_item': (
+        './/span',
+    ),
+    'media_tile.image': (
+        './/img',
+    ),
+}
+
+
+def _compile(selectors):
+    compiled = {}
+    for field, chain in selectors.items():
+        compiled[field] = tuple(etree.XPath(expression) for expression in chain)
+    return compiled
+
+
+_FIND = _compile({field: tuple('descendant-or-self::' + step for step in chain)
+                  for field, chain in PAGE_SELECTORS.items()})
+_SELF = _compile({field: tuple('self::' + step for step in chain)
+                  for field, chain in PAGE_SELECTORS.items()})
+_FIND.update(_compile(SUB_SELECTORS))
+
+
+def select_all(element, field):
+    """
+    Returns the elements matched by the first expression in a field's
+    fallback chain that matches anything.
+
+    Args:
+        element: The lxml element to search (a page root or a matched field).
+        field (str): A key of PAGE_SELECTORS or SUB_SELECTORS.
+
+    Returns:
+        list: The matching elements in document order; empty if none match.
+    """
+    for xpath in _FIND[field]:
+        found = xpath(element)
+        if found:
+            return found
+    return []
+
+
+def select_one(element, field):
+    """Returns the first element select_all would return, or None."""
+    found = select_all(element, field)
+    return found[0] if found else None
+
+
+def is_match(element, fields):
+    """
+    Checks whether an element itself is matched by any of the given page
+    fields. Used to decide which subtrees to keep while streaming.
+    """
+    return any(xpath(element) for field in fields for xpath in _SELF[field])
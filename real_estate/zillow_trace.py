@@ -0,0 +1,336 @@
+import contextlib
+import contextvars
+import datetime
+import itertools
+import json
+import os
+import re
+import threading
+import time
+import zillow_logging
+
+# Lightweight tracing for the scrape -> parse -> persist pipeline.
+#
+#     with zillow_trace.span('scrape.goto', url=url):
+#         await page.goto(url)
+#     zillow_trace.count('bytes', len(content))
+#
+# Tracing is off unless enable() is called. While it is off, span() returns
+# one shared do-nothing context manager and count() returns at once, so the
+# hooks can stay in hot paths.
+
+log = zillow_logging.get_logger(__name__)
+
+_tracer = None
+
+# The innermost open span of the running thread or asyncio task
+_current_span = contextvars.ContextVar('zillow_trace_span', default=None)
+
+PROMETHEUS_PREFIX = 'zillow'
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """
+    One timed operation; use through span(). Spans opened inside it, in the
+    same thread or task, record it as their parent.
+    """
+    __slots__ = ('tracer', 'name', 'attributes', 'span_id', 'parent_id', 'started_at', '_start', '_token')
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.span_id = self.tracer.next_span_id()
+        self.started_at = time.time()
+        self._token = _current_span.set(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = time.perf_counter() - self._start
+        _current_span.reset(self._token)
+        self.tracer.record({
+            'type': 'span',
+            'name': self.name,
+            'id': self.span_id,
+            'parent': self.parent_id,
+            'start': round(self.started_at, 6),
+            'duration_ms': round(duration * 1000, 3),
+            'error': exc_type.__name__ if exc_type is not None else None,
+            **self.attributes,
+        })
+        return False
+
+    def set(self, **attributes):
+        """Adds attributes to the span's trace record, e.g. a status learned inside it."""
+        self.attributes.update(attributes)
+
+
+class Tracer:
+    """
+    Collects span timings and counters for one run. It can also write every
+    span to a JSON-lines file as it ends and, on close, write the totals as
+    a Prometheus textfile (for node_exporter's textfile collector).
+
+    Args:
+        trace_path (str, optional): Append one JSON object per span here.
+        prometheus_path (str, optional): Write the totals here on close.
+        run (str, optional): A name for the run, stored with every record.
+        keep_records (bool): Also keep the records in memory for export();
+            used by capture() in worker processes.
+    """
+
+    def __init__(self, trace_path=None, prometheus_path=None, run=None, keep_records=False):
+        self.trace_path = trace_path
+        self.prometheus_path = prometheus_path
+        self.run = run or 'run'
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._pid = os.getpid()
+        # name -> [count, total seconds, max seconds, errors]
+        self.spans = {}
+        self.counters = {}
+        self._records = [] if keep_records else None
+        self._file = open(trace_path, 'a', encoding='utf-8') if trace_path else None
+
+    def next_span_id(self):
+        # Unique across the worker processes whose spans are merged in
+        return f"{self._pid}-{next(self._ids)}"
+
+    def record(self, record):
+        with self._lock:
+            self._add_span(record)
+            if self._records is not None:
+                self._records.append(record)
+            if self._file is not None:
+                self._file.write(json.dumps({'run': self.run, **record}, default=str) + '\n')
+
+    def _add_span(self, record):
+        seconds = record['duration_ms'] / 1000
+        stats = self.spans.get(record['name'])
+        if stats is None:
+            stats = self.spans[record['name']] = [0, 0.0, 0.0, 0]
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] = max(stats[2], seconds)
+        if record.get('error'):
+            stats[3] += 1
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def export(self):
+        """The spans and counters recorded so far, as plain data for merge()."""
+        with self._lock:
+            return {'spans': list(self._records or ()), 'counters': dict(self.counters)}
+
+    def merge(self, exported):
+        """Adds spans and counters exported by another tracer, e.g. a worker process's."""
+        for record in exported['spans']:
+            self.record(record)
+        for name, value in exported['counters'].items():
+            self.count(name, value)
+
+    def elapsed(self):
+        return time.perf_counter() - self._start
+
+    def summary(self):
+        """
+        The run's totals as report lines: each span's count, total, mean and
+        max time and its share of the run's wall time (nested and concurrent
+        spans overlap, so shares can add up to more than 100%), then the counters.
+        """
+        elapsed = self.elapsed()
+        lines = [f"Trace summary for {self.run}: {elapsed:.2f} s",
+                 f"  {'span':<28} {'count':>7} {'total s':>9} {'mean ms':>9} {'max ms':>9} {'share':>7}"]
+        for name, (count, total, longest, errors) in sorted(self.spans.items(), key=lambda item: -item[1][1]):
+            share = total / elapsed if elapsed else 0
+            failed = f"  ({errors} failed)" if errors else ''
+            lines.append(f"  {name:<28} {count:>7} {total:>9.2f} {total / count * 1000:>9.1f} "
+                         f"{longest * 1000:>9.1f} {share:>7.1%}{failed}")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"  {name}: {value:,}")
+        return lines
+
+    def prometheus_text(self):
+        """The totals in the Prometheus text exposition format."""
+        prefix = PROMETHEUS_PREFIX
+        lines = [
+            f"# HELP {prefix}_run_duration_seconds Wall time of the last run.",
+            f"# TYPE {prefix}_run_duration_seconds gauge",
+            f'{prefix}_run_duration_seconds{{run="{self.run}"}} {self.elapsed():.6f}',
+            f"# HELP {prefix}_run_timestamp_seconds When the last run started.",
+            f"# TYPE {prefix}_run_timestamp_seconds gauge",
+            f'{prefix}_run_timestamp_seconds{{run="{self.run}"}} {self.started_at:.3f}',
+            f"# HELP {prefix}_span_seconds Total time spent in each span during the last run.",
+            f"# TYPE {prefix}_span_seconds gauge",
+        ]
+        for name, (count, total, longest, errors) in sorted(self.spans.items()):
+            lines.append(f'{prefix}_span_seconds{{run="{self.run}",span="{name}"}} {total:.6f}')
+        lines += [f"# HELP {prefix}_span_count Number of times each span ran during the last run.",
+                  f"# TYPE {prefix}_span_count gauge"]
+        for name, (count, total, longest, errors) in sorted(self.spans.items()):
+            lines.append(f'{prefix}_span_count{{run="{self.run}",span="{name}"}} {count}')
+        lines += [f"# HELP {prefix}_span_errors Number of times each span raised during the last run.",
+                  f"# TYPE {prefix}_span_errors gauge"]
+        for name, (count, total, longest, errors) in sorted(self.spans.items()):
+            lines.append(f'{prefix}_span_errors{{run="{self.run}",span="{name}"}} {errors}')
+        lines += [f"# HELP {prefix}_events Counters recorded during the last run (pages, bytes, CAPTCHAs, cache hits).",
+                  f"# TYPE {prefix}_events gauge"]
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'{prefix}_events{{run="{self.run}",event="{re.sub(r"[^A-Za-z0-9_.]", "_", name)}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        """Writes the run totals to the trace file and the Prometheus textfile."""
+        if self._file is not None:
+            self._file.write(json.dumps({
+                'run': self.run,
+                'type': 'run',
+                'start': round(self.started_at, 6),
+                'duration_ms': round(self.elapsed() * 1000, 3),
+                'counters': self.counters,
+            }) + '\n')
+            self._file.close()
+            self._file = None
+        if self.prometheus_path:
+            # Written whole and renamed, so the collector never reads half a file
+            temp_path = self.prometheus_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(self.prometheus_text())
+            os.replace(temp_path, self.prometheus_path)
+
+
+def span(name, **attributes):
+    """
+    Times the block as a span named `name` when tracing is enabled.
+
+    Args:
+        name (str): Dotted span name, e.g. 'scrape.goto'.
+        **attributes: Extra fields for the span's trace record.
+
+    Returns:
+        A context manager whose set(**attributes) adds fields from inside the block.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NULL_SPAN
+    return Span(tracer, name, attributes)
+
+
+def count(name, value=1):
+    """Adds `value` to the counter `name` when tracing is enabled."""
+    tracer = _tracer
+    if tracer is not None:
+        tracer.count(name, value)
+
+
+def enabled():
+    return _tracer is not None
+
+
+def enable(trace_path=None, prometheus_path=None, run=None):
+    """
+    Starts tracing in this process, replacing any tracer already running.
+
+    Args:
+        trace_path (str, optional): JSON-lines file to append spans to.
+        prometheus_path (str, optional): Prometheus textfile written by disable().
+        run (str, optional): Run name; defaults to the start time.
+
+    Returns:
+        Tracer: The new tracer.
+    """
+    global _tracer
+    if _tracer is not None:
+        disable(log_summary=False)
+    _tracer = Tracer(trace_path, prometheus_path, run or datetime.datetime.now().strftime('%Y%m%dT%H%M%S'))
+    return _tracer
+
+
+def disable(log_summary=True):
+    """Stops tracing, logging the summary and writing the trace files."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is None:
+        return None
+    tracer.close()
+    if log_summary:
+        log.info("%s", '\n'.join(tracer.summary()))
+    return tracer
+
+
+def merge(exported):
+    """Adds a worker's exported spans and counters to this process's tracer."""
+    tracer = _tracer
+    if tracer is not None and exported:
+        tracer.merge(exported)
+
+
+@contextlib.contextmanager
+def capture(active=True):
+    """
+    Traces the block into memory, for worker processes that can't write to
+    the parent's trace. Yields the Tracer, or None when not active; return
+    its export() to the parent and pass that to merge().
+    """
+    global _tracer
+    if not active:
+        yield None
+        return
+    previous = _tracer
+    _tracer = Tracer(keep_records=True)
+    try:
+        yield _tracer
+    finally:
+        _tracer = previous
+
+
+def add_arguments(parser):
+    """Adds the --trace, --prometheus and --trace-summary options to a command-line parser."""
+    parser.add_argument('--trace',
+                        metavar='FILE',
+                        help='Time the pipeline and append every span to this JSON-lines file.')
+    parser.add_argument('--prometheus',
+                        metavar='FILE',
+                        help='Time the pipeline and write the run totals to this Prometheus textfile.')
+    parser.add_argument('--trace-summary',
+                        action='store_true',
+                        help='Time the pipeline and log a summary at the end.')
+
+
+@contextlib.contextmanager
+def from_arguments(args, run=None):
+    """Traces the block if any of the add_arguments() options were given."""
+    if not (args.trace or args.prometheus or args.trace_summary):
+        yield None
+        return
+    tracer = enable(args.trace, args.prometheus, run)
+    try:
+        yield tracer
+    finally:
+        if _tracer is tracer:
+            disable()